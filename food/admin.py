@@ -1,14 +1,25 @@
 from django.contrib import admin
-from .models import Restaurant, FoodItem
+from .models import Restaurant, FoodItem, Job, OpeningHours
+
+class OpeningHoursInline(admin.TabularInline):
+    model = OpeningHours
+    extra = 0
 
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'is_featured', 'address', 'phone')
     list_filter = ('is_featured',)
     search_fields = ('name', 'address', 'email')
+    inlines = [OpeningHoursInline]
 
 @admin.register(FoodItem)
 class FoodItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'restaurant', 'price')
     list_filter = ('restaurant',)
     search_fields = ('name', 'description')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'name', 'status', 'attempts', 'run_after', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error')
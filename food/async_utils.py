@@ -0,0 +1,80 @@
+# food/async_utils.py
+"""
+Helpers for the async views.
+
+Django 4.2's async ORM covers single queries (aget, afirst, acount, async
+for), but render(), Paginator and the condition()/cache_control() decorators
+are still sync-only. These fill the gaps so an async view never runs a query
+on the event loop, which the ORM refuses with SynchronousOnlyOperation.
+"""
+import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import EmptyPage, Paginator
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def arender(request, template_name, context=None):
+    # Context processors read the session, the cart summary and request.customer, all sync.
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def apage(queryset, per_page, number):
+    """Paginator(queryset, per_page).page(number), loaded; out-of-range numbers give the last page."""
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()
+    try:
+        page = paginator.page(number)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    page.object_list = await alist(page.object_list)
+    return page
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """django.views.decorators.http.condition() for async views; the validators are called in a thread."""
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            def validators():
+                etag = etag_func(request, *args, **kwargs) if etag_func else None
+                last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+                if last_modified and not timezone.is_aware(last_modified):
+                    last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+                return (
+                    quote_etag(etag) if etag is not None else None,
+                    int(last_modified.timestamp()) if last_modified else None,
+                )
+
+            etag, last_modified = await sync_to_async(validators)()
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+def async_cache_control(**kwargs):
+    """django.views.decorators.cache.cache_control() for async views."""
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kw):
+            response = await view(request, *args, **kw)
+            patch_cache_control(response, **kwargs)
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,217 @@
+# food/autocomplete.py
+"""
+In-process typeahead over restaurant and dish names.
+
+Each worker keeps a sorted list of normalized name keys and answers prefix
+lookups with a binary search, so a keystroke never touches the database. The
+WSGI and ASGI entry points call warm_up() so that each worker builds the index
+as it starts. If that fails, the first lookup builds it instead. Loading sorts
+all the keys once, so a build takes O(n log n) time. The model signals in
+food.signals keep the index current. Once it is older than
+AUTOCOMPLETE_MAX_AGE it is rebuilt in the background, so that edits made by
+other worker processes show up.
+
+Dish names repeat across restaurants, so every distinct name is stored once
+with a document count, which is also what suggestions are ranked by. Setting
+AUTOCOMPLETE_MAX_NAMES switches to a bounded-memory mode: only the most
+common names are kept (up to the limit per model) and only whole-name
+prefixes are indexed, not the start of every word.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Count, Min
+from django.urls import reverse
+
+from .models import FoodItem, Restaurant
+from .search import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 20
+MAX_CACHED_PREFIXES = 10000
+SCAN_LIMIT = 20000
+
+
+class PrefixIndex:
+    def __init__(self, max_names=None, word_prefixes=True):
+        self.max_names = max_names
+        self.word_prefixes = word_prefixes
+        self._keys = []  # sorted (key, name) pairs
+        self._names = {}  # name -> [document count, representative pk or None]
+        self._top = {}  # prefix -> ranked names, dropped whenever a matching name changes
+
+    def __len__(self):
+        return len(self._names)
+
+    def _keys_for(self, name):
+        words = normalize_text(name).split()
+        if not self.word_prefixes:
+            return [' '.join(words)]
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _forget(self, name):
+        for key in self._keys_for(name):
+            for end in range(1, len(key) + 1):
+                self._top.pop(key[:end], None)
+
+    def load(self, rows):
+        """Fill an empty index from (name, pk, count) rows, most common first, with one sort at the end."""
+        keys = []
+        for name, pk, count in rows:
+            if not name:
+                continue
+            entry = self._names.get(name)
+            if entry is not None:
+                entry[0] += count
+            elif self.max_names is None or len(self._names) < self.max_names:
+                self._names[name] = [count, pk]
+                keys += [(key, name) for key in self._keys_for(name)]
+        keys.sort()
+        self._keys = keys
+        self._top.clear()
+
+    def add(self, name, pk, count=1):
+        if not name:
+            return
+        entry = self._names.get(name)
+        if entry is not None:
+            entry[0] += count
+        elif self.max_names is None or len(self._names) < self.max_names:
+            self._names[name] = [count, pk]
+            for key in self._keys_for(name):
+                bisect.insort(self._keys, (key, name))
+        else:
+            return
+        self._forget(name)
+
+    def remove(self, name, pk):
+        entry = self._names.get(name)
+        if entry is None:
+            return
+        entry[0] -= 1
+        if entry[1] == pk:
+            entry[1] = None
+        if entry[0] <= 0:
+            del self._names[name]
+            for key in self._keys_for(name):
+                i = bisect.bisect_left(self._keys, (key, name))
+                if i < len(self._keys) and self._keys[i] == (key, name):
+                    del self._keys[i]
+        self._forget(name)
+
+    def lookup(self, prefix, limit):
+        prefix = ' '.join(normalize_text(prefix).split())
+        if not prefix:
+            return []
+        top = self._top.get(prefix)
+        if top is None:
+            lo = bisect.bisect_left(self._keys, (prefix,))
+            hi = min(bisect.bisect_left(self._keys, (prefix + '\U0010ffff',)), lo + SCAN_LIMIT)
+            names = {name for _, name in self._keys[lo:hi]}
+            top = heapq.nsmallest(MAX_SUGGESTIONS, names, key=lambda name: (-self._names[name][0], len(name), name))
+            if len(self._top) >= MAX_CACHED_PREFIXES:
+                self._top.clear()
+            self._top[prefix] = top
+        return [(name, *self._names[name]) for name in top[:limit]]
+
+
+class Autocomplete:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._refreshing = False
+        self.restaurants = None
+        self.dishes = None
+        self.built_at = None
+
+    @property
+    def loaded(self):
+        return self.built_at is not None
+
+    def _new_index(self):
+        max_names = getattr(settings, 'AUTOCOMPLETE_MAX_NAMES', None)
+        return PrefixIndex(max_names=max_names, word_prefixes=max_names is None)
+
+    def _load(self, model, index):
+        rows = model.objects.values('name').annotate(count=Count('pk'), first_pk=Min('pk')).order_by('-count')
+        if index.max_names is not None:
+            rows = rows[:index.max_names]
+        index.load(
+            (row['name'], row['first_pk'] if row['count'] == 1 else None, row['count']) for row in rows.iterator()
+        )
+        return index
+
+    def build(self):
+        restaurants = self._load(Restaurant, self._new_index())
+        dishes = self._load(FoodItem, self._new_index())
+        with self._lock:
+            self.restaurants, self.dishes = restaurants, dishes
+            self.built_at = time.monotonic()
+
+    def warm_up(self):
+        """Build the index before the first request; called from grabnow/wsgi.py and asgi.py."""
+        try:
+            with self._build_lock:
+                if not self.loaded:
+                    self.build()
+        except DatabaseError:
+            logger.exception('Building the autocomplete index failed; the first request will try again')
+        finally:
+            connections.close_all()
+
+    def _refresh(self):
+        try:
+            self.build()
+        finally:
+            self._refreshing = False
+            connections.close_all()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def suggest(self, prefix, limit):
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    self.build()
+        elif time.monotonic() - self.built_at > getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 600):
+            self._refresh_in_background()
+        with self._lock:
+            restaurants = self.restaurants.lookup(prefix, limit)
+            dishes = self.dishes.lookup(prefix, limit)
+        suggestions = []
+        for name, count, pk in restaurants:
+            # Chains share a name; only link straight to a menu when the name is unique.
+            url = reverse('menu', args=[pk]) if count == 1 and pk else _search_url(name)
+            suggestions.append({'type': 'restaurant', 'name': name, 'url': url})
+        for name, _, _ in dishes:
+            suggestions.append({'type': 'dish', 'name': name, 'url': _search_url(name)})
+        return suggestions[:limit]
+
+    def added(self, index_name, name, pk):
+        if self.loaded:
+            with self._lock:
+                getattr(self, index_name).add(name, pk)
+
+    def removed(self, index_name, name, pk):
+        if self.loaded:
+            with self._lock:
+                getattr(self, index_name).remove(name, pk)
+
+
+def _search_url(name):
+    return f"{reverse('search')}?{urlencode({'q': name})}"
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,226 @@
+# food/cache.py
+"""
+Two-tier cache: a per-process LRU in front of a cache shared by every process.
+
+TwoTierCache is a Django cache backend. Reads are served from the process's
+own LRU when they can, and otherwise from the shared backend (another alias in
+CACHES, such as FileBasedCache or RedisCache), whose answer is then kept
+locally. Writes go to both tiers. The LRU is bounded by entry count and by
+size, and keeps nothing longer than LOCAL_TIMEOUT seconds. That is also the
+longest another process can go on seeing a value after it was changed or
+deleted, so values that must be exact across processes should use the shared
+alias directly. Sessions do this.
+
+Namespace adds versioned invalidation on top: keys embed the namespace's
+version number, and invalidate() bumps it, orphaning every entry at once.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+
+class LocalTier:
+    """Thread-safe LRU of pickled values with per-entry expiry and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, pickled value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ['local_hits', 'shared_hits', 'misses', 'sets', 'evictions', 'expirations'], 0
+        )
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.counters['local_hits'] += 1
+                    return pickle.loads(entry[1])
+                self._pop(key)
+                self.counters['expirations'] += 1
+        return _MISSING
+
+    def set(self, key, value, ttl):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + ttl, data)
+            self._bytes += len(data)
+            self.counters['sets'] += 1
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+                self.counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def count(self, outcome):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, entries=len(self._data), bytes=self._bytes)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['local_hits'] + stats['shared_hits']) / lookups if lookups else None
+        return stats
+
+
+# One LRU per LOCATION per process; Django makes a backend instance per thread.
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    OPTIONS: SHARED (alias of the shared backend, required), LOCAL_TIMEOUT
+    (seconds, default 5), and MAX_ENTRIES and MAX_BYTES bounding the LRU
+    (default 300 entries and 16 MiB).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options['SHARED']
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        with _local_tiers_lock:
+            self.local = _local_tiers.get(location)
+            if self.local is None:
+                self.local = LocalTier(self._max_entries, options.get('MAX_BYTES', 16 * 2 ** 20))
+                _local_tiers[location] = self.local
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _keep(self, key, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self.get_backend_timeout(timeout)
+        ttl = self._local_timeout if timeout is None else min(timeout - time.time(), self._local_timeout)
+        if ttl > 0:
+            self.local.set(key, value, ttl)
+        else:
+            self.local.delete(key)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.local.count('misses')
+            return default
+        self.local.count('shared_hits')
+        self._keep(local_key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        self.shared.set(key, value, timeout, version=version)
+        self._keep(local_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._keep(local_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self.shared.incr(key, delta, version=version)
+        self._keep(local_key, value)
+        return value
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        return self.local.stats()
+
+
+class Namespace:
+    """A group of cache keys that can be invalidated together by bumping the group's version."""
+
+    def __init__(self, name, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.alias = alias
+        self.version_key = f'namespace:{name}'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            # Seed from the clock so an evicted counter never reuses an old version number.
+            self.cache.add(self.version_key, time.time_ns(), None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    def key(self, *parts):
+        return ':'.join([self.name, str(self.version()), *map(str, parts)])
+
+    def invalidate(self):
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, time.time_ns(), None)
+
+
+def prometheus_text(alias=DEFAULT_CACHE_ALIAS):
+    """The local tier's counters in the Prometheus text format, or '' if ``alias`` isn't a TwoTierCache."""
+    backend = caches[alias]
+    if not isinstance(backend, TwoTierCache):
+        return ''
+    stats = backend.stats()
+    lines = []
+    for name, help_text in (
+        ('local_hits', 'Lookups answered by the per-process LRU.'),
+        ('shared_hits', 'Lookups answered by the shared cache.'),
+        ('misses', 'Lookups answered by neither tier.'),
+        ('evictions', 'Entries dropped from the LRU to stay within its bounds.'),
+        ('expirations', 'Entries dropped from the LRU because they were older than LOCAL_TIMEOUT.'),
+    ):
+        lines += [f'# HELP grabnow_cache_{name}_total {help_text}', f'# TYPE grabnow_cache_{name}_total counter',
+                  f'grabnow_cache_{name}_total {stats[name]}']
+    for name, help_text in (('entries', 'Entries in the LRU.'), ('bytes', 'Pickled size of the LRU entries.')):
+        lines += [f'# HELP grabnow_cache_local_{name} {help_text}', f'# TYPE grabnow_cache_local_{name} gauge',
+                  f'grabnow_cache_local_{name} {stats[name]}']
+    return '\n'.join(lines) + '\n'
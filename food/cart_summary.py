@@ -0,0 +1,47 @@
+# food/cart_summary.py
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+
+from .cache import Namespace
+from .models import Cart
+
+CART_SUMMARY_TIMEOUT = 60 * 60
+
+# The subtotal depends on dish prices, so every summary is keyed by a version bumped when a dish changes.
+prices = Namespace('prices')
+
+
+def bump_price_version():
+    prices.invalidate()
+
+
+def cart_summary_key(customer_id):
+    return prices.key('cart_summary', customer_id)
+
+
+def get_cart_summary(customer_id):
+    """Return {'count', 'subtotal'} for a customer's cart, cached per customer."""
+    key = cart_summary_key(customer_id)
+    summary = cache.get(key)
+    if summary is None:
+        totals = Cart.objects.filter(customer_id=customer_id).aggregate(
+            count=Sum('quantity'),
+            subtotal=Sum(F('quantity') * F('food__price')),
+        )
+        summary = {
+            'count': totals['count'] or 0,
+            'subtotal': totals['subtotal'] or Decimal('0.00'),
+        }
+        cache.set(key, summary, CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def set_cart_summary(customer_id, count, subtotal):
+    # Used by views that already walked the whole cart and know the totals.
+    cache.set(cart_summary_key(customer_id), {'count': count, 'subtotal': subtotal}, CART_SUMMARY_TIMEOUT)
+
+
+def invalidate_cart_summary(customer_id):
+    cache.delete(cart_summary_key(customer_id))
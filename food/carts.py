@@ -0,0 +1,108 @@
+# food/carts.py
+"""
+Cart changes, each one atomic statement on the (customer, food) unique index.
+
+Adding a dish is an upsert that increments the quantity in the database.
+Setting a quantity is an upsert that overwrites it. Removing one is a
+conditional decrement, or a delete once the quantity would reach 0. So
+concurrent clicks and double submits from several tabs or workers can't lose
+an update or create a second row for the same dish. The upserts insert from
+a SELECT on the dish. An unknown food id inserts nothing and is reported as
+FoodItem.DoesNotExist, without a separate existence check.
+
+The JSON cart API (views.cart_api_*) replies with one read of the customer's
+cart lines. It has the changed lines, the subtotal and the item count for the
+navbar badge, and the cached cart summary is refreshed with those totals
+rather than dropped.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .cart_summary import set_cart_summary
+from .models import Cart, FoodItem
+
+MAX_QUANTITY = 99
+MAX_BATCH_ITEMS = 50
+
+
+def parse_quantity(value, minimum=0):
+    """``value`` as a quantity between ``minimum`` and MAX_QUANTITY; raises ValueError otherwise."""
+    quantity = int(value)
+    if not minimum <= quantity <= MAX_QUANTITY:
+        raise ValueError(f'Quantity must be between {minimum} and {MAX_QUANTITY}.')
+    return quantity
+
+
+def _upsert(customer_id, food_id, quantity, increment):
+    cart, food = Cart._meta.db_table, FoodItem._meta.db_table
+    if increment:
+        least = 'MIN' if connection.vendor == 'sqlite' else 'LEAST'
+        new_quantity = f'{least}({cart}.quantity + %s, {MAX_QUANTITY})'
+    else:
+        new_quantity = '%s'
+    if connection.vendor == 'mysql':
+        conflict = f'ON DUPLICATE KEY UPDATE quantity = {new_quantity}'
+    else:
+        conflict = f'ON CONFLICT (customer_id, food_id) DO UPDATE SET quantity = {new_quantity}'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {cart} (customer_id, food_id, quantity) '
+            f'SELECT %s, food_id, %s FROM {food} WHERE food_id = %s {conflict}',
+            [customer_id, quantity, food_id, quantity],
+        )
+        # MySQL reports 0 when an upsert changed nothing; with an unknown dish nothing was selected at all.
+        if cursor.rowcount == 0 and not (connection.vendor == 'mysql' and FoodItem.objects.filter(pk=food_id).exists()):
+            raise FoodItem.DoesNotExist(f'No food item {food_id}.')
+
+
+def add(customer_id, food_id, quantity):
+    _upsert(customer_id, food_id, quantity, increment=True)
+
+
+def set_quantity(customer_id, food_id, quantity):
+    """Set a line's quantity; 0 removes it."""
+    if quantity == 0:
+        remove(customer_id, food_id)
+    else:
+        _upsert(customer_id, food_id, quantity, increment=False)
+
+
+def decrement(customer_id, food_id):
+    """Take one off a line, deleting it instead of leaving quantity 0."""
+    lines = Cart.objects.filter(customer_id=customer_id, food_id=food_id)
+    # Each statement only applies to the quantity it expects, so a line changed in between is retried.
+    for _ in range(3):
+        if lines.filter(quantity__gt=1).update(quantity=F('quantity') - 1) or lines.filter(quantity__lte=1).delete()[0]:
+            return
+        if not lines.exists():
+            return
+
+
+def remove(customer_id, food_id):
+    Cart.objects.filter(customer_id=customer_id, food_id=food_id).delete()
+
+
+def set_quantities(customer_id, quantities):
+    """Apply {food_id: quantity} all or nothing."""
+    with transaction.atomic():
+        for food_id, quantity in quantities.items():
+            set_quantity(customer_id, food_id, quantity)
+
+
+def cart_state(customer_id, food_ids):
+    """The JSON reply: the lines for ``food_ids`` (quantity 0 if gone), the subtotal and the badge count."""
+    lines = {
+        food_id: (quantity, price)
+        for food_id, quantity, price in Cart.objects.filter(customer_id=customer_id)
+        .values_list('food_id', 'quantity', 'food__price')
+    }
+    count = sum(quantity for quantity, _ in lines.values())
+    subtotal = sum((quantity * price for quantity, price in lines.values()), Decimal('0.00'))
+    set_cart_summary(customer_id, count, subtotal)
+    changed = []
+    for food_id in food_ids:
+        quantity, price = lines.get(food_id, (0, Decimal('0.00')))
+        changed.append({'food_id': food_id, 'quantity': quantity, 'line_total': str(quantity * price)})
+    return {'lines': changed, 'subtotal': str(subtotal), 'count': count}
@@ -0,0 +1,73 @@
+# food/catalog_cache.py
+"""
+Fragment cache for catalog-wide page sections (restaurant grid, featured block).
+
+Fragments live in the 'catalog' cache namespace, whose version is bumped
+whenever a Restaurant is saved or deleted, so a change orphans every cached
+fragment at once instead of having to find and delete them one by one.
+Changes that only touch a restaurant's updated_at, such as a new rating, leave
+the namespace alone: fragments also carry rows_key() of the restaurants they
+show, so only those showing that restaurant are rendered again.
+"""
+import hashlib
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from .cache import Namespace
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+catalog = Namespace('catalog')
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def bump_catalog_version():
+    catalog.invalidate()
+
+
+def rows_key(rows):
+    """A short key part for (pk, updated_at) rows; it changes when any row is added, removed, moved or updated."""
+    return hashlib.md5(repr(list(rows)).encode()).hexdigest()
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cached_fragment(name, render, *key_parts):
+    """Return the HTML for ``name`` at the current catalog version, calling ``render()`` on a miss."""
+    key = catalog.key('fragment', name, *key_parts)
+    html = cache.get(key)
+    if html is None:
+        _record('misses')
+        html = render()
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    else:
+        _record('hits')
+    return mark_safe(html)
+
+
+async def acached_fragment(name, render, *key_parts):
+    """cached_fragment for async views; ``render`` is a coroutine function."""
+    key = await sync_to_async(catalog.key)('fragment', name, *key_parts)
+    html = await cache.aget(key)
+    if html is None:
+        _record('misses')
+        html = await render()
+        await cache.aset(key, html, FRAGMENT_TIMEOUT)
+    else:
+        _record('hits')
+    return mark_safe(html)
+
+
+def fragment_stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / lookups if lookups else None}
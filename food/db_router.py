@@ -0,0 +1,108 @@
+# food/db_router.py
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``, the primary. Reads go to a random alias from
+DATABASE_REPLICAS, except when they have to see the primary's latest state:
+
+* inside a transaction on the primary (select_for_update in place_order, for example);
+* for the whole of a POST (or other unsafe) request, and for the rest of any
+  request once it has written;
+* for REPLICA_PIN_SECONDS after a client's last write, so people read their own
+  cart, orders and reviews despite replication lag. replica_pinning_middleware
+  remembers the write with a short-lived cookie.
+
+The request's pinning lives in a context variable, so it follows the request
+under WSGI, ASGI and sync_to_async. Outside requests (management commands,
+workers) reads use the replicas unless they are in a transaction.
+
+To try it locally, point a second alias at another SQLite file holding a copy
+of the primary and list it in DATABASE_REPLICAS. Give it ``'TEST': {'MIRROR':
+'default'}`` so the test runner reads it from the test database.
+"""
+import asyncio
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = contextvars.ContextVar('food_db_routing', default=None)
+
+
+class RequestRouting:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def use_primary():
+    routing = _current.get()
+    if routing is not None and (routing.pinned or routing.wrote):
+        return True
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same rows, so objects read from a replica can point at ones from the primary.
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication.
+        return False if db in replicas() else None
+
+
+def _start(request):
+    pinned = request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+    return _current.set(RequestRouting(pinned))
+
+
+def _finish(response, token):
+    routing = _current.get()
+    _current.reset(token)
+    if routing.wrote:
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5), httponly=True, samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_pinning_middleware(get_response):
+    """Pin a request's reads to the primary when it, or a recent request from the same client, writes."""
+    if not replicas():
+        raise MiddlewareNotUsed
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _start(request)
+            return _finish(await get_response(request), token)
+    else:
+        def middleware(request):
+            token = _start(request)
+            return _finish(get_response(request), token)
+    return middleware
@@ -1,6 +1,7 @@
 from django import forms
 from .models import Customer, Restaurant, FoodItem
 from .models import Review
+from .opening_hours import parse_schedule
 
 class SignUpForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput())
@@ -22,6 +23,20 @@ class RestaurantForm(forms.ModelForm):
     class Meta:
         model = Restaurant
         fields = ['name', 'address', 'phone', 'description', 'image', 'email', 'delivery_charge', 'min_order', 'open_until', 'weekly_schedule']
+        help_texts = {
+            'weekly_schedule': 'One line per day or range of days, e.g. "Mon-Fri 11:00-22:00", "Sat 10am-2am", "Sun closed".',
+        }
+
+    def clean_weekly_schedule(self):
+        schedule = self.cleaned_data['weekly_schedule']
+        # Schedules written before they were parsed may be free text; they can stay until someone edits them.
+        if 'weekly_schedule' not in self.changed_data:
+            return schedule
+        try:
+            parse_schedule(schedule)
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
+        return schedule
 
 class FoodItemForm(forms.ModelForm):
     class Meta:
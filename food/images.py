@@ -0,0 +1,122 @@
+# food/images.py
+"""
+Resized WebP derivatives of uploaded restaurant and food images.
+
+For an upload stored as ``food_images/s1.jpg`` the derivatives live at
+``derivatives/<size>/food_images/s1.jpg.webp`` (keeping the original extension
+so ``s1.jpg`` and ``s1.webp`` don't collide). They are generated off the request
+path in a process pool (Pillow work is CPU-bound and holds the GIL), and
+templates reference them through the ``srcset`` tag in food_images. Which
+derivatives exist is remembered per process in a bounded LRU: found ones until
+evicted, missing ones for MISSING_DERIVATIVE_SECONDS, since they may appear.
+"""
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+# Name -> target width in pixels. Images are only ever scaled down.
+DERIVATIVE_WIDTHS = {'thumb': 160, 'card': 480, 'hero': 1200}
+WEBP_QUALITY = 80
+KNOWN_DERIVATIVES_MAX = 10_000
+MISSING_DERIVATIVE_SECONDS = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+_known_derivatives = OrderedDict()  # derivative name -> True, or the monotonic time it was found missing
+_known_derivatives_lock = threading.Lock()
+
+
+def derivative_name(name, size):
+    return f'derivatives/{size}/{name}.webp'
+
+
+def generate_derivatives(name, force=False):
+    """Write every missing derivative of the stored image ``name``; return the names written."""
+    from PIL import Image, ImageOps
+
+    targets = {size: derivative_name(name, size) for size in DERIVATIVE_WIDTHS}
+    if not force:
+        targets = {size: target for size, target in targets.items() if not default_storage.exists(target)}
+    if not targets:
+        return []
+
+    with default_storage.open(name, 'rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    written = []
+    for size, target in targets.items():
+        image = original.copy()
+        width = DERIVATIVE_WIDTHS[size]
+        if image.width > width:
+            image.thumbnail((width, image.height * width // image.width), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        written.append(default_storage.save(target, ContentFile(buffer.getvalue())))
+    return written
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked: web servers are multi-threaded by the time we get here.
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def schedule_derivatives(field_file):
+    """Queue derivative generation for an ImageField value once the current transaction commits."""
+    if not field_file:
+        return
+    name = field_file.name
+    transaction.on_commit(lambda: get_executor().submit(generate_derivatives, name, True))
+
+
+def derivative_exists(target):
+    now = time.monotonic()
+    with _known_derivatives_lock:
+        known = _known_derivatives.get(target)
+        if known is True or (known is not None and now - known < MISSING_DERIVATIVE_SECONDS):
+            _known_derivatives.move_to_end(target)
+            return known is True
+    exists = default_storage.exists(target)
+    with _known_derivatives_lock:
+        _known_derivatives[target] = True if exists else now
+        _known_derivatives.move_to_end(target)
+        if len(_known_derivatives) > KNOWN_DERIVATIVES_MAX:
+            _known_derivatives.popitem(last=False)
+    return exists
+
+
+def srcset(field_file):
+    """``srcset`` value for the derivatives that exist so far, or '' if none do yet."""
+    if not field_file:
+        return ''
+    candidates = []
+    for size, width in DERIVATIVE_WIDTHS.items():
+        target = derivative_name(field_file.name, size)
+        if derivative_exists(target):
+            candidates.append(f'{default_storage.url(target)} {width}w')
+    return ', '.join(candidates)
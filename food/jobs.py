@@ -0,0 +1,135 @@
+# food/jobs.py
+"""
+Database-backed job queue for work that shouldn't hold up a request.
+
+enqueue() adds a Job row naming a function by dotted path plus its keyword
+arguments. Call it inside the transaction that makes the work necessary: the
+job then exists exactly when that transaction commits. The ``worker``
+management command runs jobs in several processes. Each one claims a batch
+of due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so processes never pick up
+the same job, and holds a lease on them. Jobs whose worker died are requeued
+when the lease runs out.
+
+A job that raises is retried with exponential backoff, RETRY_BASE_SECONDS
+doubling each time and capped at RETRY_MAX_SECONDS. After max_attempts it is
+marked failed and keeps its last traceback. Jobs may therefore run more than
+once (a retry, or a lease that ran out on a slow job), so they must be
+idempotent.
+"""
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+BATCH_SIZE = 10
+LEASE_SECONDS = 300
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+DONE_RETENTION = timedelta(days=7)
+
+
+def enqueue(function, *, delay=0, max_attempts=5, **kwargs):
+    """Queue ``function(**kwargs)``; ``kwargs`` must be JSON-serializable."""
+    return Job.objects.create(
+        name=f'{function.__module__}.{function.__qualname__}', payload=kwargs, max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    """Seconds before retry number ``attempts``, with +/-20% jitter so failed batches don't retry in lockstep."""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS) * random.uniform(0.8, 1.2)
+
+
+def claim(worker_id, limit=BATCH_SIZE, lease=LEASE_SECONDS):
+    """Lease up to ``limit`` due jobs to ``worker_id`` and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'job_id')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.RUNNING, locked_by=worker_id, locked_until=now + timedelta(seconds=lease),
+                attempts=F('attempts') + 1,
+            )
+    for job in jobs:
+        job.status, job.locked_by, job.attempts = Job.RUNNING, worker_id, job.attempts + 1
+    return jobs
+
+
+def run(job):
+    """Run a claimed job and record the outcome: Job.DONE, Job.QUEUED (to be retried) or Job.FAILED."""
+    try:
+        import_string(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            status, changes = Job.QUEUED, {'run_after': timezone.now() + timedelta(seconds=retry_delay(job.attempts))}
+        else:
+            status, changes = Job.FAILED, {'finished_at': timezone.now()}
+        changes['last_error'] = error
+    else:
+        status, changes = Job.DONE, {'finished_at': timezone.now()}
+    # Conditional on the lease, in case it ran out and another worker has the job now.
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        status=status, locked_by='', locked_until=None, **changes,
+    )
+    return status
+
+
+def requeue_expired():
+    """Put jobs whose lease ran out (their worker died or hung) back in the queue; returns how many."""
+    return Job.objects.filter(status=Job.RUNNING, locked_until__lt=timezone.now()).update(
+        status=Job.QUEUED, locked_by='', locked_until=None,
+    )
+
+
+def prune_done():
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=timezone.now() - DONE_RETENTION).delete()[0]
+
+
+def work(worker_id, should_stop, batch_size=BATCH_SIZE, lease=LEASE_SECONDS, on_result=None):
+    """
+    Claim and run jobs until ``should_stop()``. Returns when the queue has nothing due,
+    so callers decide how long to sleep before calling again.
+    """
+    while not should_stop():
+        close_old_connections()
+        jobs = claim(worker_id, batch_size, lease)
+        if not jobs:
+            return
+        for job in jobs:
+            status = run(job)
+            if on_result is not None:
+                on_result(status)
+    close_old_connections()
+
+
+def queue_stats():
+    """Jobs per status, and the age in seconds of the oldest job that is due but waiting."""
+    counts = dict.fromkeys([Job.QUEUED, Job.RUNNING, Job.DONE, Job.FAILED], 0)
+    counts.update(Job.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    oldest = Job.objects.filter(status=Job.QUEUED, run_after__lte=timezone.now()).aggregate(oldest=Min('run_after'))
+    wait = (timezone.now() - oldest['oldest']).total_seconds() if oldest['oldest'] else 0
+    return {'counts': counts, 'oldest_wait': wait}
+
+
+def prometheus_text():
+    stats = queue_stats()
+    lines = ['# HELP grabnow_jobs Background jobs by status.', '# TYPE grabnow_jobs gauge']
+    lines += [f'grabnow_jobs{{status="{status}"}} {count}' for status, count in stats['counts'].items()]
+    lines += [
+        '# HELP grabnow_jobs_oldest_wait_seconds How long the oldest due job has been waiting for a worker.',
+        '# TYPE grabnow_jobs_oldest_wait_seconds gauge',
+        f"grabnow_jobs_oldest_wait_seconds {stats['oldest_wait']:.3f}",
+    ]
+    return '\n'.join(lines) + '\n'
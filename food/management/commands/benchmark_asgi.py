@@ -0,0 +1,207 @@
+import asyncio
+import io
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from food.management.commands.loadtest import percentile
+from food.models import Customer, Order, Restaurant
+from food.search import tokenize
+
+HANDLERS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Django's WSGI and ASGI handlers on the read-heavy pages (restaurant list, menu, search, cart, "
+        "order details) with many concurrent signed-in clients, and report req/s and latency percentiles. "
+        "Requests are made in process, one thread per client for WSGI and one task per client on an event loop "
+        "for ASGI, so the numbers leave out the HTTP server; use loadtest against gunicorn or uvicorn for those. "
+        "Expects customers created by seed_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handlers', nargs='+', choices=HANDLERS, default=list(HANDLERS))
+        parser.add_argument('--concurrency', type=int, default=200, help='Simultaneous clients.')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds measured per handler.')
+        parser.add_argument('--warmup', type=float, default=3, help='Seconds run before measuring starts.')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.options = options
+        customers = list(
+            Customer.objects.filter(username__startswith='loadtest-').order_by('pk')
+            .values_list('pk', flat=True)[:options['concurrency']]
+        )
+        self.restaurant_ids = list(Restaurant.objects.values_list('pk', flat=True))
+        if not customers or not self.restaurant_ids:
+            raise CommandError("No load-test customers or restaurants found; run seed_data first.")
+        self.pages = max(1, (len(self.restaurant_ids) + 8) // 9)
+        self.words = sorted({
+            word for name in Restaurant.objects.values_list('name', flat=True)[:1000] for word in tokenize(name)
+        })
+        orders = dict(Order.objects.filter(customer_id__in=customers).values_list('customer_id', 'order_id'))
+
+        # Clients share customers when there are fewer than --concurrency of them.
+        self.clients = []
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        sessions = {}
+        try:
+            for n in range(options['concurrency']):
+                customer_id = customers[n % len(customers)]
+                if customer_id not in sessions:
+                    session = session_store()
+                    session['customer_id'] = customer_id
+                    session.create()
+                    sessions[customer_id] = session
+                cookie = f'{settings.SESSION_COOKIE_NAME}={sessions[customer_id].session_key}'
+                self.clients.append((cookie, orders.get(customer_id)))
+
+            results = {}
+            for handler in options['handlers']:
+                self.stdout.write(f"{handler}: {options['concurrency']} clients for {options['duration']:.0f}s...")
+                self.samples = defaultdict(list)
+                self.errors = defaultdict(int)
+                self.lock = threading.Lock()
+                self.measure_from = time.perf_counter() + options['warmup']
+                self.deadline = self.measure_from + options['duration']
+                getattr(self, f'run_{handler}')()
+                results[handler] = self.samples, self.errors
+        finally:
+            for session in sessions.values():
+                session.delete()
+        self.report(results)
+
+    def pick(self, rng, client):
+        """A (page name, path, query string) for ``client`` to request next."""
+        _, order_id = self.clients[client]
+        choice = rng.randrange(5 if order_id else 4)
+        if choice == 0:
+            return 'restaurant_list', reverse('restaurant_list'), f'page={rng.randint(1, self.pages)}'
+        if choice == 1:
+            return 'menu', reverse('menu', args=[rng.choice(self.restaurant_ids)]), ''
+        if choice == 2:
+            return 'search', reverse('search'), f'q={rng.choice(self.words)}' if self.words else ''
+        if choice == 3:
+            return 'cart', reverse('cart'), ''
+        return 'order_details', reverse('order_details', args=[order_id]), ''
+
+    def record(self, name, started, status):
+        finished = time.perf_counter()
+        if started < self.measure_from or finished > self.deadline:
+            return
+        with self.lock:
+            self.samples[name].append(finished - started)
+            if status != 200:
+                self.errors[name] += 1
+
+    def run_wsgi(self):
+        application = WSGIHandler()
+
+        def client(n):
+            rng = random.Random(self.options['seed'] + n)
+            cookie = self.clients[n][0]
+            while time.perf_counter() < self.deadline:
+                name, path, query = self.pick(rng, n)
+                started = time.perf_counter()
+                self.record(name, started, self.wsgi_get(application, path, query, cookie))
+
+        threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(len(self.clients))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def wsgi_get(self, application, path, query, cookie):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': self.options['host'], 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.options['host'], 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        body = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+        try:
+            for _ in body:
+                pass
+        finally:
+            body.close()
+        return int(status[0].split()[0])
+
+    def run_asgi(self):
+        application = ASGIHandler()
+
+        async def client(n):
+            rng = random.Random(self.options['seed'] + n)
+            cookie = self.clients[n][0]
+            while time.perf_counter() < self.deadline:
+                name, path, query = self.pick(rng, n)
+                started = time.perf_counter()
+                self.record(name, started, await self.asgi_get(application, path, query, cookie))
+
+        async def main():
+            await asyncio.gather(*(client(n) for n in range(len(self.clients))))
+
+        asyncio.run(main())
+
+    async def asgi_get(self, application, path, query, cookie):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', self.options['host'].encode()), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0), 'server': (self.options['host'], 80),
+        }
+        finished = asyncio.Event()
+        status = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif not message.get('more_body'):
+                finished.set()
+
+        await application(scope, receive, send)
+        return status[0]
+
+    def report(self, results):
+        duration = self.options['duration']
+        self.stdout.write(
+            f"{'handler':<8} {'page':<16} {'requests':>8} {'errors':>6} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for handler, (samples, errors) in results.items():
+            everything = []
+            for name, page_samples in sorted(samples.items()):
+                page_samples.sort()
+                everything += page_samples
+                self.stdout.write(self.row(handler, name, page_samples, errors[name], duration))
+            everything.sort()
+            self.stdout.write(self.row(handler, 'all', everything, sum(errors.values()), duration))
+
+    def row(self, handler, name, samples, errors, duration):
+        if not samples:
+            return f"{handler:<8} {name:<16} {0:>8} {errors:>6}"
+        return (
+            f"{handler:<8} {name:<16} {len(samples):>8} {errors:>6} {len(samples) / duration:>8.1f} "
+            f"{percentile(samples, 50):>8.1f} {percentile(samples, 95):>8.1f} {percentile(samples, 99):>8.1f}"
+        )
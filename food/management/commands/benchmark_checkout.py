@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from food.models import Cart, Customer, FoodItem, Restaurant
+
+
+class Command(BaseCommand):
+    help = "Measure place_order throughput (orders/second) for several cart sizes. All data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--orders', type=int, default=200, help='Orders to place per cart size.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with transaction.atomic():
+            self.run(options['sizes'], options['orders'])
+            transaction.set_rollback(True)
+
+    def run(self, sizes, orders):
+        customer = Customer.objects.create(
+            username='benchmark-checkout', email='benchmark-checkout@example.com',
+            password=make_password(None), phone='0',
+        )
+        restaurant = Restaurant.objects.create(name='Benchmark Kitchen', address='-')
+        foods = FoodItem.objects.bulk_create([
+            FoodItem(restaurant=restaurant, name=f'Dish {i}', price='9.99', description='-')
+            for i in range(max(sizes))
+        ])
+
+        client = Client()
+        session = client.session
+        session['customer_id'] = customer.user_id
+        session.save()
+        url = reverse('place_order')
+
+        self.stdout.write(f"{'cart size':>9}  {'orders/s':>9}  {'ms/order':>9}  {'queries':>7}")
+        for size in sizes:
+            selected = [food.food_id for food in foods[:size]]
+            elapsed = 0.0
+            queries = 0
+            for _ in range(orders):
+                Cart.objects.bulk_create([Cart(customer=customer, food=food, quantity=2) for food in foods[:size]])
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = client.post(url, {'selected_items': selected})
+                    elapsed += time.perf_counter() - start
+                queries = len(ctx.captured_queries)
+                assert response.status_code == 302 and '/order_confirmation/' in response.url, response.url
+            self.stdout.write(f"{size:>9}  {orders / elapsed:>9.1f}  {elapsed * 1000 / orders:>9.2f}  {queries:>7}")
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+
+from food import images
+from food.models import FoodItem, Restaurant
+
+
+class Command(BaseCommand):
+    help = "Backfill resized WebP derivatives for every restaurant and food item image, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist.')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Restaurant, FoodItem):
+            names.update(model.objects.exclude(image='').exclude(image=None).values_list('image', flat=True).distinct())
+
+        written = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=images._init_worker,
+        ) as executor:
+            futures = {executor.submit(images.generate_derivatives, name, options['force']): name for name in sorted(names)}
+            for future in as_completed(futures):
+                try:
+                    written += len(future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(names)} images: wrote {written} derivatives, {failed} failed."
+        ))
@@ -0,0 +1,51 @@
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from food.menu_import import FORMATS, IMPORT_BATCH_SIZE, MenuImport, guess_format
+from food.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = (
+        "Import restaurants and dishes from a CSV or JSONL file, updating rows that already exist. "
+        "See food.menu_import for the columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--restaurant', type=int, help='Import every row as a dish of this restaurant.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report, then roll everything back.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+        if file_format is None:
+            raise CommandError("Can't tell the file format from its name; pass --format.")
+        restaurant = None
+        if options['restaurant'] is not None:
+            restaurant = Restaurant.objects.filter(pk=options['restaurant']).first()
+            if restaurant is None:
+                raise CommandError(f"Restaurant {options['restaurant']} does not exist.")
+
+        importer = MenuImport(restaurant=restaurant, batch_size=options['batch_size'])
+        # Each batch commits on its own; a dry run wraps them all in one transaction and rolls it back.
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            with transaction.atomic() if options['dry_run'] else nullcontext():
+                importer.run(stream, file_format)
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+
+        for error in importer.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if importer.error_count > len(importer.errors):
+            self.stderr.write(f"... and {importer.error_count - len(importer.errors)} more errors.")
+        summary = importer.summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would have imported' if options['dry_run'] else 'Imported'}: "
+            f"{summary['restaurants']['created']} restaurants created, {summary['restaurants']['updated']} updated; "
+            f"{summary['dishes']['created']} dishes created, {summary['dishes']['updated']} updated; "
+            f"{importer.error_count} rows rejected."
+        ))
@@ -0,0 +1,162 @@
+import http.client
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from food.models import Customer, FoodItem, Restaurant
+
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def percentile(samples, p):
+    """The p-th percentile of ``samples`` (sorted, in seconds), in milliseconds."""
+    return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+
+class Session:
+    """One virtual user: a keep-alive connection plus its cookies. Redirects are not followed."""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.netloc, timeout=timeout)
+        self.prefix = url.path.rstrip('/')
+        self.cookies = SimpleCookie()
+        self.csrf_token = ''
+
+    def request(self, method, path, data=None):
+        headers = {'Cookie': '; '.join(f'{key}={morsel.value}' for key, morsel in self.cookies.items())}
+        body = None
+        if method == 'POST':
+            body = urlencode(data or {}, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token
+        try:
+            self.connection.request(method, self.prefix + path, body, headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server may close a keep-alive connection between requests; retry once on a fresh one.
+            self.connection.close()
+            self.connection.request(method, self.prefix + path, body, headers)
+            response = self.connection.getresponse()
+        content = response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        if 'csrftoken' in self.cookies:
+            self.csrf_token = self.cookies['csrftoken'].value
+        return response.status, content
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay shopping journeys (sign in, browse, open a menu, add to cart, order, view profile) against a "
+        "running server from many concurrent users, then report latency percentiles and throughput per URL. "
+        "Expects customers created by seed_data. Every virtual user signs in from this machine's IP, so raise "
+        "LOGIN_THROTTLE['IP'] on the server for runs with more than a handful of users."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Simultaneous virtual users.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run for.')
+        parser.add_argument('--password', default='loadtest', help='Password given to seed_data.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        # Ids are read once up front, so the database only sees the traffic the server generates.
+        self.customers = list(
+            Customer.objects.filter(username__startswith='loadtest-').values_list('username', flat=True)
+        )
+        self.restaurant_ids = list(Restaurant.objects.filter(is_approved=True).values_list('pk', flat=True))
+        if not self.customers or not self.restaurant_ids:
+            raise CommandError("No load-test customers or restaurants found; run seed_data first.")
+        self.pages = max(1, (len(self.restaurant_ids) + 8) // 9)
+        self.menus = {}
+        for restaurant_id, food_id in FoodItem.objects.filter(restaurant_id__in=self.restaurant_ids).values_list(
+            'restaurant_id', 'pk'
+        ).iterator():
+            self.menus.setdefault(restaurant_id, []).append(food_id)
+
+        self.options = options
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        self.deadline = time.perf_counter() + options['duration']
+
+        started = time.perf_counter()
+        workers = [
+            threading.Thread(target=self.user, args=(n, random.Random(options['seed'] + n)), daemon=True)
+            for n in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.report(time.perf_counter() - started)
+
+    def timed(self, session, name, method, path, data=None, expect=(200, 302)):
+        start = time.perf_counter()
+        try:
+            status, content = session.request(method, path, data)
+        except (http.client.HTTPException, OSError):
+            status, content = None, b''
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples[name].append(elapsed)
+            if status not in expect:
+                self.errors[name] += 1
+        return status, content
+
+    def user(self, n, rng):
+        session = Session(self.options['url'], self.options['timeout'])
+        username = self.customers[n % len(self.customers)]
+        status, content = self.timed(session, 'signin', 'GET', reverse('signin'))
+        match = CSRF_INPUT.search(content.decode(errors='replace'))
+        if match and not session.csrf_token:
+            session.csrf_token = match.group(1)
+        self.timed(session, 'signin', 'POST', reverse('signin'), {
+            'username_or_email': username, 'password': self.options['password'],
+        }, expect=(302,))
+
+        while time.perf_counter() < self.deadline:
+            self.journey(session, rng)
+
+    def journey(self, session, rng):
+        page = rng.randint(1, self.pages)
+        self.timed(session, 'restaurant_list', 'GET', f"{reverse('restaurant_list')}?page={page}")
+
+        restaurant_id = rng.choice(self.restaurant_ids)
+        self.timed(session, 'menu', 'GET', reverse('menu', args=[restaurant_id]))
+
+        menu = self.menus.get(restaurant_id)
+        if not menu:
+            return
+        picked = rng.sample(menu, min(len(menu), rng.randint(1, 3)))
+        for food_id in picked:
+            self.timed(session, 'add_to_cart', 'POST', reverse('add_to_cart', args=[food_id]), {
+                'quantity': rng.randint(1, 2),
+            }, expect=(302,))
+        self.timed(session, 'place_order', 'POST', reverse('place_order'), {'selected_items': picked}, expect=(302,))
+        self.timed(session, 'profile', 'GET', reverse('profile'), expect=(200,))
+
+    def report(self, elapsed):
+        self.stdout.write(
+            f"{'url':<16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        total = 0
+        for name, samples in sorted(self.samples.items()):
+            samples.sort()
+            total += len(samples)
+            self.stdout.write(
+                f"{name:<16} {len(samples):>8} {self.errors[name]:>6} {len(samples) / elapsed:>8.1f} "
+                f"{percentile(samples, 50):>8.1f} {percentile(samples, 95):>8.1f} {percentile(samples, 99):>8.1f}"
+            )
+        self.stdout.write(f"{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s overall")
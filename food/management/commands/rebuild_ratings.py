@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from food import ratings
+from food.catalog_cache import bump_catalog_version
+from food.models import FoodItem, Restaurant
+
+
+class Command(BaseCommand):
+    help = "Recompute the rating aggregates on restaurants and food items from the Review table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            restaurants = self.rebuild(Restaurant, 'restaurant', batch_size)
+            food_items = self.rebuild(FoodItem, 'food_item', batch_size)
+            transaction.on_commit(bump_catalog_version)
+        self.stdout.write(self.style.SUCCESS(
+            f"Corrected {restaurants} restaurants and {food_items} food items."
+        ))
+
+    def rebuild(self, model, field, batch_size):
+        totals = ratings.review_totals(field)
+        empty = dict.fromkeys(ratings.AGGREGATE_FIELDS + ['rating_average'], 0)
+        fields = list(empty) + ['updated_at']
+        now = timezone.now()
+        changed = []
+        corrected = 0
+        queryset = model.objects.select_for_update().only(*empty)
+        for obj in queryset.iterator(chunk_size=batch_size):
+            expected = totals.get(obj.pk, empty)
+            if any(getattr(obj, name) != value for name, value in expected.items()):
+                for name, value in expected.items():
+                    setattr(obj, name, value)
+                obj.updated_at = now
+                changed.append(obj)
+            if len(changed) >= batch_size:
+                model.objects.bulk_update(changed, fields)
+                corrected += len(changed)
+                changed = []
+        model.objects.bulk_update(changed, fields)
+        return corrected + len(changed)
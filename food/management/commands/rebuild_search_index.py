@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from food import search
+from food.models import FoodItem, Restaurant, SearchIndexEntry, SearchTermVariant
+
+
+class Command(BaseCommand):
+    help = "Rebuild the restaurant and food item search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            SearchIndexEntry.objects.all().delete()
+            SearchTermVariant.objects.all().delete()
+            restaurants = self.index(
+                Restaurant.objects.only('name', 'description', 'address'), search.restaurant_postings, batch_size
+            )
+            food_items = self.index(
+                FoodItem.objects.only('restaurant_id', 'name', 'description'), search.food_item_postings, batch_size
+            )
+        self.stdout.write(self.style.SUCCESS(f"Indexed {restaurants} restaurants and {food_items} food items."))
+
+    def index(self, queryset, build_postings, batch_size):
+        count = 0
+        postings = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            postings.extend(build_postings(obj))
+            count += 1
+            if count % batch_size == 0:
+                search.save_postings(postings, batch_size)
+                postings = []
+        search.save_postings(postings, batch_size)
+        return count
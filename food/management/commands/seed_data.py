@@ -0,0 +1,192 @@
+import random
+import time
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from food.catalog_cache import bump_catalog_version
+from food.models import Cart, Customer, FoodItem, Order, OrderItem, Restaurant, Review
+
+CUISINES = ['Biryani', 'Burger', 'Pizza', 'Kebab', 'Noodle', 'Curry', 'Taco', 'Sushi', 'Salad', 'Dessert']
+DISHES = ['Chicken', 'Beef', 'Mutton', 'Veggie', 'Paneer', 'Fish', 'Prawn', 'Egg', 'Cheese', 'Mushroom']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def dish_price(food_id):
+    # Derived from the id, so orders can be priced without keeping every dish in memory.
+    return Decimal(500 + food_id * 37 % 2000) / 100
+
+
+def stored_images(directory):
+    """Images already uploaded under ``directory``, shared out to the synthetic rows (the menu page expects one)."""
+    try:
+        files = default_storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return [None]
+    images = sorted(f'{directory}/{name}' for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    return images or [None]
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-insert a synthetic catalog (restaurants, dishes, customers, carts, orders, reviews) for load tests. "
+        "Customers are named loadtest-<n> and share one password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=100)
+        parser.add_argument('--dishes', type=int, default=20, help='Dishes per restaurant.')
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--cart-items', type=int, default=2, help='Cart lines per customer.')
+        parser.add_argument('--orders', type=int, default=5, help='Orders per customer.')
+        parser.add_argument('--order-items', type=int, default=3, help='Lines per order.')
+        parser.add_argument('--reviews', type=int, default=10, help='Reviews per restaurant, half of them on dishes.')
+        parser.add_argument('--password', default='loadtest')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-search-index', action='store_true', help="Don't rebuild the search index afterwards.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+        restaurants, dishes, customers = options['restaurants'], options['dishes'], options['customers']
+        if not (restaurants and dishes and customers):
+            self.stderr.write("--restaurants, --dishes and --customers must all be positive.")
+            return
+
+        # Rows are given explicit primary keys so related rows can be built without reading ids back.
+        with transaction.atomic():
+            first_restaurant = self.next_pk(Restaurant)
+            first_food = self.next_pk(FoodItem)
+            first_customer = self.next_pk(Customer)
+            first_user = self.next_pk(User)
+            restaurant_ids = range(first_restaurant, first_restaurant + restaurants)
+            customer_ids = range(first_customer, first_customer + customers)
+            user_ids = range(first_user, first_user + customers)
+
+            def dishes_of(restaurant_id):
+                start = first_food + (restaurant_id - first_restaurant) * dishes
+                return range(start, start + dishes)
+
+            restaurant_images = stored_images('restaurant_images')
+            food_images = stored_images('food_images')
+            self.insert(Restaurant, (
+                Restaurant(
+                    restaurant_id=pk, name=f'{self.rng.choice(CUISINES)} House {pk}', address=f'{pk} Load Test Road',
+                    description=f'Synthetic restaurant {pk}', is_approved=True, is_featured=pk % 20 == 0,
+                    delivery_charge=Decimal(self.rng.randrange(0, 500)) / 100,
+                    image=self.rng.choice(restaurant_images),
+                )
+                for pk in restaurant_ids
+            ))
+            self.insert(FoodItem, (
+                FoodItem(
+                    food_id=pk, restaurant_id=restaurant_id, price=dish_price(pk),
+                    name=f'{self.rng.choice(DISHES)} {self.rng.choice(CUISINES)} {pk}', description='Synthetic dish',
+                    image=self.rng.choice(food_images),
+                )
+                for restaurant_id in restaurant_ids for pk in dishes_of(restaurant_id)
+            ))
+
+            password = make_password(options['password'])
+            # Customers sign in to the shop; reviews are written by the auth User of the same name.
+            self.insert(Customer, (
+                Customer(user_id=pk, username=f'loadtest-{pk}', email=f'loadtest-{pk}@example.com',
+                         password=password, phone='0')
+                for pk in customer_ids
+            ))
+            self.insert(User, (
+                User(id=pk, username=f'loadtest-{customer_id}', password=password)
+                for pk, customer_id in zip(user_ids, customer_ids)
+            ))
+
+            food_ids = range(first_food, first_food + restaurants * dishes)
+
+            def lines(count):
+                # Distinct dishes from one restaurant, like a real basket.
+                menu = dishes_of(self.rng.choice(restaurant_ids))
+                return self.rng.sample(menu, min(count, dishes))
+
+            self.insert(Cart, (
+                Cart(customer_id=customer_id, food_id=food_id, quantity=self.rng.randint(1, 3))
+                for customer_id in customer_ids for food_id in lines(options['cart_items'])
+            ))
+            self.insert_orders(customer_ids, options['orders'], options['order_items'], lines)
+
+            per_restaurant = options['reviews']
+            self.insert(Review, (
+                self.review(user_ids, restaurant_id, dishes_of(restaurant_id), n % 2)
+                for restaurant_id in restaurant_ids for n in range(per_restaurant)
+            ))
+
+        call_command('rebuild_ratings', batch_size=self.batch_size, stdout=self.stdout)
+        if not options['skip_search_index']:
+            call_command('rebuild_search_index', batch_size=self.batch_size, stdout=self.stdout)
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(restaurant_ids)} restaurants, {len(food_ids)} dishes and {customers} customers "
+            f"in {time.perf_counter() - self.started:.1f}s."
+        ))
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def insert(self, model, rows):
+        count = 0
+        for batch in batches(rows, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            count += len(batch)
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {count} rows ({time.perf_counter() - self.started:.1f}s)")
+
+    def insert_orders(self, customer_ids, per_customer, per_order, lines):
+        first_order = self.next_pk(Order)
+        orders, items = [], []
+
+        def flush():
+            Order.objects.bulk_create(orders, batch_size=self.batch_size)
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+            orders.clear()
+            items.clear()
+
+        order_id = first_order
+        for customer_id in customer_ids:
+            for _ in range(per_customer):
+                basket = [(food_id, self.rng.randint(1, 3)) for food_id in lines(per_order)]
+                orders.append(Order(
+                    order_id=order_id, customer_id=customer_id, status='Confirmed',
+                    total_price=sum(dish_price(food_id) * quantity for food_id, quantity in basket),
+                ))
+                items.extend(OrderItem(order_id=order_id, food_id=food_id, quantity=quantity) for food_id, quantity in basket)
+                order_id += 1
+                if len(items) >= self.batch_size:
+                    flush()
+        flush()
+        self.stdout.write(
+            f"orders: {order_id - first_order} rows, with their items ({time.perf_counter() - self.started:.1f}s)"
+        )
+
+    def review(self, user_ids, restaurant_id, menu, on_dish):
+        # bulk_create skips Review.save(), so menu_restaurant is filled in here.
+        review = Review(
+            user_id=self.rng.choice(user_ids), rating=self.rng.choices(range(1, 6), weights=[1, 1, 2, 4, 4])[0],
+            review_text='Synthetic review', menu_restaurant_id=restaurant_id,
+        )
+        if on_dish:
+            review.food_item_id = self.rng.choice(menu)
+        else:
+            review.restaurant_id = restaurant_id
+        return review
@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+
+from food import jobs
+from food.order_events import prune_events
+from food.models import Job
+
+OUTCOMES = [Job.DONE, Job.QUEUED, Job.FAILED]
+
+
+def worker_process(worker_id, stop, options, counters):
+    # Ctrl-C reaches the whole process group; the parent decides when to stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    random.seed()  # forked children would otherwise share the parent's retry jitter
+
+    def on_result(status):
+        with counters.get_lock():
+            counters[OUTCOMES.index(status)] += 1
+
+    while not stop.is_set():
+        try:
+            jobs.work(worker_id, stop.is_set, options['batch_size'], options['lease'], on_result)
+        except DatabaseError as exc:
+            # A lost connection or a lock timeout. Jobs this process had claimed come back when their lease ends.
+            sys.stderr.write(f"{worker_id}: {exc}\n")
+            connections.close_all()
+        else:
+            if options['once']:
+                return
+        stop.wait(options['poll_interval'])
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (food.jobs) in several processes until interrupted, reporting throughput "
+        "and queue depth every --stats-interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=jobs.BATCH_SIZE, help='Jobs claimed at a time.')
+        parser.add_argument('--poll-interval', type=float, default=1, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--lease', type=int, default=jobs.LEASE_SECONDS,
+                            help='Seconds a claimed job is reserved before another worker may take it over.')
+        parser.add_argument('--stats-interval', type=float, default=10)
+        parser.add_argument('--once', action='store_true', help='Exit once nothing is due instead of waiting.')
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        self.stop = context.Event()
+        self.counters = context.Array('q', len(OUTCOMES))
+        self.options = options
+        self.processes = {}
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        for n in range(options['processes']):
+            self.start(n, f'{prefix}:{n}')
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: self.stop.set())
+
+        started = last_report = time.monotonic()
+        reported = [0] * len(OUTCOMES)
+        while any(process.is_alive() for process in self.processes.values()):
+            self.stop.wait(min(1, options['stats_interval']))
+            if self.stop.is_set():
+                break
+            if not options['once']:
+                for n, process in list(self.processes.items()):
+                    if not process.is_alive():
+                        self.stderr.write(f"Worker {n} exited with code {process.exitcode}; restarting it.")
+                        self.start(n, f'{prefix}:{n}')
+            if time.monotonic() - last_report >= options['stats_interval']:
+                jobs.requeue_expired()
+                jobs.prune_done()
+                prune_events()
+                reported = self.report(reported, time.monotonic() - last_report)
+                last_report = time.monotonic()
+
+        for process in self.processes.values():
+            process.join()
+        self.report([0] * len(OUTCOMES), time.monotonic() - started, total=True)
+
+    def start(self, n, worker_id):
+        # Children must open their own database connections.
+        connections.close_all()
+        process = multiprocessing.get_context('fork').Process(
+            target=worker_process, args=(worker_id, self.stop, self.options, self.counters), daemon=True,
+        )
+        process.start()
+        self.processes[n] = process
+
+    def report(self, previous, elapsed, total=False):
+        current = list(self.counters)
+        done, retried, failed = (now - before for now, before in zip(current, previous))
+        stats = jobs.queue_stats()
+        counts = stats['counts']
+        self.stdout.write(
+            f"{'total: ' if total else ''}{done / elapsed:.1f} jobs/s ({done} done, {retried} retried, {failed} failed "
+            f"in {elapsed:.1f}s); queue: {counts[Job.QUEUED]} queued, {counts[Job.RUNNING]} running, "
+            f"{counts[Job.FAILED]} failed, oldest due job waiting {stats['oldest_wait']:.1f}s"
+        )
+        return current
@@ -0,0 +1,258 @@
+# food/menu_import.py
+"""
+Bulk import of restaurants and dishes from CSV or JSONL.
+
+Every row is a restaurant (``type`` = ``restaurant``) or a dish (``type`` =
+``dish``, the default), with the columns of RestaurantForm or FoodItemForm.
+A dish names its restaurant by ``restaurant_id`` or by ``restaurant`` (a name
+already in the database or imported earlier in the file), and ``image`` is
+the path of a file already in media storage. Restaurants are matched by name
+and dishes by (restaurant, name): existing rows are updated, the rest created.
+
+Rows are validated with the forms as they are read and written in batches,
+one lookup query plus bulk_create/bulk_update per batch, so memory use does
+not grow with the file. Bulk writes skip model signals, so each batch also
+does what food.signals would have: search postings, opening hours,
+typeahead, menu freshness, and the catalog and price versions.
+"""
+import csv
+import json
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import opening_hours, search
+from .autocomplete import autocomplete
+from .cart_summary import bump_price_version
+from .catalog_cache import bump_catalog_version
+from .forms import FoodItemForm, RestaurantForm
+from .images import schedule_derivatives
+from .models import FoodItem, Restaurant, SearchIndexEntry
+
+RESTAURANT = 'restaurant'
+DISH = 'dish'
+FORMATS = ('csv', 'jsonl')
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+RESTAURANT_FIELDS = [field for field in RestaurantForm._meta.fields if field != 'name'] + ['updated_at']
+DISH_FIELDS = [field for field in FoodItemForm._meta.fields if field != 'name'] + ['updated_at']
+
+
+def guess_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower()
+    return 'jsonl' if extension == 'ndjson' else extension if extension in FORMATS else None
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, row) from a text stream; row is a dict of strings, or an error message."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, f'Invalid JSON: {exc}'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, 'Expected a JSON object.'
+            continue
+        yield line_number, {key: '' if value is None else str(value) for key, value in row.items()}
+
+
+def _form_errors(form):
+    return '; '.join(
+        ' '.join(messages) if field == '__all__' else f"{field}: {' '.join(messages)}"
+        for field, messages in form.errors.items()
+    )
+
+
+def _restaurant_reference(row):
+    if row.get('restaurant_id'):
+        try:
+            return int(row['restaurant_id'])
+        except ValueError:
+            return None
+    return row.get('restaurant') or None
+
+
+def _match(by_key, existing, now):
+    """Split validated instances into (new, changed, with a new image), carrying over pk and image from ``existing``."""
+    new, changed, fresh_images = [], [], []
+    for key, instance in by_key.items():
+        current = existing.get(key)
+        if instance.image and (current is None or instance.image != current.image):
+            # bulk_update doesn't call pre_save, which is what stores an uploaded file.
+            instance._meta.get_field('image').pre_save(instance, add=current is None)
+            fresh_images.append(instance)
+        if current is None:
+            new.append(instance)
+            continue
+        instance.pk = current.pk
+        instance.image = instance.image or current.image
+        instance.updated_at = now
+        changed.append(instance)
+    return new, changed, fresh_images
+
+
+class MenuImport:
+    """Feed rows with add() (or a whole file with run()), then call finish(). Counts and errors are kept on the instance."""
+
+    def __init__(self, restaurant=None, batch_size=IMPORT_BATCH_SIZE):
+        # With a restaurant, every row is one of its dishes and restaurant rows are refused.
+        self.restaurant = restaurant
+        self.batch_size = batch_size
+        self.created = {RESTAURANT: 0, DISH: 0}
+        self.updated = {RESTAURANT: 0, DISH: 0}
+        self.errors = []  # the first MAX_REPORTED_ERRORS, as {'line': ..., 'error': ...}
+        self.error_count = 0
+        self._restaurants = []  # (line, Restaurant) waiting for the next flush
+        self._dishes = []  # (line, FoodItem, restaurant id or name)
+
+    def run(self, stream, file_format):
+        for line, row in read_rows(stream, file_format):
+            if isinstance(row, str):
+                self.error(line, row)
+            else:
+                self.add(line, row)
+        self.finish()
+        return self
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def add(self, line, row, files=None):
+        kind = (row.get('type') or DISH).strip().lower()
+        if kind == DISH:
+            form = FoodItemForm(data=row, files=files)
+        elif kind == RESTAURANT and self.restaurant is None:
+            form = RestaurantForm(data=row, files=files)
+        else:
+            return self.error(line, f'Rows of type {kind!r} are not accepted here.')
+        if not form.is_valid():
+            return self.error(line, _form_errors(form))
+
+        instance = form.instance
+        if row.get('image'):
+            if not default_storage.exists(row['image']):
+                return self.error(line, f"image: {row['image']} is not in media storage.")
+            instance.image = row['image']
+        if kind == RESTAURANT:
+            self._restaurants.append((line, instance))
+        else:
+            reference = self.restaurant.pk if self.restaurant is not None else _restaurant_reference(row)
+            if reference is None:
+                return self.error(line, 'restaurant: give a restaurant_id or a restaurant name.')
+            self._dishes.append((line, instance, reference))
+        if len(self._restaurants) + len(self._dishes) >= self.batch_size:
+            self.flush()
+
+    def finish(self):
+        self.flush()
+
+    def flush(self):
+        restaurants, dishes = self._restaurants, self._dishes
+        self._restaurants, self._dishes = [], []
+        with transaction.atomic():
+            # Restaurants first, so dishes in the same batch can refer to them by name.
+            if restaurants:
+                self._write_restaurants(restaurants)
+            if dishes:
+                self._write_dishes(dishes)
+
+    def _write_restaurants(self, rows):
+        now = timezone.now()
+        by_name = {instance.name: instance for _, instance in rows}  # a later row for the same name wins
+        existing = {
+            restaurant.name: restaurant
+            for restaurant in Restaurant.objects.filter(name__in=by_name).only('name', 'image', 'weekly_schedule').order_by('-pk')
+        }
+        new, changed, fresh_images = _match(by_name, existing, now)
+        Restaurant.objects.bulk_create(new, batch_size=self.batch_size)
+        Restaurant.objects.bulk_update(changed, RESTAURANT_FIELDS, batch_size=self.batch_size)
+        if new and new[0].pk is None:  # backends that don't return ids from a bulk insert
+            new = list(Restaurant.objects.filter(name__in=[instance.name for instance in new]))
+
+        search.reindex(SearchIndexEntry.RESTAURANT, new + changed, search.restaurant_postings, self.batch_size)
+        for instance in new + changed:
+            current = existing.get(instance.name)
+            if current is not None and instance.weekly_schedule == current.weekly_schedule:
+                continue
+            try:
+                hours = opening_hours.parse_schedule(instance.weekly_schedule)
+            except ValueError:
+                continue  # RestaurantForm has already rejected these rows
+            opening_hours.set_hours(instance.pk, hours)
+        for instance in new:
+            autocomplete.added('restaurants', instance.name, instance.pk)
+        for instance in fresh_images:
+            schedule_derivatives(instance.image)
+        transaction.on_commit(bump_catalog_version)
+        self.created[RESTAURANT] += len(new)
+        self.updated[RESTAURANT] += len(changed)
+
+    def _write_dishes(self, rows):
+        now = timezone.now()
+        ids = {reference for _, _, reference in rows if isinstance(reference, int)}
+        names = {reference for _, _, reference in rows if isinstance(reference, str)}
+        known_ids = set(Restaurant.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+        ids_by_name = dict(
+            Restaurant.objects.filter(name__in=names).order_by('-pk').values_list('name', 'pk')
+        ) if names else {}
+
+        by_key = {}
+        for line, instance, reference in rows:
+            restaurant_id = reference if reference in known_ids else ids_by_name.get(reference)
+            if restaurant_id is None:
+                self.error(line, f'restaurant: {reference!r} does not exist.')
+                continue
+            instance.restaurant_id = restaurant_id
+            by_key[restaurant_id, instance.name] = instance
+        if not by_key:
+            return
+        restaurant_ids = {restaurant_id for restaurant_id, _ in by_key}
+
+        existing = {
+            (food.restaurant_id, food.name): food
+            for food in FoodItem.objects.filter(restaurant_id__in=restaurant_ids, name__in={name for _, name in by_key})
+            .only('restaurant_id', 'name', 'image')
+            .order_by('-pk')
+        }
+        new, changed, fresh_images = _match(by_key, existing, now)
+        FoodItem.objects.bulk_create(new, batch_size=self.batch_size)
+        FoodItem.objects.bulk_update(changed, DISH_FIELDS, batch_size=self.batch_size)
+        if new and new[0].pk is None:
+            new_keys = {(instance.restaurant_id, instance.name) for instance in new}
+            new = [
+                food for food in FoodItem.objects.filter(
+                    restaurant_id__in=restaurant_ids, name__in={name for _, name in new_keys}
+                ) if (food.restaurant_id, food.name) in new_keys
+            ]
+
+        search.reindex(SearchIndexEntry.FOOD_ITEM, new + changed, search.food_item_postings, self.batch_size)
+        for instance in new:
+            autocomplete.added('dishes', instance.name, instance.pk)
+        for instance in fresh_images:
+            schedule_derivatives(instance.image)
+        # The menu pages' ETags follow their restaurant's updated_at.
+        Restaurant.objects.filter(pk__in=restaurant_ids).update(updated_at=now)
+        if changed:
+            transaction.on_commit(bump_price_version)
+        self.created[DISH] += len(new)
+        self.updated[DISH] += len(changed)
+
+    def summary(self):
+        return {
+            'restaurants': {'created': self.created[RESTAURANT], 'updated': self.updated[RESTAURANT]},
+            'dishes': {'created': self.created[DISH], 'updated': self.updated[DISH]},
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
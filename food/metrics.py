@@ -0,0 +1,238 @@
+# food/metrics.py
+"""
+Per-view request metrics: latency, SQL queries and template render time, keyed by URL name.
+
+metrics_middleware times each request and files it under its resolved URL
+name. SQL is timed by an execute wrapper installed on every new database
+connection, and templates by the MetricsDjangoTemplates backend. Both report
+to the current request through a context variable, so they work the same
+under WSGI, under ASGI, and inside sync_to_async threads.
+
+Totals are kept per process. Under a multi-process server each worker
+exposes its own numbers, so scrape or aggregate them per worker.
+"""
+import asyncio
+import bisect
+import contextvars
+import copy
+import json
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from django.utils.decorators import sync_and_async_middleware
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current = contextvars.ContextVar('food_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_seconds', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewMetrics:
+    __slots__ = ('requests', 'errors', 'latency', 'queries', 'sql_seconds', 'template_seconds')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, status, seconds, request_metrics):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.requests += 1
+            if status >= 500:
+                metrics.errors += 1
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(request_metrics.queries)
+            metrics.sql_seconds += request_metrics.sql_seconds
+            metrics.template_seconds += request_metrics.template_seconds
+
+    def snapshot(self):
+        """A copy of every view's metrics, so exporters never read while a request is recording."""
+        with self._lock:
+            return copy.deepcopy(self._views)
+
+
+registry = Registry()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+def _start():
+    return _current.set(RequestMetrics()), time.perf_counter()
+
+
+def _finish(request, response, token, start):
+    seconds = time.perf_counter() - start
+    request_metrics = _current.get()
+    _current.reset(token)
+    registry.record(_view_name(request), response.status_code, seconds, request_metrics)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token, start = _start()
+            response = await get_response(request)
+            _finish(request, response, token, start)
+            return response
+    else:
+        def middleware(request):
+            token, start = _start()
+            response = get_response(request)
+            _finish(request, response, token, start)
+            return response
+    return middleware
+
+
+def _time_query(execute, sql, params, many, context):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.sql_seconds += time.perf_counter() - start
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # connection_created receiver: time every query run on this connection.
+    connection.execute_wrappers.append(_time_query)
+
+
+class MetricsTemplate(Template):
+    def render(self, context=None, request=None):
+        request_metrics = _current.get()
+        if request_metrics is None:
+            return super().render(context, request)
+        # Only the outermost render counts, so a template rendered while rendering another isn't counted twice.
+        request_metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.template_depth -= 1
+            if not request_metrics.template_depth:
+                request_metrics.template_seconds += time.perf_counter() - start
+
+
+class MetricsDjangoTemplates(DjangoTemplates):
+    """The stock Django template backend, with render time reported to food.metrics."""
+
+    def from_string(self, template_code):
+        return MetricsTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return MetricsTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshot):
+    """Render a registry snapshot in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    views = sorted(snapshot.items())
+    family('grabnow_requests_total', 'counter', 'Requests handled, by URL name.', [
+        f'grabnow_requests_total{{view="{_label(view)}"}} {m.requests}' for view, m in views
+    ])
+    family('grabnow_request_errors_total', 'counter', 'Requests answered with a 5xx status, by URL name.', [
+        f'grabnow_request_errors_total{{view="{_label(view)}"}} {m.errors}' for view, m in views
+    ])
+    for name, attr, help_text in (
+        ('grabnow_request_duration_seconds', 'latency', 'Time spent handling the request.'),
+        ('grabnow_request_queries', 'queries', 'SQL queries run per request.'),
+    ):
+        samples = []
+        for view, m in views:
+            histogram = getattr(m, attr)
+            label = _label(view)
+            for bound, count in histogram.cumulative():
+                samples.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {count}')
+            samples.append(f'{name}_sum{{view="{label}"}} {histogram.sum}')
+            samples.append(f'{name}_count{{view="{label}"}} {m.requests}')
+        family(name, 'histogram', help_text, samples)
+    family('grabnow_sql_seconds_total', 'counter', 'Time spent executing SQL, by URL name.', [
+        f'grabnow_sql_seconds_total{{view="{_label(view)}"}} {m.sql_seconds}' for view, m in views
+    ])
+    family('grabnow_template_seconds_total', 'counter', 'Time spent rendering templates, by URL name.', [
+        f'grabnow_template_seconds_total{{view="{_label(view)}"}} {m.template_seconds}' for view, m in views
+    ])
+    return '\n'.join(lines) + '\n'
+
+
+def jsonl(snapshot):
+    """One JSON object per URL name, for ad-hoc analysis or shipping to a log pipeline."""
+    timestamp = time.time()
+    lines = []
+    for view, m in sorted(snapshot.items()):
+        lines.append(json.dumps({
+            'timestamp': timestamp,
+            'view': view,
+            'requests': m.requests,
+            'errors': m.errors,
+            'latency_seconds_sum': m.latency.sum,
+            'latency_buckets': {str(bound): count for bound, count in m.latency.cumulative()},
+            'queries_sum': m.queries.sum,
+            'queries_buckets': {str(bound): count for bound, count in m.queries.cumulative()},
+            'sql_seconds': m.sql_seconds,
+            'template_seconds': m.template_seconds,
+        }))
+    return '\n'.join(lines) + '\n' if lines else ''
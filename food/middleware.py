@@ -0,0 +1,138 @@
+# food/middleware.py
+import json
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .models import Customer
+
+
+def get_customer(request):
+    """Load the signed-in customer (with preferences) once per request."""
+    if not hasattr(request, '_cached_customer'):
+        customer = None
+        customer_id = request.session.get('customer_id')
+        if customer_id is not None:
+            customer = (
+                Customer.objects.filter(user_id=customer_id)
+                .prefetch_related('preferences_set')
+                .first()
+            )
+        request._cached_customer = customer
+    return request._cached_customer
+
+
+async def aget_customer(request):
+    """get_customer for async views, which can't touch request.customer: the ORM refuses sync queries there."""
+    if not hasattr(request, '_cached_customer'):
+        customer = None
+        # Loading the session may query the database too.
+        customer_id = await sync_to_async(request.session.get)('customer_id')
+        if customer_id is not None:
+            customer = (
+                await Customer.objects.filter(user_id=customer_id)
+                .prefetch_related('preferences_set')
+                .afirst()
+            )
+        request._cached_customer = customer
+    return request._cached_customer
+
+
+class CustomerMiddleware:
+    # Must come after SessionMiddleware; nothing is queried until request.customer is used.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: get_customer(request))
+        return self.get_response(request)
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the collectstatic output in STATIC_ROOT without going through the rest of the stack.
+
+    Only active once ``collectstatic`` has written a manifest. Content-hashed
+    names are sent with a one-year immutable Cache-Control; unhashed names must
+    be revalidated. Pre-compressed siblings written by
+    food.storage.CompressedManifestStaticFilesStorage are preferred when the
+    client accepts them.
+    """
+    sync_capable = True
+    async_capable = True
+    ENCODINGS = [('br', re.compile(r'\bbr\b'), '.br'), ('gzip', re.compile(r'\bgzip\b'), '.gz')]
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.root = settings.STATIC_ROOT
+        manifest = os.path.join(self.root, 'staticfiles.json') if self.root else None
+        if not manifest or not os.path.isfile(manifest):
+            raise MiddlewareNotUsed
+        with open(manifest) as f:
+            self.hashed_names = set(json.load(f)['paths'].values())
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.static_response(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        # A stat() and an open() don't need a thread of their own.
+        response = self.static_response(request)
+        return await self.get_response(request) if response is None else response
+
+    def static_response(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(settings.STATIC_URL):
+            return self.serve(request, request.path_info[len(settings.STATIC_URL):])
+        return None
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except ValueError:
+            return None
+        if name.endswith(('.gz', '.br')) or not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        immutable = name in self.hashed_names
+        if not immutable and not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        content_type, _ = mimetypes.guess_type(name)
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding, compressible = None, False
+        for candidate, accepts, suffix in self.ENCODINGS:
+            if os.path.isfile(path + suffix):
+                compressible = True
+                if encoding is None and accepts.search(accept_encoding):
+                    encoding, path = candidate, path + suffix
+
+        response = FileResponse(
+            open(path, 'rb'), filename=os.path.basename(name), content_type=content_type or 'application/octet-stream',
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if compressible:
+            response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = self.IMMUTABLE if immutable else 'public, no-cache'
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        return response
@@ -0,0 +1,100 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:07
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# A copy of food.search's tokenizer as of this migration, so later changes to it don't change what it did.
+PREFIX_MIN_LENGTH = 2
+TYPO_MIN_LENGTH = 4
+MAX_TERM_LENGTH = 64
+BATCH_SIZE = 1000
+
+_word_re = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    words = _word_re.findall(normalize_text(text))
+    return [word[:MAX_TERM_LENGTH] for word in words if len(word) >= PREFIX_MIN_LENGTH]
+
+
+def deletion_variants(term):
+    variants = {term}
+    if len(term) >= TYPO_MIN_LENGTH:
+        variants.update(term[:i] + term[i + 1:] for i in range(len(term)))
+    return variants
+
+
+def build_search_index(apps, schema_editor):
+    # Existing restaurants and dishes would otherwise be unsearchable until rebuild_search_index is run.
+    SearchIndexEntry = apps.get_model('food', 'SearchIndexEntry')
+    SearchTermVariant = apps.get_model('food', 'SearchTermVariant')
+    documents = [
+        ('r', apps.get_model('food', 'Restaurant'), {'name': 3, 'description': 1, 'address': 1}),
+        ('f', apps.get_model('food', 'FoodItem'), {'name': 3, 'description': 1}),
+    ]
+    terms = set()
+    for doc_type, model, field_weights in documents:
+        postings = []
+        for instance in model.objects.iterator(chunk_size=BATCH_SIZE):
+            weights = {}
+            for field, weight in field_weights.items():
+                for term in set(tokenize(getattr(instance, field))):
+                    weights[term] = weights.get(term, 0) + weight
+            restaurant_id = instance.pk if doc_type == 'r' else instance.restaurant_id
+            postings += [
+                SearchIndexEntry(term=term, doc_type=doc_type, doc_id=instance.pk, restaurant_id=restaurant_id, weight=weight)
+                for term, weight in weights.items()
+            ]
+            terms.update(weights)
+            if len(postings) >= BATCH_SIZE:
+                SearchIndexEntry.objects.bulk_create(postings)
+                postings = []
+        SearchIndexEntry.objects.bulk_create(postings)
+    SearchTermVariant.objects.bulk_create(
+        [SearchTermVariant(variant=variant, term=term) for term in terms for variant in deletion_variants(term)],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0010_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTermVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant', models.CharField(db_index=True, max_length=64)),
+                ('term', models.CharField(max_length=64)),
+            ],
+            options={
+                'unique_together': {('variant', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('doc_type', models.CharField(choices=[('r', 'Restaurant'), ('f', 'Food item')], max_length=1)),
+                ('doc_id', models.IntegerField()),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'doc_type', 'weight', 'doc_id'], name='food_search_term_idx'), models.Index(fields=['restaurant', 'term'], name='food_search_rest_term_idx'), models.Index(fields=['doc_id', 'doc_type'], name='food_search_doc_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
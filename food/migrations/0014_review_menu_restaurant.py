@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_menu_restaurant(apps, schema_editor):
+    Review = apps.get_model('food', 'Review')
+    FoodItem = apps.get_model('food', 'FoodItem')
+    Review.objects.filter(restaurant__isnull=False).update(menu_restaurant=models.F('restaurant'))
+    dish_restaurant = FoodItem.objects.filter(pk=OuterRef('food_item')).values('restaurant')[:1]
+    Review.objects.filter(restaurant__isnull=True, food_item__isnull=False).update(
+        menu_restaurant=Subquery(dish_restaurant)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0013_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='menu_restaurant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='menu_reviews', to='food.restaurant'),
+        ),
+        migrations.RunPython(backfill_menu_restaurant, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['menu_restaurant', 'created_at', 'id'], name='food_review_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:27
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_rows(apps, schema_editor):
+    # Fold repeated (customer, food) rows into the oldest one so the unique constraint can be added.
+    Cart = apps.get_model('food', 'Cart')
+    duplicates = (
+        Cart.objects.values('customer_id', 'food_id')
+        .annotate(rows=Count('pk'), keep=Min('pk'), quantity=Sum('quantity'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        rows = Cart.objects.filter(customer_id=row['customer_id'], food_id=row['food_id'])
+        rows.exclude(pk=row['keep']).delete()
+        rows.filter(pk=row['keep']).update(quantity=row['quantity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0015_order_history_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['restaurant', 'name'], name='food_fooditem_menu_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['is_featured'], name='food_restaurant_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['is_approved'], name='food_restaurant_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-rating_average', '-rating_count', 'restaurant_id'], name='food_restaurant_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['restaurant', 'created_at'], name='food_review_restaurant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['food_item', 'created_at'], name='food_review_food_item_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_cart_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('customer', 'food'), name='food_cart_customer_food_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+def delete_empty_cart_lines(apps, schema_editor):
+    # Lines left at 0 or below by the old read-modify-write remove_from_cart.
+    apps.get_model('food', 'Cart').objects.filter(quantity__lt=1).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0018_order_pipeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_empty_cart_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gte', 1)), name='food_cart_quantity_positive'),
+        ),
+    ]
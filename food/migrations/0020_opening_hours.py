@@ -0,0 +1,172 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:20
+
+import re
+from datetime import time
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# A copy of food.opening_hours as of this migration, so later changes to the parser don't change what it did.
+MINUTES_PER_DAY = 24 * 60
+HOURS_PER_WEEK = 7 * 24
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DAY_GROUPS = {
+    'daily': range(7), 'everyday': range(7), 'every day': range(7),
+    'weekdays': range(5), 'weekends': range(5, 7),
+}
+
+_hours_start = re.compile(r'\d|\b(?:closed|noon|midnight)\b', re.IGNORECASE)
+_range = re.compile(r'\s*(?:-|–|—|\bto\b)\s*', re.IGNORECASE)
+_time = re.compile(r'^(\d{1,2})(?:[:.](\d{2}))?\s*(?:([ap])\.?m\.?)?$', re.IGNORECASE)
+
+
+def _weekday(name):
+    name = name.strip().rstrip('.').lower()
+    for number, weekday in enumerate(WEEKDAYS):
+        # Full names and any abbreviation of at least two letters: "Mon", "Tues", "Th".
+        if len(name) >= 2 and weekday.startswith(name):
+            return number
+    raise ValueError(f'Unknown day "{name}".')
+
+
+def _days(text):
+    days = []
+    for part in re.split(r'\s*(?:,|&|\band\b)\s*', text.strip().lower()):
+        if part in DAY_GROUPS:
+            days += DAY_GROUPS[part]
+            continue
+        bounds = _range.split(part)
+        if len(bounds) == 1:
+            days.append(_weekday(part))
+        elif len(bounds) == 2:
+            first, last = _weekday(bounds[0]), _weekday(bounds[1])
+            days += [(first + n) % 7 for n in range((last - first) % 7 + 1)]  # "Fri-Mon" wraps past Sunday
+        else:
+            raise ValueError(f'Unknown days "{part}".')
+    return days
+
+
+def _time_of_day(text):
+    text = text.strip().lower()
+    if text in ('noon', 'midday'):
+        return time(12)
+    if text == 'midnight':
+        return time(0)
+    match = _time.match(text)
+    if match is None:
+        raise ValueError(f'Unknown time "{text}".')
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), (match.group(3) or '').lower()
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError(f'Unknown time "{text}".')
+        hour = hour % 12 + (12 if meridiem == 'p' else 0)
+    if (hour, minute) == (24, 0):
+        return time(0)
+    if hour > 23 or minute > 59:
+        raise ValueError(f'Unknown time "{text}".')
+    return time(hour, minute)
+
+
+def parse_schedule(text):
+    """
+    Read a free-text weekly schedule into sorted (weekday, opens, closes) tuples, weekday 0 being
+    Monday. One entry per line or ';'; raises ValueError naming the first entry it can't read.
+    """
+    hours = set()
+    for entry in re.split(r'[;\n]', text or ''):
+        entry = entry.strip()
+        if not entry:
+            continue
+        start = _hours_start.search(entry)
+        if start is None or not entry[:start.start()].strip(' :'):
+            raise ValueError(f'Can\'t read "{entry}": expected days followed by hours, like "Mon-Fri 10:00-22:00".')
+        try:
+            days = _days(entry[:start.start()].strip(' :'))
+            spans = entry[start.start():].strip()
+            if spans.lower() == 'closed':
+                continue
+            for span in re.split(r'\s*(?:,|&|\band\b)\s*', spans):
+                bounds = _range.split(span)
+                if len(bounds) != 2:
+                    raise ValueError(f'Unknown hours "{span}".')
+                opens, closes = _time_of_day(bounds[0]), _time_of_day(bounds[1])
+                hours.update((day, opens, closes) for day in days)
+        except ValueError as exc:
+            raise ValueError(f'Can\'t read "{entry}": {exc}') from None
+    return sorted(hours)
+
+
+def week_minutes(weekday, opens, closes):
+    """The span as [start, end) minutes from Monday 00:00; end may pass the end of the week."""
+    start = weekday * MINUTES_PER_DAY + opens.hour * 60 + opens.minute
+    length = (closes.hour * 60 + closes.minute - opens.hour * 60 - opens.minute) % MINUTES_PER_DAY
+    return start, start + (length or MINUTES_PER_DAY)  # opening and closing at the same time means all day
+
+
+def slots(hours):
+    """(hour of the week, from_minute, to_minute) index rows for (weekday, opens, closes) tuples."""
+    rows = set()
+    for weekday, opens, closes in hours:
+        start, end = week_minutes(weekday, opens, closes)
+        for hour in range(start // 60, (end - 1) // 60 + 1):
+            rows.add((hour % HOURS_PER_WEEK, max(start - hour * 60, 0), min(end - hour * 60, 60)))
+    return sorted(rows)
+
+
+def parse_weekly_schedules(apps, schema_editor):
+    # Schedules the parser can't read stay as text only, and those restaurants don't match "open now".
+    Restaurant = apps.get_model('food', 'Restaurant')
+    OpeningHours = apps.get_model('food', 'OpeningHours')
+    OpenHourSlot = apps.get_model('food', 'OpenHourSlot')
+    schedules = Restaurant.objects.exclude(weekly_schedule__isnull=True).exclude(weekly_schedule='')
+    for restaurant_id, schedule in schedules.values_list('pk', 'weekly_schedule').iterator():
+        try:
+            hours = parse_schedule(schedule)
+        except ValueError:
+            continue
+        OpeningHours.objects.bulk_create(
+            OpeningHours(restaurant_id=restaurant_id, weekday=weekday, opens=opens, closes=closes)
+            for weekday, opens, closes in hours
+        )
+        OpenHourSlot.objects.bulk_create(
+            OpenHourSlot(restaurant_id=restaurant_id, hour=hour, from_minute=from_minute, to_minute=to_minute)
+            for hour, from_minute, to_minute in slots(hours)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0019_cart_quantity_check'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpeningHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('opens', models.TimeField()),
+                ('closes', models.TimeField()),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_hours', to='food.restaurant')),
+            ],
+            options={
+                'ordering': ['weekday', 'opens'],
+                'indexes': [models.Index(fields=['restaurant', 'weekday'], name='food_openinghours_rest_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OpenHourSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('from_minute', models.PositiveSmallIntegerField()),
+                ('to_minute', models.PositiveSmallIntegerField()),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour', 'from_minute', 'to_minute', 'restaurant'], name='food_openhourslot_lookup_idx')],
+            },
+        ),
+        migrations.RunPython(parse_weekly_schedules, migrations.RunPython.noop),
+    ]
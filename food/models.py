@@ -8,6 +8,12 @@ class Customer(models.Model):
     password = models.CharField(max_length=100)
     phone = models.CharField(max_length=20)
 
+    @property
+    def preferences(self):
+        # Served from the prefetch cache when loaded through request.customer.
+        preferences = list(self.preferences_set.all()[:1])
+        return preferences[0] if preferences else None
+
 class PaymentMethod(models.Model):
     payment_id = models.AutoField(primary_key=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
@@ -32,7 +38,35 @@ class Preferences(models.Model):
     language = models.CharField(max_length=50, default='English')
     theme = models.CharField(max_length=50, default='Light')
 
-class Restaurant(models.Model):
+class RatingAggregates(models.Model):
+    # Running totals of the Review rows pointing at this object, kept in step by food.ratings.
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    # rating_sum / rating_count (0 when unrated), stored so "top rated" can be read from an index.
+    rating_average = models.FloatField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_rating(self):
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        # (stars, count, percent of all ratings), best first
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}')
+            histogram.append((stars, count, round(100 * count / self.rating_count) if self.rating_count else 0))
+        return histogram
+
+class Restaurant(RatingAggregates):
     restaurant_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     address = models.TextField()
@@ -47,11 +81,48 @@ class Restaurant(models.Model):
     open_until = models.TimeField(blank=True, null=True)
     weekly_schedule = models.TextField(blank=True, null=True)
     is_approved = models.BooleanField(default=False)
+    # Also touched whenever one of the restaurant's food items changes; drives menu ETags.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_featured'], name='food_restaurant_featured_idx'),
+            models.Index(fields=['is_approved'], name='food_restaurant_approved_idx'),
+            models.Index(fields=['-rating_average', '-rating_count', 'restaurant_id'], name='food_restaurant_rating_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-class FoodItem(models.Model):
+class OpeningHours(models.Model):
+    # One opening per row, in the site's TIME_ZONE. closes <= opens means it runs past midnight into the next day.
+    # Parsed from Restaurant.weekly_schedule, and kept indexed in OpenHourSlot, by food.opening_hours.
+    WEEKDAY_CHOICES = [(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'),
+                       (5, 'Saturday'), (6, 'Sunday')]
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='opening_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    opens = models.TimeField()
+    closes = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'opens']
+        indexes = [models.Index(fields=['restaurant', 'weekday'], name='food_openinghours_rest_idx')]
+
+class OpenHourSlot(models.Model):
+    # Interval index over OpeningHours: a row per hour of the week (0 = Monday 00:00) that a restaurant
+    # is open for some of, with the minutes of that hour it is open, so "open at T" is an equality lookup.
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    hour = models.PositiveSmallIntegerField()
+    from_minute = models.PositiveSmallIntegerField()
+    to_minute = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hour', 'from_minute', 'to_minute', 'restaurant'], name='food_openhourslot_lookup_idx'),
+        ]
+
+class FoodItem(RatingAggregates):
     food_id = models.AutoField(primary_key=True)
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
@@ -59,6 +130,13 @@ class FoodItem(models.Model):
     description = models.TextField()
     image = models.ImageField(upload_to='food_images/', null=True, blank=True)
     special_instructions = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Menu listing: one restaurant's dishes by name.
+            models.Index(fields=['restaurant', 'name'], name='food_fooditem_menu_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -69,13 +147,45 @@ class Cart(models.Model):
     food = models.ForeignKey(FoodItem, on_delete=models.CASCADE)
     quantity = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            # One row per dish per cart; adding a dish again bumps its quantity.
+            models.UniqueConstraint(fields=['customer', 'food'], name='food_cart_customer_food_uniq'),
+            # Removing the last one deletes the line (food.carts.decrement), so a 0 can only come from a bug.
+            models.CheckConstraint(check=models.Q(quantity__gte=1), name='food_cart_quantity_positive'),
+        ]
+
 class Order(models.Model):
+    # Allowed moves between these are in food.orders.TRANSITIONS.
+    PLACED = 'Placed'
+    CONFIRMED = 'Confirmed'
+    PREPARING = 'Preparing'
+    OUT_FOR_DELIVERY = 'Out for delivery'
+    DELIVERED = 'Delivered'
+    CANCELLED = 'Cancelled'
+    STATUS_CHOICES = [(status, status) for status in (
+        PLACED, CONFIRMED, PREPARING, OUT_FOR_DELIVERY, DELIVERED, CANCELLED,
+    )]
+
     order_id = models.AutoField(primary_key=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    status = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a customer's order history (food.orders).
+            models.Index(fields=['customer', 'timestamp', 'order_id'], name='food_order_history_idx'),
+        ]
+
+class OrderStatusEvent(models.Model):
+    # Feed of status changes for live order pages (food.order_events); the worker prunes old rows.
+    event_id = models.BigAutoField(primary_key=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
 class OrderItem(models.Model):
     order_item_id = models.AutoField(primary_key=True)
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -89,6 +199,82 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     restaurant = models.ForeignKey('Restaurant', on_delete=models.CASCADE, null=True, blank=True)
     food_item = models.ForeignKey('FoodItem', on_delete=models.CASCADE, null=True, blank=True)
+    # The restaurant whose menu page lists this review: the reviewed restaurant, or the dish's
+    # restaurant. Lets the menu's review feed be read from one index (see food.reviews).
+    menu_restaurant = models.ForeignKey(
+        'Restaurant', on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='menu_reviews'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['menu_restaurant', 'created_at', 'id'], name='food_review_feed_idx'),
+            models.Index(fields=['restaurant', 'created_at'], name='food_review_restaurant_idx'),
+            models.Index(fields=['food_item', 'created_at'], name='food_review_food_item_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.menu_restaurant_id is None:
+            if self.restaurant_id is not None:
+                self.menu_restaurant_id = self.restaurant_id
+            elif self.food_item_id is not None:
+                self.menu_restaurant_id = self.food_item.restaurant_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"Review by {self.user.username}"
\ No newline at end of file
+        return f"Review by {self.user.username}"
+
+class SearchIndexEntry(models.Model):
+    # One posting per (term, document); maintained by food.search from model signals.
+    RESTAURANT = 'r'
+    FOOD_ITEM = 'f'
+    DOC_TYPE_CHOICES = [(RESTAURANT, 'Restaurant'), (FOOD_ITEM, 'Food item')]
+
+    term = models.CharField(max_length=64)
+    doc_type = models.CharField(max_length=1, choices=DOC_TYPE_CHOICES)
+    doc_id = models.IntegerField()
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'doc_type', 'weight', 'doc_id'], name='food_search_term_idx'),
+            models.Index(fields=['restaurant', 'term'], name='food_search_rest_term_idx'),
+            models.Index(fields=['doc_id', 'doc_type'], name='food_search_doc_idx'),
+        ]
+
+class SearchTermVariant(models.Model):
+    # Single-deletion neighbourhood of every indexed term, used for typo-tolerant lookups.
+    variant = models.CharField(max_length=64, db_index=True)
+    term = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('variant', 'term')
+
+class Job(models.Model):
+    # A unit of background work for the worker command (see food.jobs).
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    job_id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=200)  # dotted path of the function to call
+    payload = models.JSONField(default=dict)  # its keyword arguments
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming due jobs, requeueing expired leases and pruning finished ones.
+            models.Index(fields=['status', 'run_after'], name='food_job_due_idx'),
+            models.Index(fields=['status', 'locked_until'], name='food_job_lease_idx'),
+            models.Index(fields=['status', 'finished_at'], name='food_job_finished_idx'),
+        ]
@@ -0,0 +1,190 @@
+# food/opening_hours.py
+"""
+Structured opening hours, and "open now" / "open at T" lookups.
+
+A restaurant's hours are OpeningHours rows: a weekday, a time it opens and a
+time it closes, in the site's TIME_ZONE. A closing time at or before the
+opening time means the span runs past midnight. Owners still type the
+schedule as text in Restaurant.weekly_schedule. parse_schedule() reads that
+text whenever it changes (see food.signals), and text it can't read leaves
+the previous hours alone. It understands lines such as:
+
+    Mon-Fri 11:00-14:30, 17:30-22:00
+    Saturday: 10am - 2am
+    Sun closed
+
+Every span is also written to OpenHourSlot, one row for each hour of the
+week it touches, holding the minutes of that hour it covers. "Open at T" is
+then an equality lookup on the hour plus a range check on the minute, read
+from one composite index. It scans no more rows than there are restaurants
+open in that hour.
+"""
+import re
+from datetime import datetime, time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OpenHourSlot, OpeningHours
+
+MINUTES_PER_DAY = 24 * 60
+HOURS_PER_WEEK = 7 * 24
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DAY_GROUPS = {
+    'daily': range(7), 'everyday': range(7), 'every day': range(7),
+    'weekdays': range(5), 'weekends': range(5, 7),
+}
+
+_hours_start = re.compile(r'\d|\b(?:closed|noon|midnight)\b', re.IGNORECASE)
+_range = re.compile(r'\s*(?:-|–|—|\bto\b)\s*', re.IGNORECASE)
+_time = re.compile(r'^(\d{1,2})(?:[:.](\d{2}))?\s*(?:([ap])\.?m\.?)?$', re.IGNORECASE)
+
+
+def _weekday(name):
+    name = name.strip().rstrip('.').lower()
+    for number, weekday in enumerate(WEEKDAYS):
+        # Full names and any abbreviation of at least two letters: "Mon", "Tues", "Th".
+        if len(name) >= 2 and weekday.startswith(name):
+            return number
+    raise ValueError(f'Unknown day "{name}".')
+
+
+def _days(text):
+    days = []
+    for part in re.split(r'\s*(?:,|&|\band\b)\s*', text.strip().lower()):
+        if part in DAY_GROUPS:
+            days += DAY_GROUPS[part]
+            continue
+        bounds = _range.split(part)
+        if len(bounds) == 1:
+            days.append(_weekday(part))
+        elif len(bounds) == 2:
+            first, last = _weekday(bounds[0]), _weekday(bounds[1])
+            days += [(first + n) % 7 for n in range((last - first) % 7 + 1)]  # "Fri-Mon" wraps past Sunday
+        else:
+            raise ValueError(f'Unknown days "{part}".')
+    return days
+
+
+def _time_of_day(text):
+    text = text.strip().lower()
+    if text in ('noon', 'midday'):
+        return time(12)
+    if text == 'midnight':
+        return time(0)
+    match = _time.match(text)
+    if match is None:
+        raise ValueError(f'Unknown time "{text}".')
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), (match.group(3) or '').lower()
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError(f'Unknown time "{text}".')
+        hour = hour % 12 + (12 if meridiem == 'p' else 0)
+    if (hour, minute) == (24, 0):
+        return time(0)
+    if hour > 23 or minute > 59:
+        raise ValueError(f'Unknown time "{text}".')
+    return time(hour, minute)
+
+
+def parse_schedule(text):
+    """
+    Read a free-text weekly schedule into sorted (weekday, opens, closes) tuples, weekday 0 being
+    Monday. One entry per line or ';'; raises ValueError naming the first entry it can't read.
+    """
+    hours = set()
+    for entry in re.split(r'[;\n]', text or ''):
+        entry = entry.strip()
+        if not entry:
+            continue
+        start = _hours_start.search(entry)
+        if start is None or not entry[:start.start()].strip(' :'):
+            raise ValueError(f'Can\'t read "{entry}": expected days followed by hours, like "Mon-Fri 10:00-22:00".')
+        try:
+            days = _days(entry[:start.start()].strip(' :'))
+            spans = entry[start.start():].strip()
+            if spans.lower() == 'closed':
+                continue
+            for span in re.split(r'\s*(?:,|&|\band\b)\s*', spans):
+                bounds = _range.split(span)
+                if len(bounds) != 2:
+                    raise ValueError(f'Unknown hours "{span}".')
+                opens, closes = _time_of_day(bounds[0]), _time_of_day(bounds[1])
+                hours.update((day, opens, closes) for day in days)
+        except ValueError as exc:
+            raise ValueError(f'Can\'t read "{entry}": {exc}') from None
+    return sorted(hours)
+
+
+def week_minutes(weekday, opens, closes):
+    """The span as [start, end) minutes from Monday 00:00; end may pass the end of the week."""
+    start = weekday * MINUTES_PER_DAY + opens.hour * 60 + opens.minute
+    length = (closes.hour * 60 + closes.minute - opens.hour * 60 - opens.minute) % MINUTES_PER_DAY
+    return start, start + (length or MINUTES_PER_DAY)  # opening and closing at the same time means all day
+
+
+def slots(hours):
+    """(hour of the week, from_minute, to_minute) index rows for (weekday, opens, closes) tuples."""
+    rows = set()
+    for weekday, opens, closes in hours:
+        start, end = week_minutes(weekday, opens, closes)
+        for hour in range(start // 60, (end - 1) // 60 + 1):
+            rows.add((hour % HOURS_PER_WEEK, max(start - hour * 60, 0), min(end - hour * 60, 60)))
+    return sorted(rows)
+
+
+def set_hours(restaurant_id, hours):
+    """Replace a restaurant's opening hours, and their index rows, with (weekday, opens, closes) tuples."""
+    with transaction.atomic():
+        OpeningHours.objects.filter(restaurant_id=restaurant_id).delete()
+        OpenHourSlot.objects.filter(restaurant_id=restaurant_id).delete()
+        OpeningHours.objects.bulk_create(
+            OpeningHours(restaurant_id=restaurant_id, weekday=weekday, opens=opens, closes=closes)
+            for weekday, opens, closes in hours
+        )
+        OpenHourSlot.objects.bulk_create(
+            OpenHourSlot(restaurant_id=restaurant_id, hour=hour, from_minute=from_minute, to_minute=to_minute)
+            for hour, from_minute, to_minute in slots(hours)
+        )
+
+
+def reindex(restaurant_id):
+    """Rebuild a restaurant's index rows from its OpeningHours, e.g. after they were edited in the admin."""
+    set_hours(restaurant_id, list(
+        OpeningHours.objects.filter(restaurant_id=restaurant_id).values_list('weekday', 'opens', 'closes')
+    ))
+
+
+def open_restaurant_ids(when):
+    """A subquery of the ids of restaurants open at the aware datetime ``when``."""
+    when = timezone.localtime(when)
+    return OpenHourSlot.objects.filter(
+        hour=when.weekday() * 24 + when.hour, from_minute__lte=when.minute, to_minute__gt=when.minute,
+    ).values('restaurant_id')
+
+
+def parse_open_filter(value, now=None):
+    """
+    The time asked for by an ``open`` query parameter, or None to show every restaurant:
+    "now", a time today ("21:30") or a local date and time ("2026-10-23T21:30").
+    """
+    now = timezone.localtime(now)
+    value = (value or '').strip()
+    if value == 'now':
+        return now
+    try:
+        if 'T' in value:
+            when = datetime.fromisoformat(value)
+            return when if timezone.is_aware(when) else timezone.make_aware(when)
+        at = _time_of_day(value)
+    except ValueError:
+        return None
+    return now.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+
+
+def weekly_hours(hours):
+    """[(day name, ["10:00–22:00", ...]), ...] for display; days without hours have an empty list."""
+    days = [(name, []) for _, name in OpeningHours.WEEKDAY_CHOICES]
+    for opening in hours:
+        days[opening.weekday][1].append(f'{opening.opens:%H:%M}–{opening.closes:%H:%M}')
+    return days
@@ -0,0 +1,281 @@
+# food/order_events.py
+"""
+Live order status for customers, as Server-Sent Events.
+
+Every status change is written to OrderStatusEvent by food.signals, from
+whichever process made it. Each process keeps one OrderStatusHub: open streams
+subscribe to it by order id, and a single poller task reads the new events
+once per POLL_SECONDS and hands them out. So the database sees one indexed
+range query per process per interval however many streams are open, and only
+while any are. Ids are handed out when a row is inserted but become visible
+when its transaction commits, so a lower id can show up after a higher one;
+each poll reads the last REREAD_EVENTS ids again and skips the ones already
+handed out. A stream keeps just its latest undelivered status, so a slow
+client can't make it buffer.
+
+Under ASGI, mount() serves the stream URL in front of Django (grabnow/asgi.py).
+Django 4.2 holds a thread for every request in flight, which long-lived
+streams can't afford. The mounted endpoint reads the session itself, looks the
+order up once, and from then on only waits on the hub and for the client to
+go away. Streams end after MAX_STREAM_SECONDS, and the browser reconnects, and
+at most ORDER_EVENTS_MAX_STREAMS are open per process.
+
+Under WSGI the same URL reaches views.order_events, which sends the current
+status and closes, so EventSource polls every RETRY_MS instead.
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Max
+from django.http.cookie import parse_cookie
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from .models import Order, OrderStatusEvent
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 1
+POLL_BATCH_SIZE = 1000
+REREAD_EVENTS = 100
+HEARTBEAT_SECONDS = 15
+MAX_STREAM_SECONDS = 300
+RETRY_MS = 3000
+EVENT_RETENTION = timedelta(days=1)
+
+PREAMBLE = f'retry: {RETRY_MS}\n\n'.encode()
+HEARTBEAT = b': keep-alive\n\n'
+
+
+def sse_event(order_id, status, event_id=None):
+    message = 'event: status\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    return f"{message}data: {json.dumps({'order_id': order_id, 'status': status})}\n\n".encode()
+
+
+def latest_event_id():
+    return OrderStatusEvent.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def recent_event_ids():
+    """Where the event feed ends, and the ids a poll from there would read again."""
+    last = latest_event_id()
+    return last, set(OrderStatusEvent.objects.filter(pk__gt=last - REREAD_EVENTS).values_list('pk', flat=True))
+
+
+def events_after(event_id):
+    return list(
+        OrderStatusEvent.objects.filter(pk__gt=event_id).order_by('pk')
+        .values_list('pk', 'order_id', 'status')[:POLL_BATCH_SIZE]
+    )
+
+
+def prune_events():
+    # Called by the worker command, so the feed is trimmed whether or not anyone is watching.
+    OrderStatusEvent.objects.filter(created_at__lt=timezone.now() - EVENT_RETENTION).delete()
+
+
+def order_status(session_key, order_id):
+    """The order's status if it belongs to the customer signed in with ``session_key``, else None."""
+    customer_id = import_module(settings.SESSION_ENGINE).SessionStore(session_key).get('customer_id')
+    if customer_id is None:
+        return None
+    return Order.objects.filter(pk=order_id, customer_id=customer_id).values_list('status', flat=True).first()
+
+
+def _call(function, *args):
+    # Runs on a pool thread outside any request, so connections are tidied the way a request would.
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_query(function, *args):
+    return await sync_to_async(_call, thread_sensitive=False)(function, *args)
+
+
+class Subscriber:
+    __slots__ = ('order_id', 'message', 'ready')
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.message = None
+        self.ready = asyncio.Event()
+
+    def push(self, message):
+        self.message = message  # replaces any undelivered one; only the latest status matters
+        self.ready.set()
+
+    def take(self):
+        message, self.message = self.message, None
+        self.ready.clear()
+        return message
+
+
+class OrderStatusHub:
+    def __init__(self):
+        self.subscribers = {}  # order id -> set of Subscriber
+        self.streams = 0
+        self.counters = {'polls': 0, 'events': 0, 'deliveries': 0, 'poll_errors': 0}
+        self.last_event_id = 0
+        self._seen = set()  # ids handed out that the next poll reads again
+        self._loop = None
+        self._poller = None
+        self._started = None
+
+    def subscribe(self, order_id):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._poller is None or self._poller.done():
+            self._loop = loop
+            self._started = loop.create_future()
+            self._poller = loop.create_task(self._poll())
+        subscriber = Subscriber(order_id)
+        self.subscribers.setdefault(order_id, set()).add(subscriber)
+        self.streams += 1
+        return subscriber
+
+    async def ready(self):
+        """Wait until the poller knows where the event feed ends; read an order's status only after that."""
+        await asyncio.shield(self._started)
+
+    def unsubscribe(self, subscriber):
+        subscribers = self.subscribers.get(subscriber.order_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.order_id]
+        self.streams -= 1
+
+    async def _poll(self):
+        try:
+            self.last_event_id, self._seen = await run_query(recent_event_ids)
+        except BaseException as exc:
+            self._started.set_exception(exc)
+            raise
+        self._started.set_result(None)
+        # Stops once nobody is listening; the next subscriber starts a new poller.
+        while self.subscribers:
+            await asyncio.sleep(POLL_SECONDS)
+            try:
+                events = await run_query(events_after, max(self.last_event_id - REREAD_EVENTS, 0))
+            except DatabaseError:
+                self.counters['poll_errors'] += 1
+                logger.exception('Polling order status events failed')
+                continue
+            self.counters['polls'] += 1
+            for event_id, order_id, status in events:
+                if event_id in self._seen:
+                    continue
+                self._seen.add(event_id)
+                self.last_event_id = max(self.last_event_id, event_id)
+                self.counters['events'] += 1
+                for subscriber in self.subscribers.get(order_id, ()):
+                    subscriber.push(sse_event(order_id, status, event_id))
+                    self.counters['deliveries'] += 1
+            self._seen = {event_id for event_id in self._seen if event_id > self.last_event_id - REREAD_EVENTS}
+
+    def stats(self):
+        return dict(self.counters, streams=self.streams, orders=len(self.subscribers))
+
+
+hub = OrderStatusHub()
+
+
+def stream_order_id(path):
+    """The order id if ``path`` is the order_events URL, else None."""
+    if not path.endswith('/events/'):
+        return None
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    return match.kwargs['order_id'] if match.url_name == 'order_events' else None
+
+
+async def _respond(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8'), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(scope, receive, send, order_id):
+    """Serve one order's status stream over raw ASGI."""
+    if hub.streams >= getattr(settings, 'ORDER_EVENTS_MAX_STREAMS', 10000):
+        return await _respond(send, 503, b'Too many live order streams.', [(b'retry-after', b'5')])
+    cookies = parse_cookie(b'; '.join(value for name, value in scope['headers'] if name == b'cookie').decode('latin1'))
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return await _respond(send, 404, b'Not Found')
+
+    subscriber = hub.subscribe(order_id)
+    disconnected = None
+    try:
+        await hub.ready()
+        status = await run_query(order_status, session_key, order_id)
+        if status is None:
+            return await _respond(send, 404, b'Not Found')
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': PREAMBLE + sse_event(order_id, status), 'more_body': True})
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAX_STREAM_SECONDS
+        disconnected = asyncio.ensure_future(_disconnect(receive))
+        while (timeout := min(HEARTBEAT_SECONDS, deadline - loop.time())) > 0:
+            ready = asyncio.ensure_future(subscriber.ready.wait())
+            await asyncio.wait({ready, disconnected}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                ready.cancel()
+                return
+            if ready.done():
+                body = subscriber.take()
+            else:
+                ready.cancel()
+                body = HEARTBEAT
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if disconnected is not None:
+            disconnected.cancel()
+        hub.unsubscribe(subscriber)
+
+
+def mount(application):
+    """Wrap Django's ASGI application so that order status streams are answered here instead."""
+    async def app(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            order_id = stream_order_id(scope['path'])
+            if order_id is not None:
+                return await stream(scope, receive, send, order_id)
+        return await application(scope, receive, send)
+    return app
+
+
+def prometheus_text():
+    stats = hub.stats()
+    lines = []
+    for name, kind, help_text in (
+        ('streams', 'gauge', 'Open order status streams.'),
+        ('polls', 'counter', 'Queries for new order status events.'),
+        ('events', 'counter', 'Order status events read.'),
+        ('deliveries', 'counter', 'Order status events sent to streams.'),
+        ('poll_errors', 'counter', 'Failed queries for new order status events.'),
+    ):
+        metric = f'grabnow_order_{name}' + ('_total' if kind == 'counter' else '')
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}', f'{metric} {stats[name]}']
+    return '\n'.join(lines) + '\n'
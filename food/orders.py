@@ -0,0 +1,69 @@
+# food/orders.py
+"""
+Order status transitions, the post-checkout job, and order history for the
+profile page (newest first, paged by (timestamp, order_id) cursor).
+"""
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.urls import reverse
+
+from .models import Order, OrderItem
+from .pagination import keyset_page
+
+ORDER_HISTORY_PAGE_SIZE = 5
+MAX_ORDER_HISTORY_PAGE_SIZE = 50
+
+TRANSITIONS = {
+    Order.PLACED: {Order.CONFIRMED, Order.CANCELLED},
+    Order.CONFIRMED: {Order.PREPARING, Order.CANCELLED},
+    Order.PREPARING: {Order.OUT_FOR_DELIVERY},
+    Order.OUT_FOR_DELIVERY: {Order.DELIVERED},
+}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def transition(order_id, status):
+    """Move an order to ``status``; raise InvalidTransition if its current status doesn't allow that."""
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+        if status not in TRANSITIONS.get(order.status, ()):
+            raise InvalidTransition(f"Order {order_id} can't go from {order.status!r} to {status!r}.")
+        order.status = status
+        order.save(update_fields=['status'])
+    return order
+
+
+def process_placed_order(order_id):
+    """
+    Background step queued by place_order. Notifying the restaurant, capturing
+    payment and assigning a courier belong here; for now it confirms the order.
+    """
+    try:
+        transition(order_id, Order.CONFIRMED)
+    except InvalidTransition:
+        pass  # already confirmed (by the customer) or cancelled; running twice must be harmless
+
+
+def order_history_page(customer_id, cursor=None, limit=ORDER_HISTORY_PAGE_SIZE):
+    """Return (orders, next_cursor); each order's line items and dishes are prefetched in one extra query."""
+    orders, next_cursor = keyset_page(Order.objects.filter(customer_id=customer_id), 'timestamp', cursor, limit)
+    items = OrderItem.objects.select_related('food').only('order_id', 'quantity', 'food__name').order_by('order_item_id')
+    prefetch_related_objects(orders, Prefetch('orderitem_set', queryset=items))
+    return orders, next_cursor
+
+
+def order_json(order):
+    return {
+        'order_id': order.order_id,
+        'timestamp': order.timestamp.isoformat(),
+        'status': order.status,
+        'total_price': str(order.total_price),
+        'url': reverse('order_details', args=[order.order_id]),
+        'items': [
+            {'food_id': item.food_id, 'name': item.food.name, 'quantity': item.quantity}
+            for item in order.orderitem_set.all()
+        ],
+    }
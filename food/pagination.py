@@ -0,0 +1,48 @@
+# food/pagination.py
+"""
+Keyset ("seek") pagination over a (timestamp, primary key) ordering, newest first.
+
+A cursor holds the sort key of the last row shown, so fetching any page is
+a couple of index seeks instead of the COUNT plus ever-growing OFFSET that
+Paginator needs. Each feed needs an index ending in (timestamp, pk) after its
+equality filters.
+"""
+import base64
+from datetime import datetime
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, pk) for a cursor from encode_cursor; raise ValueError if it is malformed."""
+    # Bad base64, bad UTF-8, a missing separator and bad numbers all surface as ValueError.
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    timestamp, pk = raw.split('|')
+    return datetime.fromisoformat(timestamp), int(pk)
+
+
+def keyset_page(queryset, field, cursor=None, limit=10):
+    """
+    Return (rows, next_cursor) for the page of ``queryset`` after ``cursor``, ordered by -field, -pk.
+
+    ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    # One extra row tells us whether there is a next page without a COUNT.
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        # Two index seeks rather than one "(field, pk) < cursor" OR, which planners turn into a
+        # scan over every row sharing the cursor's timestamp: first the rest of that timestamp, then older rows.
+        rows = list(queryset.filter(**{field: timestamp, 'pk__lt': pk})[:limit + 1])
+        if len(rows) <= limit:
+            rows += queryset.filter(**{f'{field}__lt': timestamp})[:limit + 1 - len(rows)]
+    else:
+        rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return rows[:limit], next_cursor
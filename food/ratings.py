@@ -0,0 +1,93 @@
+# food/ratings.py
+"""
+Denormalized rating aggregates for restaurants and food items.
+
+Restaurant and FoodItem carry a review count, a rating sum and one counter
+per star (see RatingAggregates). They are adjusted with F() updates in the
+same transaction as the Review row, so pages can show and sort by rating
+without reading reviews. ``manage.py rebuild_ratings`` recomputes them should
+they ever drift from the Review table.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import FoodItem, Restaurant, Review
+
+STARS = range(1, 6)
+AGGREGATE_FIELDS = ['rating_count', 'rating_sum'] + [f'rating_{stars}' for stars in STARS]
+AVERAGE_RATING = Case(
+    When(rating_count=0, then=Value(0.0)),
+    default=Cast('rating_sum', FloatField()) / F('rating_count'),
+    output_field=FloatField(),
+)
+
+
+def parse_rating(value):
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        return None
+    return rating if rating in STARS else None
+
+
+def _deltas(rating, sign):
+    return {
+        'rating_count': F('rating_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+        f'rating_{rating}': F(f'rating_{rating}') + sign,
+        'updated_at': timezone.now(),
+    }
+
+
+def _update(model, pk, guard, rating, sign):
+    if model.objects.filter(pk=pk, **guard).update(**_deltas(rating, sign)):
+        # Its own statement: backends disagree on whether an UPDATE's later assignments see earlier ones.
+        model.objects.filter(pk=pk).update(rating_average=AVERAGE_RATING)
+
+
+def apply_review(review, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) one review from its target's aggregates."""
+    # Never take a counter below zero, even if it has drifted.
+    guard = {f'rating_{review.rating}__gt': 0} if sign < 0 else {}
+    if review.restaurant_id:
+        # Setting updated_at also expires the cached fragments showing this restaurant (see food.catalog_cache).
+        _update(Restaurant, review.restaurant_id, guard, review.rating, sign)
+    if review.food_item_id:
+        _update(FoodItem, review.food_item_id, guard, review.rating, sign)
+        # Item ratings are part of the menu page, whose ETag follows the restaurant's updated_at.
+        Restaurant.objects.filter(fooditem__food_id=review.food_item_id).update(updated_at=timezone.now())
+
+
+def add_review(user, rating, review_text, restaurant=None, food_item=None):
+    with transaction.atomic():
+        review = Review.objects.create(
+            user=user, rating=rating, review_text=review_text, restaurant=restaurant, food_item=food_item,
+        )
+        apply_review(review)
+    return review
+
+
+def order_by_rating(queryset):
+    """Best average first, ties broken by number of ratings; unrated objects last."""
+    return queryset.order_by('-rating_average', '-rating_count', 'pk')
+
+
+def review_totals(field):
+    """Aggregates computed from the Review table, keyed by the ``field`` FK id."""
+    rows = (
+        Review.objects.filter(**{f'{field}__isnull': False})
+        .values(field)
+        .annotate(
+            rating_count=Count('pk'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{stars}': Count('pk', filter=Q(rating=stars)) for stars in STARS},
+        )
+        .order_by()
+    )
+    totals = {}
+    for row in rows:
+        row['rating_average'] = row['rating_sum'] / row['rating_count']
+        totals[row.pop(field)] = row
+    return totals
@@ -0,0 +1,34 @@
+# food/reviews.py
+"""
+Review feed for a restaurant's menu page: its own reviews and its dishes' reviews, newest first.
+
+Pages are fetched by (created_at, id) cursor (see food.pagination), so every
+page is read with index seeks on Review.food_review_feed_idx no matter how
+deep it is or how many reviews the restaurant has.
+"""
+from .models import Review
+from .pagination import keyset_page
+
+REVIEWS_PAGE_SIZE = 10
+MAX_REVIEWS_PAGE_SIZE = 50
+
+
+def review_page(restaurant_id, cursor=None, limit=REVIEWS_PAGE_SIZE):
+    """Return (reviews, next_cursor) for one page of the menu feed; next_cursor is None on the last page."""
+    reviews = (
+        Review.objects.filter(menu_restaurant_id=restaurant_id)
+        .select_related('user', 'food_item')
+        .only('rating', 'review_text', 'created_at', 'user__username', 'food_item__name')
+    )
+    return keyset_page(reviews, 'created_at', cursor, limit)
+
+
+def review_json(review):
+    return {
+        'id': review.pk,
+        'rating': review.rating,
+        'text': review.review_text or '',
+        'username': review.user.username,
+        'dish': review.food_item.name if review.food_item_id else None,
+        'created_at': review.created_at.isoformat(),
+    }
@@ -0,0 +1,241 @@
+# food/search.py
+"""
+Inverted search index over restaurants and food items.
+
+Every indexed document is split into terms and stored as SearchIndexEntry
+postings, so a query only touches the postings of the terms it matches
+instead of scanning the catalog. Each term's single-deletion neighbourhood
+is stored in SearchTermVariant, which lets a misspelt query word find the
+indexed terms within one edit of it with a single indexed lookup.
+"""
+import re
+import unicodedata
+
+from django.core.paginator import Paginator
+from django.db.models import Exists, F, OuterRef
+
+from .models import FoodItem, Restaurant, SearchIndexEntry, SearchTermVariant
+from .opening_hours import open_restaurant_ids
+
+RESTAURANT_FIELD_WEIGHTS = {'name': 3, 'description': 1, 'address': 1}
+FOOD_ITEM_FIELD_WEIGHTS = {'name': 3, 'description': 1}
+
+# Score multipliers for how a query word matched an indexed term.
+EXACT_BOOST = 4
+PREFIX_BOOST = 2
+TYPO_BOOST = 1
+
+PREFIX_MIN_LENGTH = 2
+TYPO_MIN_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 20
+MAX_POSTINGS_PER_TERM = 500
+MAX_QUERY_WORDS = 8
+MAX_TERM_LENGTH = 64
+
+_word_re = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    # Lowercase and strip accents so "Crème" and "creme" index and match alike.
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    words = _word_re.findall(normalize_text(text))
+    return [word[:MAX_TERM_LENGTH] for word in words if len(word) >= PREFIX_MIN_LENGTH]
+
+
+def deletion_variants(term):
+    variants = {term}
+    if len(term) >= TYPO_MIN_LENGTH:
+        variants.update(term[:i] + term[i + 1:] for i in range(len(term)))
+    return variants
+
+
+def _within_one_edit(a, b):
+    # Optimal string alignment distance <= 1 (insert, delete, substitute or swap two neighbours).
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def _document_terms(instance, field_weights):
+    weights = {}
+    for field, weight in field_weights.items():
+        for term in set(tokenize(getattr(instance, field))):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+
+def restaurant_postings(restaurant):
+    terms = _document_terms(restaurant, RESTAURANT_FIELD_WEIGHTS)
+    return [
+        SearchIndexEntry(term=term, doc_type=SearchIndexEntry.RESTAURANT, doc_id=restaurant.pk,
+                         restaurant_id=restaurant.pk, weight=weight)
+        for term, weight in terms.items()
+    ]
+
+
+def food_item_postings(food_item):
+    terms = _document_terms(food_item, FOOD_ITEM_FIELD_WEIGHTS)
+    return [
+        SearchIndexEntry(term=term, doc_type=SearchIndexEntry.FOOD_ITEM, doc_id=food_item.pk,
+                         restaurant_id=food_item.restaurant_id, weight=weight)
+        for term, weight in terms.items()
+    ]
+
+
+def save_postings(postings, batch_size=None):
+    SearchIndexEntry.objects.bulk_create(postings, batch_size=batch_size)
+    variants = {(variant, entry.term) for entry in postings for variant in deletion_variants(entry.term)}
+    SearchTermVariant.objects.bulk_create(
+        [SearchTermVariant(variant=variant, term=term) for variant, term in variants],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def _delete_postings(postings):
+    """Delete a queryset of postings and return the terms they held."""
+    terms = set(postings.values_list('term', flat=True))
+    postings.delete()
+    return terms
+
+
+def _prune_terms(terms):
+    # A term no posting uses any more would still show up in prefix and typo expansion.
+    dead = set(terms) - set(SearchIndexEntry.objects.filter(term__in=terms).values_list('term', flat=True).distinct())
+    if dead:
+        variants = set().union(*(deletion_variants(term) for term in dead))
+        SearchTermVariant.objects.filter(variant__in=variants, term__in=dead).delete()
+
+
+def _postings_of(doc_type, doc_ids):
+    return SearchIndexEntry.objects.filter(doc_type=doc_type, doc_id__in=doc_ids)
+
+
+def index_restaurant(restaurant):
+    terms = _delete_postings(_postings_of(SearchIndexEntry.RESTAURANT, [restaurant.pk]))
+    save_postings(restaurant_postings(restaurant))
+    _prune_terms(terms)
+
+
+def index_food_item(food_item):
+    terms = _delete_postings(_postings_of(SearchIndexEntry.FOOD_ITEM, [food_item.pk]))
+    save_postings(food_item_postings(food_item))
+    _prune_terms(terms)
+
+
+def reindex(doc_type, instances, build_postings, batch_size=None):
+    """Replace the postings of many documents at once, for bulk writes that skip the model signals."""
+    terms = _delete_postings(_postings_of(doc_type, [instance.pk for instance in instances]))
+    save_postings([posting for instance in instances for posting in build_postings(instance)], batch_size)
+    _prune_terms(terms)
+
+
+def remove_food_item(food_item):
+    _prune_terms(_delete_postings(_postings_of(SearchIndexEntry.FOOD_ITEM, [food_item.pk])))
+
+
+def _prefix_matches(words):
+    # Expand prefixes against the term vocabulary (the variant == term rows) with an
+    # indexed range scan rather than LIKE, which not every backend can serve from an index.
+    # Terms are pruned when their last posting goes, but a cascade (deleting a restaurant)
+    # skips that, so only terms that still have postings count towards the cap.
+    live = Exists(SearchIndexEntry.objects.filter(term=OuterRef('term')))
+    terms = set()
+    for word in words:
+        upper = word[:-1] + chr(ord(word[-1]) + 1)
+        terms.update(
+            SearchTermVariant.objects.filter(live, variant__gte=word, variant__lt=upper, term=F('variant'))
+            .order_by('variant')
+            .values_list('term', flat=True)[:MAX_PREFIX_EXPANSIONS]
+        )
+    return terms
+
+
+def _typo_matches(words):
+    words = [word for word in words if len(word) >= TYPO_MIN_LENGTH]
+    if not words:
+        return set()
+    variants = set().union(*(deletion_variants(word) for word in words))
+    candidates = SearchTermVariant.objects.filter(variant__in=variants).values_list('term', flat=True).distinct()
+    return {term for term in candidates if any(_within_one_edit(term, word) for word in words)}
+
+
+def ranked(query, doc_type, restaurant_id=None, open_at=None):
+    """
+    Return [{'doc_id', 'score'}, ...] for ``doc_type``, best first.
+
+    Exact term matches score highest, then prefix matches, then matches within
+    one typo; scores add up across query words and document fields. With
+    ``open_at``, only documents of restaurants open at that time are kept.
+
+    Each matched term contributes at most MAX_POSTINGS_PER_TERM postings, its
+    heaviest, read from the front of the (term, doc_type, weight) index. So a
+    search reads a bounded number of rows however large the catalog grows; a
+    term that common only loses its lightest documents.
+    """
+    words = set(tokenize(query)[:MAX_QUERY_WORDS])
+    if not words:
+        return []
+
+    prefixes = _prefix_matches(words) - words
+    typos = _typo_matches(words) - words - prefixes
+    boosts = dict.fromkeys(typos, TYPO_BOOST) | dict.fromkeys(prefixes, PREFIX_BOOST) | dict.fromkeys(words, EXACT_BOOST)
+
+    entries = SearchIndexEntry.objects.filter(doc_type=doc_type)
+    if restaurant_id is not None:
+        entries = entries.filter(restaurant_id=restaurant_id)
+    if open_at is not None:
+        entries = entries.filter(restaurant_id__in=open_restaurant_ids(open_at))
+    scores = {}
+    for term, boost in boosts.items():
+        postings = entries.filter(term=term).order_by('-weight', '-doc_id').values_list('doc_id', 'weight')
+        for doc_id, weight in postings[:MAX_POSTINGS_PER_TERM]:
+            scores[doc_id] = scores.get(doc_id, 0) + weight * boost
+    return [
+        {'doc_id': doc_id, 'score': score}
+        for doc_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+def _load(rows, queryset):
+    ids = [row['doc_id'] for row in rows]
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def paginate_ranked(rows, queryset, page_number, per_page):
+    """Paginate ranked rows and swap each page's rows for model instances."""
+    page = Paginator(rows, per_page).get_page(page_number)
+    page.object_list = _load(page.object_list, queryset)
+    return page
+
+
+def search_restaurants(query, page_number=1, per_page=9, open_at=None):
+    rows = ranked(query, SearchIndexEntry.RESTAURANT, open_at=open_at)
+    return paginate_ranked(rows, Restaurant.objects.all(), page_number, per_page)
+
+
+def search_food_items(query, page_number=1, per_page=12, open_at=None):
+    rows = ranked(query, SearchIndexEntry.FOOD_ITEM, open_at=open_at)
+    return paginate_ranked(rows, FoodItem.objects.select_related('restaurant'), page_number, per_page)
+
+
+def search_menu(query, restaurant_id):
+    # A single menu is small enough to return every match without paging.
+    return _load(ranked(query, SearchIndexEntry.FOOD_ITEM, restaurant_id), FoodItem.objects.all())
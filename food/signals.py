@@ -0,0 +1,126 @@
+# food/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import opening_hours, ratings, search
+from .autocomplete import autocomplete
+from .cart_summary import bump_price_version
+from .catalog_cache import bump_catalog_version
+from .models import FoodItem, OpeningHours, Order, OrderStatusEvent, Restaurant, Review
+
+
+@receiver(post_save, sender=Restaurant)
+def index_restaurant(sender, instance, **kwargs):
+    search.index_restaurant(instance)
+
+
+@receiver(post_save, sender=FoodItem)
+def index_food_item(sender, instance, **kwargs):
+    search.index_food_item(instance)
+
+
+# Restaurant postings go away with the restaurant through the FK cascade.
+@receiver(post_delete, sender=FoodItem)
+def unindex_food_item(sender, instance, **kwargs):
+    search.remove_food_item(instance)
+
+
+AUTOCOMPLETE_INDEXES = {Restaurant: 'restaurants', FoodItem: 'dishes'}
+
+
+@receiver(pre_save, sender=Restaurant)
+@receiver(pre_save, sender=FoodItem)
+def remember_autocomplete_name(sender, instance, **kwargs):
+    # A renamed object has to leave the typeahead under its old name.
+    instance._autocomplete_old_name = None
+    if autocomplete.loaded and instance.pk is not None:
+        instance._autocomplete_old_name = sender.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=FoodItem)
+def update_autocomplete(sender, instance, created, **kwargs):
+    old_name = getattr(instance, '_autocomplete_old_name', None)
+    if created or old_name != instance.name:
+        if old_name is not None:
+            autocomplete.removed(AUTOCOMPLETE_INDEXES[sender], old_name, instance.pk)
+        autocomplete.added(AUTOCOMPLETE_INDEXES[sender], instance.name, instance.pk)
+
+
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=FoodItem)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.removed(AUTOCOMPLETE_INDEXES[sender], instance.name, instance.pk)
+
+
+@receiver(pre_save, sender=Restaurant)
+def remember_weekly_schedule(sender, instance, **kwargs):
+    instance._old_weekly_schedule = None
+    if instance.pk is not None:
+        instance._old_weekly_schedule = sender.objects.filter(pk=instance.pk).values_list('weekly_schedule', flat=True).first()
+
+
+@receiver(post_save, sender=Restaurant)
+def update_opening_hours(sender, instance, created, **kwargs):
+    if not created and instance.weekly_schedule == instance._old_weekly_schedule:
+        return
+    try:
+        hours = opening_hours.parse_schedule(instance.weekly_schedule)
+    except ValueError:
+        return  # RestaurantForm rejects these; text from elsewhere keeps the hours it had
+    opening_hours.set_hours(instance.pk, hours)
+
+
+@receiver(post_save, sender=OpeningHours)
+@receiver(post_delete, sender=OpeningHours)
+def reindex_opening_hours(sender, instance, **kwargs):
+    # Edited one at a time (the admin); set_hours() writes whole schedules without these signals.
+    opening_hours.reindex(instance.restaurant_id)
+    Restaurant.objects.filter(pk=instance.restaurant_id).update(updated_at=timezone.now())
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_catalog_fragments(sender, **kwargs):
+    # After commit, so no request can re-cache the old rows under the new version.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def touch_restaurant(sender, instance, **kwargs):
+    # A menu's freshness is its restaurant's updated_at; update() skips the Restaurant signals above.
+    Restaurant.objects.filter(pk=instance.restaurant_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def invalidate_cart_summaries(sender, **kwargs):
+    # Cached cart subtotals were computed with the old price.
+    transaction.on_commit(bump_price_version)
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_ratings(sender, instance, origin=None, **kwargs):
+    # New reviews are counted by ratings.add_review; deletions can come from anywhere (admin, cascades).
+    # A restaurant or dish being deleted takes its reviews along, and with them the aggregates to adjust.
+    if isinstance(origin, (Restaurant, FoodItem)) or getattr(origin, 'model', None) in (Restaurant, FoodItem):
+        return
+    ratings.apply_review(instance, sign=-1)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._old_status = None
+    if instance.pk is not None:
+        instance._old_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def record_order_status(sender, instance, created, **kwargs):
+    # Nobody can be watching an order before it exists, so only changes are recorded.
+    if not created and instance.status != instance._old_status:
+        OrderStatusEvent.objects.create(order=instance, status=instance.status)
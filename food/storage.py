@@ -0,0 +1,54 @@
+# food/storage.py
+"""
+Static files storage used by ``collectstatic``.
+
+Every file is also written under a content-hashed name (ManifestStaticFilesStorage),
+so a changed asset always gets a new URL and the old one can be cached
+forever. Text assets additionally get pre-compressed ``.gz`` siblings, and
+``.br`` siblings when the brotli package is installed, which
+food.middleware.StaticFilesMiddleware serves to clients that accept them.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Images and fonts are already compressed; gzip or brotli gain next to nothing on them.
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+# A compressed sibling is only kept if it is at least this much smaller than the original.
+MIN_SAVING = 0.05
+
+
+def _encoders():
+    encoders = [('gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('br', lambda data: brotli.compress(data, quality=11)))
+    return encoders
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        for suffix, encode in _encoders():
+            target = f'{name}.{suffix}'
+            if self.exists(target):
+                self.delete(target)
+            encoded = encode(content)
+            if len(encoded) <= len(content) * (1 - MIN_SAVING):
+                self._save(target, ContentFile(encoded))
@@ -0,0 +1,11 @@
+from django import template
+
+from food import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(field_file):
+    """Usage: <img src="{{ item.image.url }}" srcset="{% srcset item.image %}" sizes="...">"""
+    return images.srcset(field_file)
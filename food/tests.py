@@ -1,3 +1,1167 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import carts, images, jobs, metrics, opening_hours, search
+from .autocomplete import PrefixIndex
+from .cache import Namespace, TwoTierCache
+from .catalog_cache import bump_catalog_version, cached_fragment, fragment_stats
+from .db_router import PIN_COOKIE, PrimaryReplicaRouter, replica_pinning_middleware
+from .forms import RestaurantForm
+from .menu_import import MenuImport
+from .orders import InvalidTransition, transition
+from .pagination import decode_cursor
+from .ratings import add_review
+from .cart_summary import get_cart_summary
+from .throttle import LoginThrottle, TokenBuckets
+from .order_events import POLL_SECONDS, hub as order_status_hub, prune_events
+from .models import (
+    Cart, Customer, FoodItem, Job, OpenHourSlot, OpeningHours, Order, OrderItem, OrderStatusEvent, Preferences,
+    Restaurant, Review, SearchIndexEntry, SearchTermVariant,
+)
+
+
+# The shared cache tier is on disk and would outlive the test database; tests get an in-memory one.
+test_caches = override_settings(CACHES={
+    'default': {'BACKEND': 'food.cache.TwoTierCache', 'LOCATION': 'tests', 'OPTIONS': {'SHARED': 'shared'}},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+})
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    test_caches.disable()
+
+
+# Templates resolve {% static %} through the collectstatic manifest, which tests shouldn't depend on.
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CustomerQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            username='alice', email='alice@example.com', password=make_password('secret'), phone='555-0100'
+        )
+        Preferences.objects.create(customer=cls.customer, theme='Dark')
+        cls.restaurant = Restaurant.objects.create(
+            name='Pizza Place', address='1 Main St', image='restaurant_images/steak2.jpg', is_featured=True
+        )
+        cls.food = FoodItem.objects.create(
+            restaurant=cls.restaurant, name='Margherita', price='9.50',
+            description='Tomato and mozzarella', image='food_images/pizzaitem1.jpg'
+        )
+        Cart.objects.create(customer=cls.customer, food=cls.food, quantity=2)
+
+    def setUp(self):
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+
+    def assertOneCustomerQuery(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        customer_queries = [q['sql'] for q in ctx.captured_queries if re.search(r'FROM \W?food_customer\b', q['sql'])]
+        preference_queries = [q['sql'] for q in ctx.captured_queries if re.search(r'FROM \W?food_preferences\b', q['sql'])]
+        self.assertEqual(len(customer_queries), 1, customer_queries)
+        self.assertLessEqual(len(preference_queries), 1, preference_queries)
+        return response
+
+    def test_restaurant_list(self):
+        response = self.assertOneCustomerQuery(reverse('restaurant_list'))
+        self.assertEqual(response.context['username'], 'alice')
+        self.assertEqual(response.context['preferences'].theme, 'Dark')
+
+    def test_menu(self):
+        response = self.assertOneCustomerQuery(reverse('menu', args=[self.restaurant.restaurant_id]))
+        self.assertEqual(response.context['username'], 'alice')
+
+    def test_cart(self):
+        response = self.assertOneCustomerQuery(reverse('cart'))
+        self.assertEqual(response.context['total_items'], 2)
+
+
+def full_table_scans(sql):
+    """Tables the backend's EXPLAIN says ``sql`` reads in full (SQLite and MySQL plans are understood)."""
+    # Scans of derived tables (subqueries in FROM) are reported too, but only base tables matter.
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[3] for row in cursor.fetchall()]
+            # "SCAN t" without an index is a table scan. With a LIMIT, no WHERE and no sort step it is a
+            # walk in rowid order that stops after LIMIT rows (e.g. ORDER BY pk LIMIT 9), which is fine. With
+            # a WHERE (e.g. .first() on an unindexed filter) it may read every row looking for a match.
+            stops_early = (
+                ' LIMIT ' in sql and ' WHERE ' not in sql and not any('TEMP B-TREE' in detail for detail in details)
+            )
+            return [
+                match.group(1) for match in map(re.compile(r'^SCAN (\w+)$').match, details)
+                if match and match.group(1) in tables and not stops_early
+            ]
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [column[0] for column in cursor.description]
+            return [row['table'] for row in (dict(zip(columns, row)) for row in cursor.fetchall()) if row['type'] == 'ALL' and row['table'] in tables]
+    return []
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QueryPlanTests(TestCase):
+    """Every query issued by the main views must be served by an index, not a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            username='alice', email='alice@example.com', password=make_password('secret'), phone='555-0100'
+        )
+        Preferences.objects.create(customer=cls.customer)
+        cls.user = User.objects.create_user('alice', password='secret')
+        restaurants = Restaurant.objects.bulk_create([
+            Restaurant(name=f'Restaurant {i}', address=f'{i} Main St', image='restaurant_images/steak2.jpg',
+                       is_featured=i % 5 == 0, is_approved=True)
+            for i in range(30)
+        ])
+        foods = FoodItem.objects.bulk_create([
+            FoodItem(restaurant=restaurant, name=f'Dish {restaurant.pk}-{i}', price='9.50',
+                     description='Tomato and mozzarella', image='food_images/pizzaitem1.jpg')
+            for restaurant in restaurants for i in range(10)
+        ])
+        Review.objects.bulk_create(
+            [Review(user=cls.user, rating=i % 5 + 1, restaurant=restaurants[i % 30], menu_restaurant=restaurants[i % 30])
+             for i in range(60)]
+            + [Review(user=cls.user, rating=i % 5 + 1, food_item=foods[i], menu_restaurant=foods[i].restaurant)
+               for i in range(60)]
+        )
+        orders = Order.objects.bulk_create([
+            Order(customer=cls.customer, status='Confirmed', total_price='19.00') for _ in range(20)
+        ])
+        OrderItem.objects.bulk_create([OrderItem(order=order, food=foods[0], quantity=2) for order in orders])
+        cls.restaurant, cls.food, cls.order = restaurants[0], foods[0], orders[0]
+
+    def setUp(self):
+        # Cached fragments would skip their queries, and the plans of those queries would go unchecked.
+        cache.clear()
+        caches['shared'].clear()
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+        Cart.objects.create(customer=self.customer, food=self.food, quantity=1)
+
+    def assertNoFullScans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400, url)
+        statements = [q['sql'] for q in ctx.captured_queries if q['sql'].split(None, 1)[0] in ('SELECT', 'UPDATE', 'DELETE')]
+        self.assertTrue(statements)
+        for sql in statements:
+            self.assertEqual(full_table_scans(sql), [], sql)
+        return response
+
+    def test_scans_are_detected(self):
+        query = Restaurant.objects.filter(phone='555-0100').order_by('pk')[:1].query
+        self.assertEqual(full_table_scans(str(query).replace('555-0100', "'555-0100'")), ['food_restaurant'])
+
+    def test_open_now_filters(self):
+        for restaurant in Restaurant.objects.all()[:20]:
+            opening_hours.set_hours(restaurant.pk, opening_hours.parse_schedule('Daily 00:00-00:00'))
+        self.assertNoFullScans('get', reverse('restaurant_list'), {'open': 'now'})
+        self.assertNoFullScans('get', reverse('search'), {'q': 'restaurant dish', 'open': '12:00'})
+
+    def test_restaurant_list(self):
+        url = reverse('restaurant_list')
+        self.assertNoFullScans('get', url)
+        self.assertNoFullScans('get', url, {'sort': 'rating'})
+        self.assertNoFullScans('get', url, {'sort': 'rating', 'page': 2})
+
+    def test_menu(self):
+        url = reverse('menu', args=[self.restaurant.pk])
+        self.assertNoFullScans('get', url)
+        self.assertNoFullScans('get', url, {'sort': 'rating'})
+        self.assertNoFullScans('get', url, {'q': 'dish'})
+
+    def test_menu_reviews(self):
+        response = self.assertNoFullScans('get', reverse('menu_reviews', args=[self.restaurant.pk]), {'limit': 1})
+        cursor = response.json()['next_cursor']
+        self.assertNoFullScans('get', reverse('menu_reviews', args=[self.restaurant.pk]), {'cursor': cursor})
+
+    def test_search(self):
+        self.assertNoFullScans('get', reverse('search'), {'q': 'restaurant dish'})
+
+    def test_cart_and_checkout(self):
+        self.assertNoFullScans('post', reverse('add_to_cart', args=[self.food.pk]), {'quantity': 1})
+        self.assertNoFullScans('get', reverse('cart'))
+        self.assertNoFullScans('get', reverse('remove_from_cart', args=[self.food.pk]))
+        self.assertNoFullScans('post', reverse('place_order'), {'selected_items': [self.food.pk]})
+
+    def test_order_history(self):
+        self.assertNoFullScans('get', reverse('profile'))
+        response = self.assertNoFullScans('get', reverse('order_history'), {'limit': 2})
+        self.assertNoFullScans('get', reverse('order_history'), {'cursor': response.json()['next_cursor']})
+        self.assertNoFullScans('get', reverse('order_details', args=[self.order.pk]))
+
+    def test_reviews(self):
+        self.client.force_login(self.user)
+        self.assertNoFullScans('post', reverse('add_restaurant_review', args=[self.restaurant.pk]), {'rating': 4})
+        self.assertNoFullScans('post', reverse('add_food_item_review', args=[self.food.pk]), {'rating': 2})
+
+    def test_restaurant_page(self):
+        self.assertNoFullScans('get', reverse('restaurant_page', args=[self.restaurant.pk]))
+
+
+class SeedDataTests(TestCase):
+    def test_seed_data(self):
+        call_command(
+            'seed_data', restaurants=3, dishes=4, customers=5, orders=2, reviews=6, seed=1, stdout=StringIO(),
+        )
+        self.assertEqual(Restaurant.objects.count(), 3)
+        self.assertEqual(FoodItem.objects.count(), 12)
+        self.assertEqual(Order.objects.count(), 10)
+        self.assertEqual(OrderItem.objects.count(), 30)
+        self.assertEqual(Cart.objects.count(), 10)
+        self.assertFalse(Review.objects.filter(menu_restaurant__isnull=True).exists())
+        self.assertEqual(sum(Restaurant.objects.values_list('rating_count', flat=True)), 9)
+        self.assertEqual(sum(FoodItem.objects.values_list('rating_count', flat=True)), 9)
+
+        username = Customer.objects.values_list('username', flat=True).first()
+        response = self.client.post(reverse('signin'), {'username_or_email': username, 'password': 'loadtest'})
+        self.assertRedirects(response, reverse('restaurant_list'), fetch_redirect_response=False)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+
+    def dish(self, name, description=''):
+        return FoodItem.objects.create(restaurant=self.restaurant, name=name, price='9.50', description=description)
+
+    def test_removed_terms_stop_expanding_prefixes(self):
+        dish = self.dish('Pizzetta')
+        self.assertIn('pizzetta', search._prefix_matches({'pizz'}))
+        dish.name = 'Calzone'
+        dish.save()
+        self.assertFalse(SearchTermVariant.objects.filter(term='pizzetta').exists())
+        self.assertNotIn('pizzetta', search._prefix_matches({'pizz'}))
+        self.dish('Pizzaiola')
+        self.restaurant.delete()  # cascades to the postings without pruning
+        self.assertEqual(search._prefix_matches({'pizz'}), set())
+
+    def names(self, query):
+        return [food.name for food in search.search_menu(query, self.restaurant.pk)]
+
+    def test_ranking(self):
+        self.dish('Garlic Bread', 'With pizza sauce')
+        self.dish('Pizza Margherita')
+        self.dish('Pizzetta')
+        self.dish('Pasta', 'Not a pizza, but close')
+        # Name matches outweigh description matches; ties go to the lower id.
+        self.assertEqual(self.names('pizza'), ['Pizza Margherita', 'Garlic Bread', 'Pasta'])
+        self.assertEqual(self.names('pizza garlic'), ['Garlic Bread', 'Pizza Margherita', 'Pasta'])
+        self.assertEqual(self.names('pizz'), ['Pizza Margherita', 'Pizzetta', 'Garlic Bread', 'Pasta'])
+        # An exact match outranks a prefix match of the same weight.
+        self.assertEqual(self.names('pizz pizzetta'), ['Pizzetta', 'Pizza Margherita', 'Garlic Bread', 'Pasta'])
+        self.assertEqual(self.names('x'), [])
+
+    def test_typos(self):
+        self.dish('Margherita')
+        self.dish('Marinara')
+        for query in ('margherta', 'marghorita', 'amrgherita', 'margheritas'):
+            self.assertEqual(self.names(query), ['Margherita'], query)
+        self.assertEqual(self.names('mrgrita'), [])
+        self.assertTrue(search._within_one_edit('pizza', 'pizzas'))
+        self.assertTrue(search._within_one_edit('pizza', 'pziza'))
+        self.assertFalse(search._within_one_edit('pizza', 'pzzia'))
+        self.assertFalse(search._within_one_edit('pizza', 'pi'))
+
+    def test_postings_read_per_term_are_bounded(self):
+        for i in range(5):
+            self.dish(f'Soup {i}', 'hot' if i % 2 else '')
+        with mock.patch.object(search, 'MAX_POSTINGS_PER_TERM', 3):
+            names = self.names('soup hot')
+        # "soup" weighs the same everywhere, so its newest three are read; "hot" finds Soup 1 on its own.
+        self.assertEqual(names, ['Soup 3', 'Soup 2', 'Soup 4', 'Soup 1'])
+
+
+class RatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('critic')
+        cls.restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        cls.food = FoodItem.objects.create(restaurant=cls.restaurant, name='Margherita', price='9.50')
+
+    def test_deleting_a_review_updates_the_aggregates(self):
+        add_review(self.user, 4, '', restaurant=self.restaurant)
+        review = add_review(self.user, 2, '', restaurant=self.restaurant)
+        review.delete()
+        self.restaurant.refresh_from_db()
+        self.assertEqual((self.restaurant.rating_count, self.restaurant.rating_sum, self.restaurant.rating_2), (1, 4, 0))
+
+    def test_deleting_a_restaurant_skips_its_reviews_aggregates(self):
+        for rating in range(1, 6):
+            add_review(self.user, rating, '', restaurant=self.restaurant)
+            add_review(self.user, rating, '', food_item=self.food)
+        with CaptureQueriesContext(connection) as ctx:
+            self.restaurant.delete()
+        updates = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertFalse([sql for sql in updates if 'rating' in sql])
+        self.assertFalse(Review.objects.exists())
+
+
+@override_settings(LOGIN_THROTTLE={'IP': (3, 60), 'USERNAME': (2, 60), 'CACHE': None})
+class LoginThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.create(username='alice', email='alice@example.com', password=make_password('secret'), phone='0')
+
+    def sign_in(self, username, password='wrong'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('signin'), {'username_or_email': username, 'password': password})
+        return response.status_code, len(ctx.captured_queries)
+
+    def test_rejected_before_any_lookup(self):
+        self.assertEqual(self.sign_in('ALICE')[0], 200)
+        self.assertEqual(self.sign_in('alice ')[0], 200)
+        self.assertEqual(self.sign_in('alice', 'secret'), (429, 0))
+        # The IP bucket (3) is empty now too, whatever the username.
+        self.assertEqual(self.sign_in('bob'), (429, 0))
+
+    @override_settings(LOGIN_THROTTLE={'IP': (3, 60), 'USERNAME': (10, 60), 'CACHE': 'shared'})
+    def test_budget_is_shared_between_processes(self):
+        caches['shared'].clear()
+        first, second = LoginThrottle(), LoginThrottle()
+        self.assertEqual([first.allow('10.0.0.1', 'alice') for _ in range(2)], [True, True])
+        self.assertTrue(second.allow('10.0.0.1', 'alice'))
+        self.assertFalse(second.allow('10.0.0.1', 'alice'))
+        self.assertEqual(second.stats(), {'ip': 1, 'username': 0})
+
+    def test_buckets_refill(self):
+        buckets = TokenBuckets(capacity=2, per_seconds=0.05, max_keys=1)
+        self.assertEqual([buckets.take('a') for _ in range(3)], [True, True, False])
+        time.sleep(0.06)
+        self.assertTrue(buckets.take('a'))
+        buckets.take('b')
+        self.assertEqual(list(buckets._buckets), ['b'])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            username='alice', email='alice@example.com', password=make_password('secret'), phone='555-0100'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Pizza Place', address='1 Main St', image='restaurant_images/steak2.jpg', is_featured=True
+        )
+        cls.food = FoodItem.objects.create(
+            restaurant=cls.restaurant, name='Margherita', price='9.50',
+            description='Tomato and mozzarella', image='food_images/pizzaitem1.jpg'
+        )
+        Cart.objects.create(customer=cls.customer, food=cls.food, quantity=2)
+        cls.order = Order.objects.create(customer=cls.customer, total_price='19.00', status='Confirmed')
+        OrderItem.objects.create(order=cls.order, food=cls.food, quantity=2)
+
+    def setUp(self):
+        session = self.async_client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+
+    async def test_pages_under_asgi(self):
+        for url in [
+            reverse('restaurant_list'), reverse('menu', args=[self.restaurant.pk]), f"{reverse('search')}?q=margherita",
+            reverse('cart'), reverse('order_details', args=[self.order.pk]),
+        ]:
+            response = await self.async_client.get(url)
+            self.assertContains(response, 'Margherita' if 'order_details' in url else 'alice')
+        response = await self.async_client.get(reverse('cart'))
+        self.assertEqual(response.context['total'], 19)
+        self.assertEqual(len(response.context['cart_items']), 1)
+
+    async def test_menu_revalidates(self):
+        url = reverse('menu', args=[self.restaurant.pk])
+        await self.async_client.get(url)  # sets the CSRF cookie, which is part of the ETag
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    async def test_missing_rows_are_404(self):
+        other = await Customer.objects.acreate(username='bob', email='bob@example.com', password='x', phone='0')
+        order = await Order.objects.acreate(customer=other, total_price='1.00', status='Confirmed')
+        self.assertEqual((await self.async_client.get(reverse('order_details', args=[order.pk]))).status_code, 404)
+        self.assertEqual((await self.async_client.get(reverse('menu', args=[0]))).status_code, 404)
+
+
+class OrderEventsTests(TransactionTestCase):
+    # Transactional: the hub reads events on its own threads and connections.
+    def setUp(self):
+        self.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        self.order = Order.objects.create(customer=self.customer, total_price='9.50', status='Placed')
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+
+    def test_status_changes_are_recorded(self):
+        self.order.save()
+        self.assertFalse(OrderStatusEvent.objects.exists())
+        self.order.status = 'Preparing'
+        self.order.save()
+        self.assertEqual(list(OrderStatusEvent.objects.values_list('order_id', 'status')), [(self.order.pk, 'Preparing')])
+
+    def test_old_events_are_pruned(self):
+        old = OrderStatusEvent.objects.create(order=self.order, status='Preparing')
+        OrderStatusEvent.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=2))
+        recent = OrderStatusEvent.objects.create(order=self.order, status='Delivered')
+        prune_events()
+        self.assertEqual(list(OrderStatusEvent.objects.values_list('pk', flat=True)), [recent.pk])
+
+    def test_wsgi_fallback_sends_current_status(self):
+        response = self.client.get(reverse('order_events', args=[self.order.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b'"status": "Placed"', response.content)
+        bob = Customer.objects.create(username='bob', email='bob@example.com', password='x', phone='0')
+        other = Order.objects.create(customer=bob, total_price='1.00', status='Placed')
+        self.assertEqual(self.client.get(reverse('order_events', args=[other.pk])).status_code, 404)
+
+    async def test_hub_fans_out_changes(self):
+        watchers = [order_status_hub.subscribe(self.order.pk) for _ in range(3)]
+        try:
+            await order_status_hub.ready()
+            self.order.status = 'Out for delivery'
+            await sync_to_async(self.order.save)()
+            for watcher in watchers:
+                await asyncio.wait_for(watcher.ready.wait(), timeout=5)
+                self.assertIn(b'"status": "Out for delivery"', watcher.take())
+        finally:
+            for watcher in watchers:
+                order_status_hub.unsubscribe(watcher)
+        self.assertEqual(order_status_hub.streams, 0)
+
+    async def test_hub_delivers_events_that_commit_out_of_order(self):
+        other = await sync_to_async(Order.objects.create)(customer=self.customer, total_price='1.00', status='Placed')
+        watcher, other_watcher = order_status_hub.subscribe(self.order.pk), order_status_hub.subscribe(other.pk)
+        try:
+            await order_status_hub.ready()
+            last = order_status_hub.last_event_id
+            # An id handed out first but committed after a higher one.
+            await sync_to_async(OrderStatusEvent.objects.create)(pk=last + 5, order=other, status='Preparing')
+            await asyncio.wait_for(other_watcher.ready.wait(), timeout=5)
+            other_watcher.take()
+            await sync_to_async(OrderStatusEvent.objects.create)(pk=last + 2, order=self.order, status='Preparing')
+            await asyncio.wait_for(watcher.ready.wait(), timeout=5)
+            self.assertIn(b'"status": "Preparing"', watcher.take())
+            await asyncio.sleep(POLL_SECONDS * 2)  # both are read again, but not handed out again
+            self.assertFalse(watcher.ready.is_set() or other_watcher.ready.is_set())
+        finally:
+            order_status_hub.unsubscribe(watcher)
+            order_status_hub.unsubscribe(other_watcher)
+
+
+def failing_job(message):
+    raise ValueError(message)
+
+
+class OpeningHoursTests(TestCase):
+    MONDAY = datetime(2026, 10, 19)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        schedules = {
+            'Lunch Bar': 'Mon-Fri 11:00-14:30',
+            'Night Owl': 'Fri-Sat 6pm - 2am\nSun closed',
+            'Sunday Late': 'Sunday: 22:00 to 01:00',
+            'Unknown Hours': 'whenever we feel like it',
+        }
+        cls.restaurants = {
+            name: Restaurant.objects.create(name=name, address='1 Main St', weekly_schedule=schedule)
+            for name, schedule in schedules.items()
+        }
+
+    def open_at(self, days, hour, minute=0):
+        when = timezone.make_aware(self.MONDAY + timedelta(days=days, hours=hour, minutes=minute))
+        ids = set(opening_hours.open_restaurant_ids(when).values_list('restaurant_id', flat=True))
+        return sorted(name for name, restaurant in self.restaurants.items() if restaurant.pk in ids)
+
+    def test_parse_schedule(self):
+        self.assertEqual(opening_hours.parse_schedule('Sat, Sun: noon - midnight; Mon 9.30am-11'), [
+            (0, dt_time(9, 30), dt_time(11)), (5, dt_time(12), dt_time(0)), (6, dt_time(12), dt_time(0)),
+        ])
+        for text in ('Mon 9-25', 'Caturday 9-17', '9-17', 'Mon 9'):
+            with self.assertRaises(ValueError):
+                opening_hours.parse_schedule(text)
+
+    def test_open_at(self):
+        self.assertEqual(self.open_at(0, 11), ['Lunch Bar'])
+        self.assertEqual(self.open_at(0, 14, 30), [])
+        self.assertEqual(self.open_at(4, 23), ['Night Owl'])
+        # Saturday's span runs into Sunday; Sunday's runs into Monday, across the end of the week.
+        self.assertEqual(self.open_at(6, 1, 59), ['Night Owl'])
+        self.assertEqual(self.open_at(6, 23), ['Sunday Late'])
+        self.assertEqual(self.open_at(0, 0, 30), ['Sunday Late'])
+        self.assertEqual(OpeningHours.objects.filter(restaurant=self.restaurants['Unknown Hours']).count(), 0)
+
+    def test_schedule_edits_update_the_index(self):
+        restaurant = self.restaurants['Lunch Bar']
+        restaurant.weekly_schedule = 'Daily 11:00-14:30'
+        restaurant.save()
+        self.assertEqual(self.open_at(6, 12), ['Lunch Bar'])
+        OpeningHours.objects.get(restaurant=restaurant, weekday=6).delete()
+        self.assertEqual(self.open_at(6, 12), [])
+        self.assertEqual(self.open_at(0, 12), ['Lunch Bar'])
+
+    def test_unreadable_schedule_does_not_block_other_edits(self):
+        restaurant = self.restaurants['Unknown Hours']
+        data = {
+            'name': restaurant.name, 'address': '2 Side St', 'delivery_charge': '0', 'min_order': '0',
+            'weekly_schedule': restaurant.weekly_schedule,
+        }
+        response = self.client.post(reverse('edit_restaurant', args=[restaurant.pk]), data)
+        self.assertRedirects(response, reverse('restaurant_page', args=[restaurant.pk]), fetch_redirect_response=False)
+        restaurant.refresh_from_db()
+        self.assertEqual((restaurant.address, restaurant.weekly_schedule), ('2 Side St', 'whenever we feel like it'))
+        form = RestaurantForm(dict(data, weekly_schedule='whenever, really'), instance=restaurant)
+        self.assertIn('weekly_schedule', form.errors)
+
+    def test_filters(self):
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+        response = self.client.get(reverse('restaurant_list'), {'open': '2026-10-23T23:30'})
+        self.assertContains(response, 'Night Owl')
+        self.assertNotContains(response, 'Lunch Bar')
+        response = self.client.get(reverse('search'), {'q': 'lunch night', 'open': '2026-10-20T12:00'})
+        self.assertEqual([restaurant.name for restaurant in response.context['restaurants']], ['Lunch Bar'])
+        self.assertContains(response, 'Open at 2026-10-20T12:00')
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', SESSION_CACHE_ALIAS='shared')
+class CartApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        cls.pizza = FoodItem.objects.create(restaurant=restaurant, name='Margherita', price='9.50')
+        cls.salad = FoodItem.objects.create(restaurant=restaurant, name='Salad', price='4.25')
+
+    def setUp(self):
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+        Cart.objects.create(customer=self.customer, food=self.pizza, quantity=2)
+
+    def post(self, name, food, data, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.post(reverse(name, args=[food.pk]), data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_quantity_change_is_two_queries(self):
+        data = self.post('cart_api_set', self.pizza, {'quantity': 3}, 2)
+        self.assertEqual(data, {'line': {'food_id': self.pizza.pk, 'quantity': 3, 'line_total': '28.50'},
+                                'subtotal': '28.50', 'count': 3})
+        self.assertEqual(self.post('cart_api_add', self.pizza, {'quantity': 2}, 2)['line']['quantity'], 5)
+        self.assertEqual(self.post('cart_api_add', self.salad, {}, 2)['subtotal'], '51.75')
+        self.assertEqual(self.post('cart_api_remove', self.pizza, {}, 2)['count'], 1)
+        # The badge on the next page comes from the refreshed summary, without another query.
+        self.assertEqual(get_cart_summary(self.customer.user_id)['count'], 1)
+
+    def test_batch(self):
+        response = self.client.post(reverse('cart_api_batch'), {'items': [
+            {'food_id': self.pizza.pk, 'quantity': 0}, {'food_id': self.salad.pk, 'quantity': 4},
+        ]}, content_type='application/json')
+        self.assertEqual(response.json()['lines'][0]['quantity'], 0)
+        self.assertEqual(response.json()['subtotal'], '17.00')
+        self.assertEqual(list(Cart.objects.values_list('food_id', 'quantity')), [(self.salad.pk, 4)])
+
+    def test_errors(self):
+        url = reverse('cart_api_set', args=[self.pizza.pk])
+        self.assertEqual(self.client.post(url, {'quantity': 100}).status_code, 400)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.post(reverse('cart_api_add', args=[0])).status_code, 404)
+        response = self.client.post(reverse('cart_api_batch'), {'items': [
+            {'food_id': self.salad.pk, 'quantity': 1}, {'food_id': 0, 'quantity': 1},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Cart.objects.filter(food=self.salad).exists())
+        self.client.cookies.clear()
+        self.assertEqual(self.client.post(url, {'quantity': 1}).status_code, 401)
+
+
+class CartSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        cls.pizza = FoodItem.objects.create(restaurant=restaurant, name='Margherita', price='9.50')
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+
+    def summary(self):
+        return get_cart_summary(self.customer.user_id)
+
+    def test_cached_until_the_cart_changes(self):
+        self.assertEqual(self.summary(), {'count': 0, 'subtotal': Decimal('0.00')})
+        self.client.post(reverse('add_to_cart', args=[self.pizza.pk]), {'quantity': 2})
+        self.assertEqual(self.summary(), {'count': 2, 'subtotal': Decimal('19.00')})
+        with self.assertNumQueries(0):
+            self.summary()
+        self.client.get(reverse('remove_from_cart', args=[self.pizza.pk]))
+        self.assertEqual(self.summary()['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('place_order'), {'selected_items': [self.pizza.pk]})
+        self.assertEqual(self.summary()['count'], 0)
+
+    def test_price_changes_expire_subtotals(self):
+        self.client.post(reverse('add_to_cart', args=[self.pizza.pk]), {'quantity': 2})
+        self.assertEqual(self.summary()['subtotal'], Decimal('19.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.price = Decimal('10.00')
+            self.pizza.save()
+        self.assertEqual(self.summary()['subtotal'], Decimal('20.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuImport().run(StringIO(
+                'name,price,description,restaurant_id\n'
+                f'Margherita,11.00,Tomato,{self.pizza.restaurant_id}\n'
+            ), 'csv')
+        self.assertEqual(self.summary()['subtotal'], Decimal('22.00'))
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    # Transactional: every thread writes through its own connection.
+    THREADS = 8
+    CLICKS = 20
+
+    def setUp(self):
+        self.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        self.pizza = FoodItem.objects.create(restaurant=restaurant, name='Margherita', price='9.50')
+        self.salad = FoodItem.objects.create(restaurant=restaurant, name='Salad', price='4.25')
+        Cart.objects.create(customer=self.customer, food=self.salad, quantity=self.THREADS * self.CLICKS // 2)
+
+    def hammer(self, *clicks):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def client(n):
+            barrier.wait()
+            try:
+                for _ in range(self.CLICKS):
+                    clicks[n % len(clicks)]()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_no_lost_updates_or_duplicate_lines(self):
+        customer_id = self.customer.user_id
+        self.hammer(
+            lambda: carts.add(customer_id, self.pizza.pk, 1),
+            lambda: carts.decrement(customer_id, self.salad.pk),
+        )
+        # Half the clicks added a pizza each; the other half took the salads down to exactly none.
+        self.assertEqual(list(Cart.objects.values_list('food_id', 'quantity')),
+                         [(self.pizza.pk, self.THREADS * self.CLICKS // 2)])
+
+
+class OrderPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        cls.food = FoodItem.objects.create(restaurant=restaurant, name='Margherita', price='9.50')
+
+    def test_checkout_leaves_the_rest_to_the_worker(self):
+        Cart.objects.create(customer=self.customer, food=self.food, quantity=2)
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+        self.client.post(reverse('place_order'), {'selected_items': [self.food.pk]})
+        order = Order.objects.get()
+        self.assertEqual(order.status, Order.PLACED)
+        self.assertEqual(Job.objects.get().name, 'food.orders.process_placed_order')
+
+        jobs.work('test', lambda: False)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.CONFIRMED)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(OrderStatusEvent.objects.get().status, Order.CONFIRMED)
+
+    def test_transitions(self):
+        order = Order.objects.create(customer=self.customer, total_price='9.50', status=Order.PLACED)
+        transition(order.pk, Order.CANCELLED)
+        with self.assertRaises(InvalidTransition):
+            transition(order.pk, Order.CONFIRMED)
+
+    def test_failing_jobs_back_off_then_fail(self):
+        job = jobs.enqueue(failing_job, max_attempts=2, message='card declined')
+        jobs.work('test', lambda: False)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, job.created_at)
+        self.assertIn('card declined', job.last_error)
+
+        Job.objects.update(run_after=job.created_at)
+        jobs.work('test', lambda: False)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(jobs.queue_stats()['counts'][Job.FAILED], 1)
+
+
+class MenuImportTests(TestCase):
+    CSV = (
+        'type,name,address,delivery_charge,min_order,restaurant,price,description\n'
+        'restaurant,Noodle Bar,1 Main St,1.00,5.00,,,\n'
+        'dish,Ramen,,,,Noodle Bar,{price},Pork broth\n'
+        'dish,Udon,,,,Noodle Bar,cheap,Thick noodles\n'
+        'dish,Pho,,,,Nowhere,8.00,Beef broth\n'
+    )
+
+    def test_csv_upsert(self):
+        importer = MenuImport(batch_size=2).run(StringIO(self.CSV.format(price='9.50')), 'csv')
+        self.assertEqual(importer.summary()['restaurants'], {'created': 1, 'updated': 0})
+        self.assertEqual(importer.summary()['dishes'], {'created': 1, 'updated': 0})
+        self.assertEqual([error['line'] for error in importer.errors], [4, 5])
+        self.assertIn('price', importer.errors[0]['error'])
+        ramen = FoodItem.objects.get(name='Ramen')
+        self.assertEqual(ramen.restaurant.name, 'Noodle Bar')
+        self.assertTrue(SearchIndexEntry.objects.filter(term='ramen', doc_id=ramen.pk).exists())
+
+        importer = MenuImport().run(StringIO(self.CSV.format(price='11.00')), 'csv')
+        self.assertEqual(importer.summary()['restaurants'], {'created': 0, 'updated': 1})
+        self.assertEqual(importer.summary()['dishes'], {'created': 0, 'updated': 1})
+        self.assertEqual(FoodItem.objects.get(name='Ramen').price, 11)
+        self.assertEqual(Restaurant.objects.count(), 1)
+
+    def test_upload_endpoint(self):
+        restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        self.client.force_login(User.objects.create_user('owner', password='secret'))
+        upload = SimpleUploadedFile('menu.jsonl', (
+            b'{"name": "Margherita", "price": 9.5, "description": "Tomato"}\n'
+            b'{"name": "Marinara", "description": "No price"}\n'
+            b'{"type": "restaurant", "name": "Sneaky", "address": "-"}\n'
+        ))
+        response = self.client.post(reverse('import_menu', args=[restaurant.pk]), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['dishes'], {'created': 1, 'updated': 0})
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3])
+        self.assertEqual(list(restaurant.fooditem_set.values_list('name', flat=True)), ['Margherita'])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_form_saves_all_dishes_or_none(self):
+        restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        self.client.force_login(User.objects.create_user('owner', password='secret'))
+        url = reverse('add_food_items', args=[restaurant.pk])
+        dishes = {'name': ['Margherita', 'Marinara'], 'price': ['9.50', 'cheap'], 'description': ['Tomato', 'Garlic']}
+        # A batch boundary between the rows must not let the first one through.
+        with mock.patch('food.views.MenuImport', lambda **kwargs: MenuImport(batch_size=1, **kwargs)):
+            response = self.client.post(url, dishes)
+        self.assertEqual(response.status_code, 200)
+        errors = [str(message) for message in response.context['messages']]
+        self.assertTrue(errors[0].startswith('Food item 2: price'), errors)
+        self.assertIn('No food items were saved', errors[-1])
+        self.assertFalse(restaurant.fooditem_set.exists())
+
+        dishes['price'][1] = '8.00'
+        response = self.client.post(url, dishes)
+        self.assertRedirects(response, reverse('submit_for_approval', args=[restaurant.pk]), fetch_redirect_response=False)
+        self.assertEqual(sorted(restaurant.fooditem_set.values_list('name', flat=True)), ['Margherita', 'Marinara'])
+
+    def test_opening_hours(self):
+        rows = (
+            '{"type": "restaurant", "name": "Night Owl", "address": "-", "delivery_charge": 0, "min_order": 0, '
+            '"weekly_schedule": "%s"}\n'
+        )
+        MenuImport().run(StringIO(rows % 'Mon-Sun 18:00-02:00'), 'jsonl')
+        restaurant = Restaurant.objects.get(name='Night Owl')
+        self.assertEqual(OpeningHours.objects.filter(restaurant=restaurant).count(), 7)
+        self.assertTrue(OpenHourSlot.objects.filter(restaurant=restaurant, hour=1).exists())  # Mon 01:00, from Sunday
+
+        MenuImport().run(StringIO(rows % 'Sat 10:00-14:00'), 'jsonl')
+        self.assertEqual(list(OpeningHours.objects.filter(restaurant=restaurant).values_list('weekday', flat=True)), [5])
+
+
+class DerivativeLookupTests(SimpleTestCase):
+    def test_lookups_are_remembered(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            target = images.derivative_name('food_images/new.jpg', 'thumb')
+            self.assertFalse(images.derivative_exists(target))
+            default_storage.save(target, ContentFile(b'webp'))
+            self.assertFalse(images.derivative_exists(target))  # missing, until that is MISSING_DERIVATIVE_SECONDS old
+            images._known_derivatives[target] -= images.MISSING_DERIVATIVE_SECONDS
+            self.assertTrue(images.derivative_exists(target))
+            default_storage.delete(target)
+            self.assertTrue(images.derivative_exists(target))
+
+
+class AutocompleteIndexTests(SimpleTestCase):
+    def test_bulk_load_then_incremental_changes(self):
+        index = PrefixIndex()
+        index.load([('Pizza House', None, 3), ('Green Garden', 7, 1), ('', 8, 1), ('Pizza House', None, 1)])
+        self.assertEqual(index.lookup('pizza', 5), [('Pizza House', 4, None)])
+        self.assertEqual(index.lookup('gard', 5), [('Green Garden', 1, 7)])
+        index.add('Garden Pizza', 9)
+        self.assertEqual([name for name, _, _ in index.lookup('pizz', 5)], ['Pizza House', 'Garden Pizza'])
+        index.remove('Green Garden', 7)
+        self.assertEqual([name for name, _, _ in index.lookup('garden', 5)], ['Garden Pizza'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def request(self, method='get', write=False, cookies=None):
+        routed = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Cart)
+            routed.append(self.router.db_for_read(Cart))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = replica_pinning_middleware(view)(request)
+        return routed[0], response.cookies.get(PIN_COOKIE)
+
+    def test_reads_use_replica(self):
+        self.assertEqual(self.request(), ('replica', None))
+
+    def test_writes_pin_the_client_to_primary(self):
+        database, pin = self.request(write=True)
+        self.assertEqual(database, 'default')
+        self.assertEqual(pin['max-age'], 5)
+        self.assertEqual(self.request(cookies={PIN_COOKIE: '1'}), ('default', None))
+
+    def test_unsafe_methods_read_from_primary(self):
+        self.assertEqual(self.request('post'), ('default', None))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Cart), 'default')
+
+
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def make_cache(self, location, **options):
+        return TwoTierCache(location, {'OPTIONS': {'SHARED': 'shared', **options}})
+
+    def test_tiers(self):
+        first = self.make_cache('process-1', LOCAL_TIMEOUT=60)
+        second = self.make_cache('process-2', LOCAL_TIMEOUT=60)
+        first.set('dish', {'name': 'Ramen'})
+        self.assertEqual(second.get('dish'), {'name': 'Ramen'})
+        self.assertEqual(second.get('dish'), {'name': 'Ramen'})
+        self.assertIsNone(second.get('missing'))
+        self.assertEqual(
+            [second.stats()[outcome] for outcome in ('local_hits', 'shared_hits', 'misses')], [1, 1, 1]
+        )
+        # Another process's delete reaches the shared tier at once and this LRU once LOCAL_TIMEOUT runs out.
+        first.delete('dish')
+        self.assertIsNone(caches['shared'].get('dish'))
+        self.assertEqual(second.get('dish'), {'name': 'Ramen'})
+        self.assertIsNone(self.make_cache('process-3', LOCAL_TIMEOUT=0).get('dish'))
+
+    def test_lru_bounds(self):
+        lru = self.make_cache('small', MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            lru.set(key, key)
+        stats = lru.stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (2, 1))
+        big = self.make_cache('tiny', MAX_BYTES=100)
+        big.set('blob', 'x' * 200)
+        self.assertEqual(big.stats()['entries'], 0)
+        self.assertEqual(big.get('blob'), 'x' * 200)
+
+    def test_namespace_invalidation(self):
+        menus = Namespace('menus')
+        key = menus.key('restaurant', 1)
+        cache.set(key, 'html')
+        menus.invalidate()
+        self.assertNotEqual(menus.key('restaurant', 1), key)
+        self.assertIsNone(cache.get(menus.key('restaurant', 1)))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', SESSION_CACHE_ALIAS='shared')
+    def test_sessions_are_cached_and_written_through(self):
+        customer = Customer.objects.create(
+            username='alice', email='alice@example.com', password=make_password('secret'), phone='555-0100'
+        )
+        self.client.post(reverse('signin'), {'username_or_email': 'alice', 'password': 'secret'})
+        session_key = self.client.session.session_key
+        self.assertTrue(caches['shared'].get(f'django.contrib.sessions.cached_db{session_key}'))
+        self.assertEqual(Session.objects.get(pk=session_key).get_decoded()['customer_id'], customer.user_id)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        cls.user = User.objects.create_user('critic')
+        cls.restaurants = [
+            Restaurant.objects.create(name=f'Restaurant {i}', address='1 Main St', is_featured=i == 0) for i in range(12)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+
+    def lookups(self, *pages):
+        """Hits and misses while loading the restaurant list at ``pages``."""
+        before = fragment_stats()
+        for page in pages:
+            self.assertEqual(self.client.get(reverse('restaurant_list'), {'page': page}).status_code, 200)
+        after = fragment_stats()
+        return after['hits'] - before['hits'], after['misses'] - before['misses']
+
+    def test_cached_fragment(self):
+        render = mock.Mock(return_value='<p>grid</p>')
+        self.assertEqual(cached_fragment('grid', render, 1), '<p>grid</p>')
+        self.assertEqual(cached_fragment('grid', render, 1), '<p>grid</p>')
+        self.assertEqual(render.call_count, 1)
+        bump_catalog_version()
+        cached_fragment('grid', render, 1)
+        self.assertEqual(render.call_count, 2)
+
+    def test_page_numbers_share_fragments(self):
+        # Each page load looks up the featured block and the grid.
+        self.assertEqual(self.lookups('1', '01', 'x', '0'), (6, 2))
+        self.assertEqual(self.lookups('2', '002'), (3, 1))
+
+    def test_ratings_only_expire_fragments_showing_the_restaurant(self):
+        self.lookups('1', '2')
+        add_review(self.user, 5, '', restaurant=self.restaurants[10])
+        self.assertEqual(self.lookups('1', '2'), (3, 1))  # only page 2 shows it
+        add_review(self.user, 5, '', restaurant=self.restaurants[0])
+        self.assertEqual(self.lookups('1', '2'), (2, 2))  # featured, and on page 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurants[11].save()
+        self.assertEqual(self.lookups('1'), (0, 2))  # a saved restaurant still expires the whole catalog
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class MenuConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(username='alice', email='alice@example.com', password='x', phone='0')
+        cls.user = User.objects.create_user('critic')
+        cls.restaurant = Restaurant.objects.create(
+            name='Pizza Place', address='1 Main St', image='restaurant_images/steak2.jpg'
+        )
+        cls.food = FoodItem.objects.create(
+            restaurant=cls.restaurant, name='Margherita', price='9.50', image='food_images/pizzaitem1.jpg'
+        )
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.url = reverse('menu', args=[self.restaurant.pk])
+
+    def sign_in(self, customer):
+        session = self.client.session
+        session['customer_id'] = customer.user_id
+        session.save()
+        self.client.get(self.url)  # sets the CSRF cookie, which is part of the ETag
+
+    def assertRevalidates(self, etag, changed):
+        """Conditional GET with ``etag``: 200 and a new ETag if ``changed``, else 304. Returns the current ETag."""
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200 if changed else 304)
+        self.assertEqual(response['ETag'] != etag, changed)
+        return response['ETag']
+
+    def test_etag_follows_the_menu(self):
+        self.sign_in(self.customer)
+        etag = self.client.get(self.url)['ETag']
+        etag = self.assertRevalidates(etag, changed=False)
+        self.food.price = '10.50'
+        self.food.save()
+        etag = self.assertRevalidates(etag, changed=True)
+        add_review(self.user, 4, '', food_item=self.food)
+        etag = self.assertRevalidates(etag, changed=True)
+        OpeningHours.objects.create(restaurant=self.restaurant, weekday=0, opens=dt_time(11), closes=dt_time(22))
+        etag = self.assertRevalidates(etag, changed=True)
+        self.assertRevalidates(etag, changed=False)
+
+    def test_etag_varies_by_customer_and_cart(self):
+        self.sign_in(self.customer)
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('add_to_cart', args=[self.food.pk]), {'quantity': 1})
+        self.assertFalse(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).has_header('ETag'))  # shows the flash message
+        etag = self.assertRevalidates(etag, changed=True)
+        bob = Customer.objects.create(username='bob', email='bob@example.com', password='x', phone='0')
+        self.sign_in(bob)
+        self.assertRevalidates(etag, changed=True)
+
+    def test_anonymous_pages_use_last_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = Restaurant.objects.create(
+            name='Pizza Place', address='1 Main St', image='restaurant_images/steak2.jpg'
+        )
+
+    def view_metrics(self, view):
+        return metrics.registry.snapshot().get(view) or metrics.ViewMetrics()
+
+    def test_queries_and_templates_are_counted_per_request(self):
+        before = self.view_metrics('menu')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('menu', args=[self.restaurant.pk])).status_code, 200)
+        after = self.view_metrics('menu')
+        self.assertEqual(after.requests - before.requests, 1)
+        self.assertEqual(after.queries.sum - before.queries.sum, len(ctx.captured_queries))
+        self.assertGreater(after.template_seconds, before.template_seconds)
+        self.assertGreaterEqual(after.latency.sum - before.latency.sum, after.template_seconds - before.template_seconds)
+        # Queries outside any request aren't charged to one.
+        Restaurant.objects.count()
+        self.assertEqual(self.view_metrics('menu').queries.sum, after.queries.sum)
+
+    def test_exports(self):
+        self.client.get(reverse('menu', args=[self.restaurant.pk]))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('grabnow_requests_total{view="menu"}', response.content.decode())
+        response = self.client.get(reverse('metrics_jsonl'))
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in response.content.decode().splitlines()]
+        self.assertIn('menu', [row['view'] for row in rows])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_exports_are_restricted_by_ip(self):
+        self.assertEqual(self.client.get(reverse('metrics_jsonl')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('metrics_jsonl'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            username='alice', email='alice@example.com', password=make_password('secret'), phone='555-0100'
+        )
+        cls.user = User.objects.create_user('alice', password='secret')
+        cls.restaurant = Restaurant.objects.create(name='Pizza Place', address='1 Main St')
+        food = FoodItem.objects.create(restaurant=cls.restaurant, name='Margherita', price='9.50')
+        orders = Order.objects.bulk_create([
+            Order(customer=cls.customer, status='Confirmed', total_price='19.00') for _ in range(7)
+        ])
+        OrderItem.objects.bulk_create([OrderItem(order=order, food=food, quantity=2) for order in orders])
+        reviews = Review.objects.bulk_create([
+            Review(user=cls.user, rating=i % 5 + 1, restaurant=cls.restaurant, menu_restaurant=cls.restaurant)
+            for i in range(7)
+        ])
+        # Ties on created_at must be broken by pk so no page boundary drops or repeats a review.
+        now = timezone.now()
+        for i, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(created_at=now - timedelta(minutes=i // 3))
+        for i, order in enumerate(orders):
+            Order.objects.filter(pk=order.pk).update(timestamp=now - timedelta(minutes=i // 3))
+
+    def page_through(self, url, key, id_field, limit):
+        pages, cursor = [], None
+        while True:
+            data = {'limit': limit} | ({'cursor': cursor} if cursor else {})
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            pages.append([row[id_field] for row in body[key]])
+            cursor = body['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_review_feed_pages_through_ties_once_each(self):
+        expected = list(
+            Review.objects.filter(menu_restaurant=self.restaurant).order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+        for limit in (1, 2, 3, 7, 10):
+            pages = self.page_through(reverse('menu_reviews', args=[self.restaurant.pk]), 'reviews', 'id', limit)
+            self.assertEqual([pk for page in pages for pk in page], expected, limit)
+            self.assertTrue(all(pages), limit)
+
+    def test_order_history_pages_through_ties_once_each(self):
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+        expected = list(
+            Order.objects.filter(customer=self.customer).order_by('-timestamp', '-pk').values_list('pk', flat=True)
+        )
+        for limit in (1, 2, 3, 7, 10):
+            pages = self.page_through(reverse('order_history'), 'orders', 'order_id', limit)
+            self.assertEqual([pk for page in pages for pk in page], expected, limit)
+            self.assertTrue(all(pages), limit)
+        # A customer with no orders gets one empty, final page.
+        other = Customer.objects.create(username='bob', email='bob@example.com', password='x', phone='555-0101')
+        session['customer_id'] = other.user_id
+        session.save()
+        self.assertEqual(self.client.get(reverse('order_history')).json(), {'orders': [], 'next_cursor': None})
+
+    def test_tampered_cursors_are_rejected(self):
+        url = reverse('menu_reviews', args=[self.restaurant.pk])
+        tampered = ['garbage!', base64.urlsafe_b64encode(b'no separator').decode(),
+                    base64.urlsafe_b64encode(b'2024-01-01T00:00:00|x').decode(), '%%%']
+        for cursor in tampered:
+            with self.assertRaises(ValueError, msg=cursor):
+                decode_cursor(cursor)
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400, cursor)
+        self.assertEqual(self.client.get(url, {'limit': 'ten'}).status_code, 400)
+        session = self.client.session
+        session['customer_id'] = self.customer.user_id
+        session.save()
+        for cursor in tampered:
+            self.assertEqual(self.client.get(reverse('order_history'), {'cursor': cursor}).status_code, 400, cursor)
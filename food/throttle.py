@@ -0,0 +1,146 @@
+# food/throttle.py
+"""
+Token-bucket throttling for sign-in attempts.
+
+Every attempt takes a token from two buckets: one for the client's IP and one
+for the username or email being tried. Each bucket holds up to ``capacity``
+tokens and refills at ``capacity`` per ``per_seconds``. An attempt that finds
+either bucket empty is rejected before the password is hashed. That hash is
+deliberately slow PBKDF2, so an unthrottled burst of bad logins can tie up
+every worker.
+
+The buckets live in process memory, so checking one costs no I/O. Memory is
+bounded: the least recently used keys are forgotten past MAX_KEYS. When
+LOGIN_THROTTLE['CACHE'] names a cache alias, every attempt that the process's
+buckets allow also has to fit the budget shared by all processes. That budget
+is kept as a sliding-window counter in that cache, using atomic incr(). A
+process whose own bucket is empty turns attempts away without asking the
+cache, so a flood costs the shared cache nothing once the local bucket has
+run dry.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+MAX_KEYS = 100_000
+DEFAULTS = {'IP': (20, 60), 'USERNAME': (5, 300), 'CACHE': None}
+
+
+class TokenBuckets:
+    """Token buckets for any number of keys, in this process."""
+
+    def __init__(self, capacity, per_seconds, max_keys=MAX_KEYS):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time they were counted)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, counted_at = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - counted_at) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # The oldest entries have had the longest to refill, so forgetting them is the smallest error.
+                self._buckets.popitem(last=False)
+        return allowed
+
+
+class SharedWindow:
+    """
+    The same budget across processes, as a sliding-window counter in a cache.
+    At most ``capacity`` attempts are allowed in any ``per_seconds``: the
+    current window's count plus the previous window's count, weighted by how
+    much of it still overlaps.
+    """
+
+    def __init__(self, name, capacity, per_seconds, alias):
+        self.name = name
+        self.capacity = capacity
+        self.window = per_seconds
+        self.alias = alias
+
+    def take(self, key):
+        cache = caches[self.alias]
+        now = time.time()
+        window = int(now // self.window)
+        digest = hashlib.md5(key.encode()).hexdigest()
+        current_key = f'throttle:{self.name}:{digest}:{window}'
+        # add() then incr() keeps the count atomic on backends with atomic incr (Redis, Memcached, LocMem).
+        cache.add(current_key, 0, self.window * 2)
+        try:
+            count = cache.incr(current_key)
+        except ValueError:  # expired between add() and incr()
+            cache.set(current_key, 1, self.window * 2)
+            count = 1
+        previous = cache.get(f'throttle:{self.name}:{digest}:{window - 1}', 0)
+        overlap = 1 - (now % self.window) / self.window
+        return count + previous * overlap <= self.capacity
+
+
+class Throttle:
+    def __init__(self, name, capacity, per_seconds, cache_alias=None):
+        self.name = name
+        self.local = TokenBuckets(capacity, per_seconds)
+        self.shared = SharedWindow(name, capacity, per_seconds, cache_alias) if cache_alias else None
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        allowed = self.local.take(key) and (self.shared is None or self.shared.take(key))
+        if not allowed:
+            with self._lock:
+                self.rejected += 1
+        return allowed
+
+
+class LoginThrottle:
+    def __init__(self):
+        config = dict(DEFAULTS, **getattr(settings, 'LOGIN_THROTTLE', {}))
+        self.by_ip = Throttle('ip', *config['IP'], config['CACHE'])
+        self.by_username = Throttle('username', *config['USERNAME'], config['CACHE'])
+
+    def allow(self, ip, username_or_email):
+        # An IP that is already over its limit doesn't get to use up the account's tokens as well.
+        return self.by_ip.allow(ip or '') and self.by_username.allow(username_or_email.strip().lower())
+
+    def stats(self):
+        return {'ip': self.by_ip.rejected, 'username': self.by_username.rejected}
+
+
+_login_throttle = None
+
+
+def login_throttle():
+    # Built on first use, so settings overrides in place by then are honoured.
+    global _login_throttle
+    if _login_throttle is None:
+        _login_throttle = LoginThrottle()
+    return _login_throttle
+
+
+@receiver(setting_changed)
+def reset_login_throttle(setting, **kwargs):
+    global _login_throttle
+    if setting == 'LOGIN_THROTTLE':
+        _login_throttle = None
+
+
+def prometheus_text():
+    if _login_throttle is None:
+        return ''
+    lines = [
+        '# HELP grabnow_login_throttled_total Sign-in attempts rejected by the throttle, by bucket.',
+        '# TYPE grabnow_login_throttled_total counter',
+    ]
+    lines += [f'grabnow_login_throttled_total{{bucket="{name}"}} {count}' for name, count in _login_throttle.stats().items()]
+    return '\n'.join(lines) + '\n'
@@ -9,13 +9,19 @@ urlpatterns = [
     path('signin/', views.signin, name='signin'),
     path('signup/', views.signup, name='signup'),
     path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.prometheus_metrics, name='metrics'),
+    path('metrics.jsonl', views.metrics_jsonl, name='metrics_jsonl'),
     path('terms/', views.terms, name='terms'),
     path('privacy/', views.privacy, name='privacy'),
     path('coming-soon/<str:platform>/', views.coming_soon, name='coming_soon'),
     path('menu/<int:restaurant_id>/', views.menu, name='menu'),
+    path('menu/<int:restaurant_id>/reviews/', views.menu_reviews, name='menu_reviews'),
     path('restaurants/', views.restaurant_list, name='restaurant_list'),
     path('cart/', views.cart, name='cart'),
     path('profile/', views.profile, name='profile'),
+    path('profile/orders/', views.order_history, name='order_history'),
     path('logout/', views.logout, name='logout'),
     path('add_to_cart/<int:food_id>/', views.add_to_cart, name='add_to_cart'),  # 🔥 New route
     path('restaurant/<int:restaurant_id>/menu/', views.restaurant_menu_view, name='restaurant_menu'),
@@ -26,12 +32,18 @@ urlpatterns = [
     path('add_delivery_address/', views.add_delivery_address, name='add_delivery_address'),
     path('update_preferences/', views.update_preferences, name='update_preferences'),
     path('order_details/<int:order_id>/', views.order_details, name='order_details'),
+    path('order_details/<int:order_id>/events/', views.order_events, name='order_events'),
     path('place_order/', views.place_order, name='place_order'),
     path('order_confirmation/<int:order_id>/', views.order_confirmation, name='order_confirmation'),
     path('confirm_order/<int:order_id>/', views.confirm_order, name='confirm_order'),
     path('delete_cart_items/', views.delete_cart_items, name='delete_cart_items'),
+    path('api/cart/<int:food_id>/add/', views.cart_api_add, name='cart_api_add'),
+    path('api/cart/<int:food_id>/quantity/', views.cart_api_set, name='cart_api_set'),
+    path('api/cart/<int:food_id>/remove/', views.cart_api_remove, name='cart_api_remove'),
+    path('api/cart/batch/', views.cart_api_batch, name='cart_api_batch'),
     path('add_restaurant/', views.add_restaurant, name='add_restaurant'),
     path('add_food_items/<int:restaurant_id>/', views.add_food_items, name='add_food_items'),
+    path('restaurant/<int:restaurant_id>/menu/import/', views.import_menu, name='import_menu'),
     path('submit_for_approval/<int:restaurant_id>/', views.submit_for_approval, name='submit_for_approval'),
     path('restaurant/login/', views.restaurant_login, name='restaurant_login'),
     path('restaurant/login/submit/', views.restaurant_login_submit, name='restaurant_login_submit'),
@@ -1,16 +1,44 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.db import connection, transaction
 from django.contrib.auth.hashers import check_password, make_password
+from django.conf import settings
 from django.contrib import messages
+from . import ratings, search as search_index
+from .orders import (
+    MAX_ORDER_HISTORY_PAGE_SIZE, ORDER_HISTORY_PAGE_SIZE, InvalidTransition, order_history_page, order_json,
+    process_placed_order, transition,
+)
+from .jobs import enqueue, prometheus_text as job_metrics
+from .throttle import login_throttle, prometheus_text as throttle_metrics
+from .reviews import MAX_REVIEWS_PAGE_SIZE, REVIEWS_PAGE_SIZE, review_json, review_page
+from .autocomplete import MAX_SUGGESTIONS, autocomplete as autocomplete_index
+from .opening_hours import open_restaurant_ids, parse_open_filter, weekly_hours
+from .cart_summary import get_cart_summary, invalidate_cart_summary, set_cart_summary
+from . import carts
+from .cache import prometheus_text as cache_metrics
+from .async_utils import alist, apage, arender, async_cache_control, async_condition
+from .catalog_cache import acached_fragment, fragment_stats, rows_key
+from .images import schedule_derivatives
+from .order_events import PREAMBLE as EVENT_STREAM_PREAMBLE, prometheus_text as order_stream_metrics, sse_event
+from .menu_import import FORMATS as IMPORT_FORMATS, MenuImport, guess_format
+from . import metrics
+from .middleware import aget_customer
 from .forms import SignUpForm, RestaurantForm, FoodItemForm, RestaurantReviewForm, FoodItemReviewForm
-from django.db.models import Q
-from .models import Restaurant, FoodItem, Cart, Customer, Order, OrderItem, PaymentMethod, DeliveryAddress, Preferences, Review
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import F, Sum, Value
+from .models import Customer, Restaurant, FoodItem, Cart, Order, OrderItem, PaymentMethod, DeliveryAddress, Preferences, Review
 from django.views.decorators.csrf import csrf_exempt
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
 import json
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+import asyncio
+import hashlib
+import io
+from asgiref.sync import sync_to_async
 
 def home(request):
     if 'customer_id' in request.session:
@@ -22,17 +50,25 @@ def signin(request):
         username_or_email = request.POST['username_or_email']
         password = request.POST['password']
 
+        # Checked before the (deliberately slow) password hash, so a burst of guesses can't tie up the workers.
+        if not login_throttle().allow(request.META.get('REMOTE_ADDR'), username_or_email):
+            messages.error(request, 'Too many sign-in attempts. Please wait a few minutes and try again.')
+            return render(request, 'signin.html', status=429)
+
         try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT * FROM food_customer WHERE username = %s OR email = %s", [username_or_email, username_or_email])
-                customer = cursor.fetchone()
+            # Two lookups on the unique username and email indexes, rather than one OR that may scan.
+            credentials = Customer.objects.values_list('user_id', 'password')
+            customer = credentials.filter(username=username_or_email).first()
+            if customer is None and '@' in username_or_email:
+                customer = credentials.filter(email=username_or_email).first()
 
             if customer is None:
                 messages.error(request, 'Invalid username/email or password')
                 return render(request, 'signin.html')
 
-            if check_password(password, customer[3]):
-                request.session['customer_id'] = customer[0]
+            customer_id, password_hash = customer
+            if check_password(password, password_hash):
+                request.session['customer_id'] = customer_id
                 return redirect('restaurant_list')
             else:
                 messages.error(request, 'Invalid username/email or password')
@@ -63,26 +99,76 @@ def signup(request):
         form = SignUpForm()
     return render(request, 'signup.html', {'form': form})
 
-def get_username_by_id(customer_id):
-    customer = Customer.objects.filter(user_id=customer_id).only('username').first()
+def get_username(request):
+    customer = request.customer
     return customer.username if customer else None
 
-def search(request):
-    query = request.GET.get('q')
-    restaurants = Restaurant.objects.filter(name__icontains=query)
-    food_items = FoodItem.objects.filter(name__icontains=query)
-
-    username = None
-    if 'customer_id' in request.session:
-        username = get_username_by_id(request.session['customer_id'])
+async def aget_username(request):
+    customer = await aget_customer(request)
+    return customer.username if customer else None
 
-    return render(request, 'search_results.html', {
+async def asession_customer_id(request):
+    # The first look at the session loads it, which may query the database.
+    return await sync_to_async(request.session.get)('customer_id')
+
+def bump_profile_version(request):
+    # Part of page ETags, so cached pages showing the old username/theme are revalidated.
+    request.session['profile_version'] = request.session.get('profile_version', 0) + 1
+
+def customer_or_404(request):
+    if not request.customer:
+        raise Http404('No Customer matches the given query.')
+    return request.customer
+
+async def search(request):
+    query = request.GET.get('q', '').strip()
+    # Ranking expands the query with a few dependent lookups first, so each search runs as one sync call.
+    open_filter = request.GET.get('open', '')
+    open_at = parse_open_filter(open_filter)
+    restaurants, food_items, username = await asyncio.gather(
+        sync_to_async(search_index.search_restaurants)(query, request.GET.get('restaurants_page', 1), open_at=open_at),
+        sync_to_async(search_index.search_food_items)(query, request.GET.get('page', 1), open_at=open_at),
+        aget_username(request),
+    )
+
+    return await arender(request, 'search_results.html', {
         'restaurants': restaurants,
         'food_items': food_items,
         'query': query,
-        'username': username
+        'username': username,
+        'open_filter': open_filter if open_at else '',
     })
 
+def autocomplete(request):
+    # Served entirely from the in-process prefix index: no session, customer or DB access.
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        limit = 8
+    return JsonResponse({'query': query, 'results': autocomplete_index.suggest(query, limit)})
+
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse({'fragments': fragment_stats(), 'cache': getattr(cache, 'stats', dict)()})
+
+def metrics_allowed(request):
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+
+def prometheus_metrics(request):
+    if not metrics_allowed(request):
+        raise Http404
+    text = (
+        metrics.prometheus_text(metrics.registry.snapshot()) + cache_metrics() + order_stream_metrics() + job_metrics()
+        + throttle_metrics()
+    )
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def metrics_jsonl(request):
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(metrics.jsonl(metrics.registry.snapshot()), content_type='application/x-ndjson')
+
 def terms(request):
     return render(request, 'terms_and_conditions.html')
 
@@ -93,86 +179,176 @@ def coming_soon(request, platform):
     context = {'platform': platform.capitalize()}
     return render(request, 'coming_soon.html', context)
 
-def menu(request, restaurant_id):
-    restaurant = get_object_or_404(Restaurant, restaurant_id=restaurant_id)
+def restaurant_updated_at(request, restaurant_id):
+    # Memoized so the ETag and Last-Modified checks share one query.
+    if not hasattr(request, '_restaurant_updated_at'):
+        request._restaurant_updated_at = (
+            Restaurant.objects.filter(pk=restaurant_id).values_list('updated_at', flat=True).first()
+        )
+    return request._restaurant_updated_at
+
+def restaurant_etag(request, restaurant_id):
+    updated_at = restaurant_updated_at(request, restaurant_id)
+    # Pending flash messages are rendered into the page, so never answer 304 with them queued.
+    if updated_at is None or len(messages.get_messages(request)):
+        return None
+    customer_id = request.session.get('customer_id')
+    parts = [
+        restaurant_id,
+        updated_at.isoformat(),
+        # Per-user bits of the page: navbar name/theme, cart badge and the CSRF token in forms.
+        customer_id,
+        request.session.get('profile_version', 0),
+        get_cart_summary(customer_id)['count'] if customer_id else 0,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+def restaurant_last_modified(request, restaurant_id):
+    # Only anonymous pages are the same for everyone; signed-in pages rely on the ETag.
+    if 'customer_id' in request.session or len(messages.get_messages(request)):
+        return None
+    return restaurant_updated_at(request, restaurant_id)
+
+@async_cache_control(private=True, no_cache=True)
+@async_condition(etag_func=restaurant_etag, last_modified_func=restaurant_last_modified)
+async def menu(request, restaurant_id):
     search_query = request.GET.get('q', '')
+    sort = request.GET.get('sort', '')
 
     if search_query:
-        food_items = FoodItem.objects.filter(
-            Q(restaurant=restaurant) &
-            (Q(name__icontains=search_query) | Q(description__icontains=search_query))
-        ).order_by('name')
+        food_items = sync_to_async(search_index.search_menu)(search_query, restaurant_id)
+    elif sort == 'rating':
+        food_items = alist(ratings.order_by_rating(FoodItem.objects.filter(restaurant_id=restaurant_id)))
     else:
-        food_items = FoodItem.objects.filter(restaurant=restaurant).order_by('name')
-
-    username = None
-    if 'customer_id' in request.session:
-        username = get_username_by_id(request.session['customer_id'])
-
-    return render(request, 'menu.html', {
+        food_items = alist(FoodItem.objects.filter(restaurant_id=restaurant_id).order_by('name'))
+
+    # Everything below only needs the id, so the restaurant is looked up alongside the rest.
+    restaurant, food_items, username, (reviews, reviews_cursor) = await asyncio.gather(
+        Restaurant.objects.filter(restaurant_id=restaurant_id).prefetch_related('opening_hours').afirst(),
+        food_items,
+        aget_username(request),
+        sync_to_async(review_page)(restaurant_id),
+    )
+    if restaurant is None:
+        raise Http404('No Restaurant matches the given query.')
+
+    return await arender(request, 'menu.html', {
         'restaurant': restaurant,
         'food_items': food_items,
         'username': username,
-        'search_query': search_query
+        'search_query': search_query,
+        'sort': sort,
+        'reviews': reviews,
+        'reviews_cursor': reviews_cursor,
+        'weekly_hours': weekly_hours(restaurant.opening_hours.all()),
     })
 
+def menu_reviews(request, restaurant_id):
+    # "More reviews" for the menu page; pass the previous response's next_cursor to continue.
+    try:
+        limit = min(max(int(request.GET.get('limit', REVIEWS_PAGE_SIZE)), 1), MAX_REVIEWS_PAGE_SIZE)
+        reviews, next_cursor = review_page(restaurant_id, request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit.'}, status=400)
+    return JsonResponse({'reviews': [review_json(review) for review in reviews], 'next_cursor': next_cursor})
+
 def restaurant_menu_view(request, restaurant_id):
-    restaurant = get_object_or_404(Restaurant, id=restaurant_id)
+    restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
     query = request.GET.get('q', '')
 
     if query:
-        # Filter food items by restaurant and name matching query
-        food_items = FoodItem.objects.filter(
-            restaurant=restaurant,
-            name__icontains=query
-        )
+        # Ranked matches from the search index, limited to this restaurant
+        food_items = search_index.search_menu(query, restaurant.restaurant_id)
     else:
         food_items = FoodItem.objects.filter(restaurant=restaurant)
 
-    return render(request, 'restaurant/menu.html', {
+    return render(request, 'menu.html', {
         'restaurant': restaurant,
         'food_items': food_items,
+        'username': get_username(request),
+        'search_query': query,
     })
 
-def restaurant_list(request):
-    if 'customer_id' not in request.session:
+async def restaurant_list(request):
+    if await asession_customer_id(request) is None:
         return redirect('signin')
 
-    all_restaurants = Restaurant.objects.all()
-    featured_restaurants = Restaurant.objects.filter(is_featured=True)
-
-    paginator = Paginator(all_restaurants, 9)
-    page = request.GET.get('page', 1)
-
-    try:
-        restaurants_page = paginator.page(page)
-    except PageNotAnInteger:
-        restaurants_page = paginator.page(1)
-    except EmptyPage:
-        restaurants_page = paginator.page(paginator.num_pages)
-
-    username = get_username_by_id(request.session['customer_id'])
-
-    return render(request, 'home_logged_in.html', {
-        'featured_restaurants': featured_restaurants,
-        'restaurants_page': restaurants_page,
-        'username': username
+    page = request.GET.get('page', '1')
+    # "01" and "1" are the same page, and so the same cached fragment; Paginator would read "0" as the last page.
+    page = int(page) if page.isdigit() and int(page) > 0 else 1
+    per_page = 9
+    sort = 'rating' if request.GET.get('sort') == 'rating' else ''
+    open_filter = request.GET.get('open', '')
+    open_at = parse_open_filter(open_filter)
+
+    # "is_featured = true" rather than Django's bare "WHERE is_featured", which SQLite and MySQL
+    # can't answer from food_restaurant_featured_idx.
+    featured = Restaurant.objects.filter(is_featured=Value(True)).order_by('restaurant_id')
+    restaurants = Restaurant.objects.all()
+    if open_at is not None:
+        restaurants = restaurants.filter(restaurant_id__in=open_restaurant_ids(open_at))
+    if sort == 'rating':
+        restaurants = ratings.order_by_rating(restaurants)
+    else:
+        restaurants = restaurants.order_by('restaurant_id')
+
+    async def render_featured():
+        featured_restaurants = await alist(featured)
+        return render_to_string('home_featured_restaurants.html', {'featured_restaurants': featured_restaurants})
+
+    async def render_grid():
+        restaurants_page = await apage(restaurants, per_page, page)
+        return render_to_string('home_restaurant_grid.html', {'restaurants_page': restaurants_page})
+
+    # A fragment is keyed by the ids and updated_at of the restaurants it shows, so a new rating
+    # only expires the fragments showing that restaurant.
+    offset = (page - 1) * per_page
+    featured_shown, grid_shown = await asyncio.gather(
+        alist(featured.values_list('restaurant_id', 'updated_at')),
+        alist(restaurants.values_list('restaurant_id', 'updated_at')[offset:offset + per_page]),
+    )
+    if grid_shown or page == 1:
+        # Opening hours change by the minute, so a filtered grid is cached per minute of the week.
+        grid = acached_fragment(
+            'restaurant_grid', render_grid, sort, page, f'{open_at:%a%H%M}' if open_at else '', rows_key(grid_shown),
+        )
+    else:
+        grid = render_grid()  # past the last page, which Paginator shows instead; not worth a cache entry
+
+    # Only the catalog fragments are cached; username and the cart badge are rendered per request.
+    featured_html, restaurant_grid_html, username = await asyncio.gather(
+        acached_fragment('featured_restaurants', render_featured, rows_key(featured_shown)),
+        grid,
+        aget_username(request),
+    )
+
+    return await arender(request, 'home_logged_in.html', {
+        'featured_html': featured_html,
+        'restaurant_grid_html': restaurant_grid_html,
+        'username': username,
+        'sort': sort,
+        'open_filter': open_filter if open_at else '',
     })
 
-def cart(request):
-    if 'customer_id' not in request.session:
+async def cart(request):
+    customer_id = await asession_customer_id(request)
+    if customer_id is None:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = get_object_or_404(Customer, user_id=customer_id)
-    cart_items = Cart.objects.filter(customer=customer).select_related('food__restaurant').order_by('cart_id')
+    customer, cart_items, delivery_addresses = await asyncio.gather(
+        aget_customer(request),
+        alist(Cart.objects.filter(customer_id=customer_id).select_related('food__restaurant').order_by('cart_id')),
+        alist(DeliveryAddress.objects.filter(customer_id=customer_id)),
+    )
+    if customer is None:
+        raise Http404('No Customer matches the given query.')
     total = sum(item.food.price * item.quantity for item in cart_items)
     total_items = sum(item.quantity for item in cart_items)
-    delivery_addresses = DeliveryAddress.objects.filter(customer=customer)
-    username = get_username_by_id(customer_id)
+    await sync_to_async(set_cart_summary)(customer_id, total_items, total)
 
-    return render(request, 'cart.html', {
-        'username': username,
+    return await arender(request, 'cart.html', {
+        'username': customer.username,
         'customer': customer,
         'cart_items': cart_items,
         'total': total,
@@ -184,18 +360,63 @@ def add_to_cart(request, food_id):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer = get_object_or_404(Customer, user_id=request.session['customer_id'])
+    customer = customer_or_404(request)
     food = get_object_or_404(FoodItem, food_id=food_id)
-    quantity = int(request.POST.get('quantity', 1))
+    try:
+        quantity = carts.parse_quantity(request.POST.get('quantity', 1), minimum=1)
+    except ValueError:
+        messages.error(request, f'Quantity must be between 1 and {carts.MAX_QUANTITY}.')
+        return redirect(request.META.get('HTTP_REFERER', 'cart'))
 
-    cart_item, created = Cart.objects.get_or_create(customer=customer, food=food, defaults={'quantity': quantity})
-    if not created:
-        cart_item.quantity += quantity
-        cart_item.save()
+    carts.add(customer.user_id, food.food_id, quantity)
+    invalidate_cart_summary(customer.user_id)
 
     messages.success(request, f"{food.name} added to cart successfully!")
     return redirect(request.META.get('HTTP_REFERER', 'cart'))
 
+def cart_api_view(view):
+    # The shared parts of the JSON cart endpoints: POST only, signed in, and errors as JSON.
+    @require_POST
+    def wrapper(request, *args, **kwargs):
+        if 'customer_id' not in request.session:
+            return JsonResponse({'error': 'Sign in to use your cart.'}, status=401)
+        try:
+            return view(request, request.session['customer_id'], *args, **kwargs)
+        except (KeyError, TypeError, ValueError) as exc:
+            return JsonResponse({'error': str(exc) if isinstance(exc, ValueError) else 'Invalid request.'}, status=400)
+        except FoodItem.DoesNotExist:
+            return JsonResponse({'error': 'No such food item.'}, status=404)
+    return wrapper
+
+@cart_api_view
+def cart_api_add(request, customer_id, food_id):
+    carts.add(customer_id, food_id, carts.parse_quantity(request.POST.get('quantity', 1), minimum=1))
+    return cart_api_line(customer_id, food_id)
+
+@cart_api_view
+def cart_api_set(request, customer_id, food_id):
+    carts.set_quantity(customer_id, food_id, carts.parse_quantity(request.POST['quantity']))
+    return cart_api_line(customer_id, food_id)
+
+@cart_api_view
+def cart_api_remove(request, customer_id, food_id):
+    carts.remove(customer_id, food_id)
+    return cart_api_line(customer_id, food_id)
+
+@cart_api_view
+def cart_api_batch(request, customer_id):
+    # Body: {"items": [{"food_id": 3, "quantity": 2}, ...]}; quantity 0 removes the line.
+    items = json.loads(request.body)['items']
+    if not 0 < len(items) <= carts.MAX_BATCH_ITEMS:
+        raise ValueError(f'Send between 1 and {carts.MAX_BATCH_ITEMS} items.')
+    quantities = {int(item['food_id']): carts.parse_quantity(item['quantity']) for item in items}
+    carts.set_quantities(customer_id, quantities)
+    return JsonResponse(carts.cart_state(customer_id, list(quantities)))
+
+def cart_api_line(customer_id, food_id):
+    state = carts.cart_state(customer_id, [food_id])
+    return JsonResponse({'line': state.pop('lines')[0], **state})
+
 @csrf_exempt
 def place_order(request):
     if 'customer_id' not in request.session:
@@ -206,39 +427,45 @@ def place_order(request):
         try:
             # ✅ Convert selected item IDs from string to integer
             selected_item_ids = list(map(int, request.POST.getlist('selected_items')))
-            customer_id = request.session['customer_id']
+            customer = customer_or_404(request)
+            customer_id = customer.user_id
 
             with transaction.atomic():
-                # ✅ Fetch the customer
-                customer = Customer.objects.get(user_id=customer_id)
-
-                # ✅ Filter cart items based on selected food IDs and customer
-                cart_items = Cart.objects.filter(customer=customer, food__food_id__in=selected_item_ids)
+                # ✅ Lock the selected cart rows so concurrent edits wait for the order
+                lines = list(
+                    Cart.objects.select_for_update()
+                    .filter(customer=customer, food_id__in=selected_item_ids)
+                    .values_list('cart_id', 'food_id', 'quantity')
+                )
 
-                if not cart_items.exists():
+                if not lines:
                     messages.error(request, 'Cannot increase first item here! Go to the restaurant and add items.')
                     return redirect('cart')  # Redirect back to the cart page if no valid items
 
-                # ✅ Calculate total price
-                total = sum(item.food.price * item.quantity for item in cart_items)
+                # ✅ Calculate total price in the database
+                cart_ids = [cart_id for cart_id, _, _ in lines]
+                locked_items = Cart.objects.filter(cart_id__in=cart_ids)
+                total = locked_items.aggregate(total=Sum(F('quantity') * F('food__price')))['total']
 
                 # ✅ Create order
                 order = Order.objects.create(
                     customer=customer,
                     total_price=total,
-                    status="Confirmed",
+                    status=Order.PLACED,
                 )
 
-                # ✅ Create OrderItems
-                for item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        food=item.food,
-                        quantity=item.quantity,
-                    )
+                # ✅ Create OrderItems in a single INSERT
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, food_id=food_id, quantity=quantity)
+                    for _, food_id, quantity in lines
+                ])
 
                 # ✅ Clear ordered items from the cart
-                cart_items.delete()
+                locked_items.delete()
+
+                # ✅ Everything after checkout runs in the worker; the job commits with the order
+                enqueue(process_placed_order, order_id=order.order_id)
+                transaction.on_commit(lambda: invalidate_cart_summary(customer_id))
 
                 messages.success(request, 'Order placed successfully!')
                 return redirect('order_confirmation', order_id=order.order_id)
@@ -266,14 +493,22 @@ def confirm_order(request, order_id):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    order = get_object_or_404(Order, order_id=order_id)
-    order.status = 'Confirmed'
-    order.save()
+    order = get_object_or_404(Order, order_id=order_id, customer_id=request.session['customer_id'])
+    try:
+        transition(order.order_id, Order.CONFIRMED)
+    except InvalidTransition:
+        # Confirming twice is fine; confirming a cancelled or delivered order isn't.
+        if order.status != Order.CONFIRMED:
+            messages.error(request, f'This order is {order.status.lower()} and can no longer be confirmed.')
+            return redirect('cart')
     messages.success(request, 'Order confirmed successfully!')
     return redirect('cart')
 
 @csrf_exempt
 def delete_cart_items(request):
+    if 'customer_id' not in request.session:
+        return JsonResponse({'status': 'error', 'message': 'User not logged in.'})
+
     if request.method == 'POST':
         item_ids_str = request.POST.get('item_ids')
         if not item_ids_str:
@@ -286,7 +521,9 @@ def delete_cart_items(request):
         except json.JSONDecodeError:
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON.'})
 
-        Cart.objects.filter(food__food_id__in=item_ids).delete()
+        customer_id = request.session['customer_id']
+        Cart.objects.filter(customer_id=customer_id, food__food_id__in=item_ids).delete()
+        invalidate_cart_summary(customer_id)
         return JsonResponse({'status': 'success'})
 
     return JsonResponse({'status': 'error', 'message': 'Invalid request method.'})
@@ -295,16 +532,10 @@ def remove_from_cart(request, food_id):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer = get_object_or_404(Customer, user_id=request.session['customer_id'])
+    customer = customer_or_404(request)
     food = get_object_or_404(FoodItem, food_id=food_id)
-    cart_item = Cart.objects.filter(customer=customer, food=food).first()
-
-    if cart_item:
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.save()
-        else:
-            cart_item.delete()
+    carts.decrement(customer.user_id, food.food_id)
+    invalidate_cart_summary(customer.user_id)
 
     return redirect('cart')
 
@@ -312,76 +543,90 @@ def delete_from_cart(request, food_id):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = Customer.objects.get(user_id=customer_id)
+    customer = customer_or_404(request)
     food = get_object_or_404(FoodItem, food_id=food_id)
 
-    Cart.objects.filter(customer=customer, food=food).delete()
+    carts.remove(customer.user_id, food.food_id)
+    invalidate_cart_summary(customer.user_id)
 
     return redirect('cart')
 
-def order_details(request, order_id):
-    if 'customer_id' not in request.session:
+async def order_details(request, order_id):
+    customer_id = await asession_customer_id(request)
+    if customer_id is None:
         return redirect('signin')
 
-    order = get_object_or_404(Order, order_id=order_id)
-    order_items = OrderItem.objects.filter(order=order)
-
-    # Debugging output
-    print(f"Order ID: {order.order_id}, Total Price: {order.total_price}, Status: {order.status}")
-    for item in order_items:
-        print(f"Order Item ID: {item.order_item_id}, Food: {item.food.name}, Quantity: {item.quantity}")
+    # The items are only shown once the order is known to be this customer's.
+    order, order_items = await asyncio.gather(
+        Order.objects.filter(order_id=order_id, customer_id=customer_id).afirst(),
+        alist(OrderItem.objects.filter(order_id=order_id).select_related('food').order_by('order_item_id')),
+    )
+    if order is None:
+        raise Http404('No Order matches the given query.')
 
-    return render(request, 'order_details.html', {
+    return await arender(request, 'order_details.html', {
         'order': order,
         'order_items': order_items
     })
 
+def order_events(request, order_id):
+    # Under ASGI this URL never gets here: food.order_events streams it. Here (WSGI) the client gets the
+    # current status and a retry hint, so EventSource polls.
+    customer_id = request.session.get('customer_id')
+    if customer_id is None:
+        raise Http404
+    order = get_object_or_404(Order, order_id=order_id, customer_id=customer_id)
+    return HttpResponse(
+        EVENT_STREAM_PREAMBLE + sse_event(order.order_id, order.status),
+        content_type='text/event-stream', headers={'Cache-Control': 'no-cache'},
+    )
+
 def profile(request):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = get_object_or_404(Customer, user_id=customer_id)
-
-    # Fetch order history and paginate
-    orders_list = Order.objects.filter(customer=customer).order_by('-timestamp')
-    paginator = Paginator(orders_list, 1)  # Show 1 order per page
-    page = request.GET.get('page', 1)
+    customer = customer_or_404(request)
 
-    try:
-        orders = paginator.page(page)
-    except PageNotAnInteger:
-        orders = paginator.page(1)
-    except EmptyPage:
-        orders = paginator.page(paginator.num_pages)
+    # First page of order history; the rest is loaded from order_history
+    orders, orders_cursor = order_history_page(customer.user_id)
 
     # Fetch other necessary data
     payment_methods = PaymentMethod.objects.filter(customer=customer)
     delivery_addresses = DeliveryAddress.objects.filter(customer=customer)
-    preferences = Preferences.objects.filter(customer=customer).first()
+    preferences = customer.preferences
 
     return render(request, 'profile.html', {
         'customer': customer,
         'username': customer.username,
         'orders': orders,
+        'orders_cursor': orders_cursor,
         'payment_methods': payment_methods,
         'delivery_addresses': delivery_addresses,
         'preferences': preferences,
     })
 
+def order_history(request):
+    if 'customer_id' not in request.session:
+        return JsonResponse({'error': 'Sign in to see your orders.'}, status=403)
+    try:
+        limit = min(max(int(request.GET.get('limit', ORDER_HISTORY_PAGE_SIZE)), 1), MAX_ORDER_HISTORY_PAGE_SIZE)
+        orders, next_cursor = order_history_page(request.session['customer_id'], request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit.'}, status=400)
+    return JsonResponse({'orders': [order_json(order) for order in orders], 'next_cursor': next_cursor})
+
 def update_profile(request):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = get_object_or_404(Customer, user_id=customer_id)
+    customer = customer_or_404(request)
 
     if request.method == 'POST':
         customer.username = request.POST.get('username', customer.username)
         customer.email = request.POST.get('email', customer.email)
         customer.phone = request.POST.get('phone', customer.phone)
         customer.save()
+        bump_profile_version(request)
         messages.success(request, 'Profile updated successfully!')
         return redirect('profile')
 
@@ -391,8 +636,7 @@ def add_payment_method(request):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = get_object_or_404(Customer, user_id=customer_id)
+    customer = customer_or_404(request)
 
     if request.method == 'POST':
         card_number = request.POST.get('card_number')
@@ -415,8 +659,7 @@ def add_delivery_address(request):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = get_object_or_404(Customer, user_id=customer_id)
+    customer = customer_or_404(request)
 
     if request.method == 'POST':
         address = request.POST.get('address')
@@ -441,15 +684,15 @@ def update_preferences(request):
     if 'customer_id' not in request.session:
         return redirect('signin')
 
-    customer_id = request.session['customer_id']
-    customer = get_object_or_404(Customer, user_id=customer_id)
-    preferences, created = Preferences.objects.get_or_create(customer=customer)
+    customer = customer_or_404(request)
+    preferences = customer.preferences or Preferences.objects.create(customer=customer)
 
     if request.method == 'POST':
         preferences.notifications_enabled = request.POST.get('notifications_enabled', 'off') == 'on'
         preferences.language = request.POST.get('language', preferences.language)
         preferences.theme = request.POST.get('theme', preferences.theme)
         preferences.save()
+        bump_profile_version(request)
         messages.success(request, 'Preferences updated successfully!')
         return redirect('profile')
 
@@ -472,6 +715,7 @@ def add_restaurant(request):
         if form.is_valid():
             restaurant = form.save(commit=False)
             restaurant.save()
+            schedule_derivatives(restaurant.image)
             return redirect('add_food_items', restaurant_id=restaurant.restaurant_id)
     else:
         form = RestaurantForm()
@@ -482,20 +726,27 @@ def add_food_items(request, restaurant_id):
     restaurant = Restaurant.objects.get(restaurant_id=restaurant_id)
 
     if request.method == 'POST':
-        # Handle multiple food items
-        names = request.POST.getlist('name')
-        prices = request.POST.getlist('price')
-        descriptions = request.POST.getlist('description')
-        images = request.FILES.getlist('image')
-
-        for name, price, description, image in zip(names, prices, descriptions, images):
-            FoodItem.objects.create(
-                restaurant=restaurant,
-                name=name,
-                price=price,
-                description=description,
-                image=image
-            )
+        # One dish per form block; the page numbers the image inputs (image_0, image_1, ...) so a
+        # dish without a photo doesn't shift the others' photos or get dropped.
+        columns = {field: request.POST.getlist(field) for field in ('name', 'price', 'description', 'special_instructions')}
+        importer = MenuImport(restaurant=restaurant)
+        # All or nothing: the page is shown again for the whole list to be fixed and re-sent,
+        # so saving the valid dishes now would leave the owner guessing which ones went in.
+        with transaction.atomic():
+            for index in range(len(columns['name'])):
+                row = {field: values[index] if index < len(values) else '' for field, values in columns.items()}
+                image = request.FILES.get(f'image_{index}')
+                importer.add(index + 1, row, {'image': image} if image else None)
+            if not importer.error_count:
+                importer.finish()
+            if importer.error_count:
+                transaction.set_rollback(True)
+
+        if importer.error_count:
+            for error in importer.errors:
+                messages.error(request, f"Food item {error['line']}: {error['error']}")
+            messages.error(request, 'No food items were saved; fix the items above and submit again.')
+            return render(request, 'add_food_items.html', {'form': FoodItemForm(), 'restaurant': restaurant})
 
         messages.success(request, 'Food items added successfully!')
         return redirect('submit_for_approval', restaurant_id=restaurant.restaurant_id)
@@ -505,6 +756,25 @@ def add_food_items(request, restaurant_id):
 
     return render(request, 'add_food_items.html', {'form': form, 'restaurant': restaurant})
 
+@login_required
+@require_POST
+def import_menu(request, restaurant_id):
+    restaurant = get_object_or_404(Restaurant, restaurant_id=restaurant_id)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'Upload a CSV or JSONL file as "file".'}, status=400)
+    file_format = request.POST.get('format') or guess_format(upload.name)
+    if file_format not in IMPORT_FORMATS:
+        return JsonResponse({'error': 'The file must be CSV or JSONL.'}, status=400)
+
+    # Read straight from the upload (spooled to disk when large), one row at a time.
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        importer = MenuImport(restaurant=restaurant).run(stream, file_format)
+    except UnicodeDecodeError:
+        return JsonResponse({'error': 'The file must be UTF-8 encoded.'}, status=400)
+    return JsonResponse(importer.summary())
+
 @login_required
 def submit_for_approval(request, restaurant_id):
     restaurant = Restaurant.objects.get(restaurant_id=restaurant_id)
@@ -531,6 +801,8 @@ def restaurant_login_submit(request):
             # Handle the case where the restaurant does not exist
             return redirect('restaurant_login')
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=restaurant_etag, last_modified_func=restaurant_last_modified)
 def restaurant_page(request, restaurant_id):
     # Fetch the restaurant object based on the restaurant_id
     restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
@@ -550,6 +822,8 @@ def edit_restaurant(request, pk):
         form = RestaurantForm(request.POST, request.FILES, instance=restaurant)
         if form.is_valid():
             form.save()
+            if 'image' in form.changed_data:
+                schedule_derivatives(restaurant.image)
             return redirect('restaurant_page', restaurant_id=restaurant.restaurant_id)
     else:
         form = RestaurantForm(instance=restaurant)
@@ -561,6 +835,8 @@ def edit_food_item(request, pk):
         form = FoodItemForm(request.POST, request.FILES, instance=food_item)
         if form.is_valid():
             form.save()
+            if 'image' in form.changed_data:
+                schedule_derivatives(food_item.image)
             return redirect('restaurant_page', restaurant_id=food_item.restaurant.restaurant_id)
     else:
         form = FoodItemForm(instance=food_item)
@@ -599,14 +875,9 @@ def restaurant_detail(request, restaurant_id):
 def add_restaurant_review(request, restaurant_id):
     if request.method == 'POST':
         restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
-        rating = request.POST.get('rating')
+        rating = ratings.parse_rating(request.POST.get('rating'))
         if rating:
-            Review.objects.create(
-                user=request.user,
-                restaurant=restaurant,
-                rating=rating,
-                review_text=request.POST.get('review_text', '')
-            )
+            ratings.add_review(request.user, rating, request.POST.get('review_text', ''), restaurant=restaurant)
             messages.success(request, 'Your review has been submitted successfully!')
         else:
             messages.error(request, 'Please select a rating.')
@@ -615,21 +886,16 @@ def add_restaurant_review(request, restaurant_id):
 
 @login_required
 def add_food_item_review(request, food_item_id):
+    food_item = get_object_or_404(FoodItem, pk=food_item_id)
     if request.method == 'POST':
-        food_item = get_object_or_404(FoodItem, pk=food_item_id)
-        rating = request.POST.get('rating')
+        rating = ratings.parse_rating(request.POST.get('rating'))
         if rating:
-            Review.objects.create(
-                user=request.user,
-                food_item=food_item,
-                rating=rating,
-                review_text=request.POST.get('review_text', '')
-            )
+            ratings.add_review(request.user, rating, request.POST.get('review_text', ''), food_item=food_item)
             messages.success(request, 'Your review has been submitted successfully!')
         else:
             messages.error(request, 'Please select a rating.')
 
-    return redirect('menu', restaurant_id=food_item.restaurant.restaurant_id)
+    return redirect('menu', restaurant_id=food_item.restaurant_id)
 
 def dont_copy(request):
     return render(request, 'dont_copy.html')
\ No newline at end of file
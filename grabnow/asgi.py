@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grabnow.settings')
 
 application = get_asgi_application()
+
+# Imported once the apps are loaded. Order status streams are answered before Django sees them.
+from food.autocomplete import autocomplete  # noqa: E402
+from food.order_events import mount  # noqa: E402
+
+application = mount(application)
+
+# Built here so that no request waits for it.
+autocomplete.warm_up()
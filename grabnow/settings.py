@@ -42,10 +42,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'food.middleware.StaticFilesMiddleware',
+    'food.metrics.metrics_middleware',
+    'food.db_router.replica_pinning_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'food.middleware.CustomerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,7 +58,8 @@ ROOT_URLCONF = 'grabnow.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's own backend, plus render timing for food.metrics
+        'BACKEND': 'food.metrics.MetricsDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,6 +92,47 @@ DATABASES = {
     }
 }
 
+# Reads can be spread over replicas listed here (aliases in DATABASES); writes always go to
+# 'default'. See food.db_router. For example, with a second SQLite file standing in for a replica:
+#   DATABASES['replica'] = {
+#       'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3', 'TEST': {'MIRROR': 'default'},
+#   }
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['food.db_router.PrimaryReplicaRouter']
+# After a client writes, its reads stay on the primary this long (seconds); keep it above the replication lag.
+REPLICA_PIN_SECONDS = 5
+
+
+
+# Caches: a per-process LRU (food.cache.TwoTierCache) in front of a cache shared by every worker.
+# Sessions and the sign-in throttle write to the shared tier on every sign-in, so it wants O(1) writes
+# and an atomic incr(): set REDIS_URL to use a Redis-compatible server (needs redis-py), e.g.
+# 'redis://127.0.0.1:6379'. Without one it falls back to files under cache/, which is fine for
+# development, but FileBasedCache lists its directory to cull on every set and its incr() is a read
+# then a write; then sessions go straight to the database and the throttle's budget stays per process.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+CACHES = {
+    'default': {
+        'BACKEND': 'food.cache.TwoTierCache',
+        'LOCATION': 'grabnow',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 5, 'MAX_ENTRIES': 5000, 'MAX_BYTES': 32 * 2 ** 20},
+    },
+    'shared': SHARED_CACHE,
+}
+
+# With Redis, sessions are read from the shared cache and written through to the database. Not the
+# LRU, so a logout or a new cart is seen at once by every worker.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db' if REDIS_URL else 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'shared'
 
 
 # Password validation
@@ -126,11 +172,42 @@ USE_TZ = True
 # Static files settings
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# `manage.py collectstatic` writes hashed, pre-compressed copies here; food.middleware.StaticFilesMiddleware
+# serves them (hashed names cached immutably for a year) once that has been run.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'food.storage.CompressedManifestStaticFilesStorage'
 
 # Media files settings
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Worker processes used to build resized WebP copies of uploads (food.images)
+IMAGE_DERIVATIVE_WORKERS = 2
+
+
+# Typeahead index (food.autocomplete): seconds before a worker reloads it in the
+# background, and an optional cap on distinct names kept per model for very large catalogs.
+AUTOCOMPLETE_MAX_AGE = 600
+AUTOCOMPLETE_MAX_NAMES = None
+
+
+# Clients allowed to read the per-view metrics at /metrics/ and /metrics.jsonl (food.metrics)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+# Sign-in throttle (food.throttle): (attempts, per seconds) for each client IP and each username/email.
+# CACHE is the alias holding the budget shared by all processes; counting is exact only where incr() is
+# atomic (Redis, Memcached), or None to throttle per process only.
+LOGIN_THROTTLE = {
+    'IP': (20, 60),
+    'USERNAME': (5, 300),
+    'CACHE': 'shared' if REDIS_URL else None,
+}
+
+
+# Live order status streams open at once per ASGI process (food.order_events); more get a 503
+ORDER_EVENTS_MAX_STREAMS = 10000
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grabnow.settings')
 
 application = get_wsgi_application()
+
+# Imported once the apps are loaded. Built here so that no request waits for it.
+from food.autocomplete import autocomplete  # noqa: E402
+
+autocomplete.warm_up()